@@ -0,0 +1,342 @@
+'''
+code/benchmark.py
+
+2048-intelligent-bot: Benchmark suite for the hot paths of the game and the bot.
+
+A fixed corpus of seeded positions is run through the board operations
+(make_move, check_if_over, insert_new_num) and the search (simulate_move,
+search_move). The throughput and p50/p95/p99 latency of each benchmark are
+printed, optionally saved as JSON and compared against a saved baseline.
+
+Usage (from the code directory):
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json
+    python benchmark.py --size 6 --spawn 2:0.9 4:0.1
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import argparse
+import json
+import platform
+import sys
+import numpy as np
+from datetime import datetime
+from time import perf_counter
+from bot.bot import Bot
+from bot.game_board import GameBoard
+
+
+# Number of calls timed together for each latency sample of the cheap
+# board operations (a single call is too short for the timer).
+MICRO_REPEAT = 100
+
+# Benchmarks in the order of the report.
+BENCHMARKS = ['make_move', 'check_if_over', 'insert_new_num', 'simulate_move', 'search_move']
+
+
+def build_corpus(n_positions: int, seed: int, size: int=4, spawn: dict=None) -> list:
+    '''
+    Builds a fixed corpus of positions, each reached by a random number of
+    random legal moves from a seeded start (stopping before a game over).
+
+        Parameters:
+            n_positions (int) : Number of positions.
+            seed (int)        : Base seed; the i-th position uses seed + i.
+            size (int)        : Size of the NxN grid.
+            spawn (dict)      : Probabilities of the inserted values (only 2s if not set).
+
+        Returns:
+            corpus (list) : Pairs of (packed board, number of moves played).
+    '''
+    corpus = []
+
+    for i in range(n_positions):
+        game = GameBoard(headless=True, seed=seed + i, size=size, spawn=spawn)
+        game.insert_new_num(n=2)
+        moves_played = 0
+
+        for _ in range(game.rng.randrange(400 * size * size // 16)):
+            game.push_move(game.rng.choice(game.legal_moves()))
+
+            if game.check_if_over():
+                game.pop_board()
+                break
+
+            moves_played += 1
+
+        corpus.append((game.board, moves_played))
+
+    return corpus
+
+def summarize(samples: list, calls: int) -> dict:
+    '''
+    Summarizes the latency samples of a benchmark.
+
+        Parameters:
+            samples (list) : Latency of each sample (in seconds per call).
+            calls (int)    : Total number of the calls timed.
+
+        Returns:
+            (dict) : Calls, throughput (calls/sec) and p50/p95/p99 latency (in us).
+    '''
+    latencies = np.array(samples) * 1e6
+    total_sec = float(np.sum(samples)) * calls / len(samples)
+
+    return {
+        'calls': calls,
+        'ops_per_sec': calls / total_sec if total_sec else 0.0,
+        'p50_us': float(np.percentile(latencies, 50)),
+        'p95_us': float(np.percentile(latencies, 95)),
+        'p99_us': float(np.percentile(latencies, 99))
+    }
+
+def bench_micro(corpus: list, name: str, size: int=4, spawn: dict=None) -> dict:
+    '''
+    Benchmarks a cheap board operation (timed in groups of MICRO_REPEAT calls).
+    Each group cycles through consecutive positions of the corpus, so that no
+    call sees the board of the previous one (the engines of the large boards
+    cache the moves of the last board, see bot/engines.py).
+
+        Parameters:
+            corpus (list) : Corpus of positions.
+            name (str)    : 'make_move', 'check_if_over' or 'insert_new_num'.
+            size (int)    : Size of the NxN grid.
+            spawn (dict)  : Probabilities of the inserted values.
+
+        Returns:
+            (dict) : Summary of the benchmark.
+    '''
+    game = GameBoard(headless=True, seed=0, size=size, spawn=spawn)
+    boards = [board for board, _ in corpus]
+
+    # Only the positions with an empty cell get a new number.
+    if name == 'insert_new_num':
+        boards = [board for board in boards if game.engine.count_empty(board)]
+
+    samples = []
+
+    for i in range(len(boards)):
+        group = [boards[(i + j) % len(boards)] for j in range(MICRO_REPEAT)]
+
+        if name == 'make_move':
+            for move in game.MOVES:
+                start = perf_counter()
+                for board in group:
+                    game.board = board
+                    game.make_move(move)
+                samples.append((perf_counter() - start) / MICRO_REPEAT)
+        elif name == 'check_if_over':
+            start = perf_counter()
+            for board in group:
+                game.board = board
+                game.check_if_over()
+            samples.append((perf_counter() - start) / MICRO_REPEAT)
+        elif name == 'insert_new_num':
+            start = perf_counter()
+            for board in group:
+                game.board = board
+                game.insert_new_num()
+            samples.append((perf_counter() - start) / MICRO_REPEAT)
+
+    return summarize(samples, len(samples) * MICRO_REPEAT)
+
+def bench_simulate(corpus: list, rollouts: int, seed: int, size: int=4, spawn: dict=None) -> dict:
+    '''
+    Benchmarks single rollouts (Bot.simulate_move) from each position, with
+    the search depth of the position's stage of the game.
+
+        Parameters:
+            corpus (list)  : Corpus of positions.
+            rollouts (int) : Rollouts per position.
+            seed (int)     : Seed of the bot.
+            size (int)     : Size of the NxN grid.
+            spawn (dict)   : Probabilities of the inserted values.
+
+        Returns:
+            (dict) : Summary of the benchmark (one call is one rollout).
+    '''
+    samples = []
+
+    with Bot(headless=True, seed=seed, size=size, spawn=spawn) as bot:
+        for board, moves_played in corpus:
+            bot.move_num = moves_played
+            bot.update_search_params()
+
+            for _ in range(rollouts):
+                bot.board = board
+                start = perf_counter()
+                bot.simulate_move()
+                samples.append(perf_counter() - start)
+
+    return summarize(samples, len(samples))
+
+def bench_search(corpus: list, decisions: int, seed: int, size: int=4, spawn: dict=None) -> dict:
+    '''
+    Benchmarks full decisions (Bot.search_move) on the first positions of
+    the corpus, with the search parameters of each position's stage.
+
+        Parameters:
+            corpus (list)   : Corpus of positions.
+            decisions (int) : Number of positions searched.
+            seed (int)      : Seed of the bot.
+            size (int)      : Size of the NxN grid.
+            spawn (dict)    : Probabilities of the inserted values.
+
+        Returns:
+            (dict) : Summary of the benchmark (one call is one decision).
+    '''
+    samples = []
+
+    with Bot(headless=True, seed=seed, size=size, spawn=spawn) as bot:
+        for board, moves_played in corpus[:decisions]:
+            bot.board = board
+            bot.move_num = moves_played
+            bot.update_search_params()
+
+            if bot.check_if_over():
+                continue
+
+            start = perf_counter()
+            bot.search_move()
+            samples.append(perf_counter() - start)
+
+    return summarize(samples, len(samples))
+
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    '''
+    Runs the selected benchmarks on the seeded corpus.
+
+        Parameters:
+            args (argparse.Namespace) : Parsed command-line arguments.
+
+        Returns:
+            (dict) : Report with the metadata and the results of each benchmark.
+    '''
+    corpus = build_corpus(args.positions, args.seed, args.size, args.spawn)
+    results = {}
+
+    for name in args.only or BENCHMARKS:
+        if name == 'simulate_move':
+            results[name] = bench_simulate(corpus, args.rollouts, args.seed, args.size, args.spawn)
+        elif name == 'search_move':
+            results[name] = bench_search(corpus, args.decisions, args.seed, args.size, args.spawn)
+        else:
+            results[name] = bench_micro(corpus, name, args.size, args.spawn)
+
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'positions': args.positions,
+            'seed': args.seed,
+            'rollouts': args.rollouts,
+            'decisions': args.decisions,
+            'size': args.size,
+            'spawn': args.spawn
+        },
+        'results': results
+    }
+
+def print_report(report: dict, baseline: dict=None) -> None:
+    '''
+    Prints the results (with the speedup against the baseline, if given).
+
+        Parameters:
+            report (dict)   : Report of the current run.
+            baseline (dict) : Report of the baseline run (or None).
+    '''
+    print(f'{"benchmark":<16}{"ops/sec":>14}{"p50 us":>12}{"p95 us":>12}{"p99 us":>12}', end='')
+    print(f'{"speedup":>10}' if baseline else '')
+
+    for name, res in report['results'].items():
+        print(
+            f'{name:<16}{res["ops_per_sec"]:>14.1f}{res["p50_us"]:>12.2f}'
+            f'{res["p95_us"]:>12.2f}{res["p99_us"]:>12.2f}',
+            end=''
+        )
+        base = (baseline or {}).get('results', {}).get(name)
+        print(f'{res["ops_per_sec"] / base["ops_per_sec"]:>9.2f}x' if base else '')
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    '''
+    Lists the benchmarks whose throughput dropped below the baseline by more
+    than the tolerance.
+
+        Parameters:
+            report (dict)     : Report of the current run.
+            baseline (dict)   : Report of the baseline run.
+            tolerance (float) : Allowed relative slowdown (e.g. 0.1 for 10%).
+
+        Returns:
+            (list) : Names of the regressed benchmarks.
+    '''
+    regressions = []
+
+    for name, res in report['results'].items():
+        base = baseline['results'].get(name)
+
+        if base and res['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(name)
+
+    return regressions
+
+def parse_spawn(value: str) -> tuple:
+    '''
+    Parses a spawn option of the form VALUE:PROBABILITY (e.g. 4:0.1).
+
+        Parameters:
+            value (str) : Command-line value.
+
+        Returns:
+            (tuple) : (inserted value, probability).
+    '''
+    val, prob = value.split(':')
+    return int(val), float(prob)
+
+def parse_args() -> argparse.Namespace:
+    '''
+    Parses the command-line arguments of the benchmark.
+
+        Returns:
+            (argparse.Namespace) : Parsed arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Benchmark the 2048 engine and the bot search.')
+    parser.add_argument('--positions', type=int, default=200, help='number of corpus positions')
+    parser.add_argument('--seed', type=int, default=0, help='base seed of the corpus')
+    parser.add_argument('--rollouts', type=int, default=5, help='rollouts per position')
+    parser.add_argument('--decisions', type=int, default=20, help='positions searched by search_move')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='benchmarks to run')
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown vs baseline')
+    parser.add_argument('--size', type=int, default=4, help='size of the NxN grid (3 to 8)')
+    parser.add_argument('--spawn', nargs='+', type=parse_spawn, help='inserted values, e.g. 2:0.9 4:0.1')
+    args = parser.parse_args()
+    args.spawn = dict(args.spawn) if args.spawn else None
+    return args
+
+
+if __name__=='__main__':
+    args = parse_args()
+    report = run_benchmarks(args)
+    baseline = None
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args.tolerance)
+
+        if regressions:
+            print(f'\nRegressions (>{args.tolerance:.0%} slower): {", ".join(regressions)}')
+            sys.exit(1)
@@ -0,0 +1,75 @@
+'''
+code/bot/batch.py
+
+2048-intelligent-bot: Parallel runner for batches of headless games.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import process_time
+from typing import Iterator
+from bot.bot import Bot
+from bot.trajectory import Trajectory
+
+
+def play_game(seed: int, record_trajectory: bool=False, coeffs: dict=None) -> dict:
+    '''
+    Plays a single headless game (run inside a worker process).
+
+        Parameters:
+            seed (int)               : Seed of the game.
+            record_trajectory (bool) : If True, the packed trajectory is returned too.
+            coeffs (dict)            : Overrides of the search coefficients (see Bot).
+
+        Returns:
+            (dict) : Result of the game (seed, win, score, time played, CPU time
+                     and, optionally, the trajectory blobs).
+    '''
+    trajectory = Trajectory() if record_trajectory else None
+    bot = Bot(headless=True, seed=seed, trajectory=trajectory, coeffs=coeffs)
+    cpu_start = process_time()
+    bot.play()
+
+    result = {
+        'seed': seed,
+        'win': bot.win,
+        'score': int(bot.score),
+        't_sec': bot.timer,
+        'cpu_sec': process_time() - cpu_start
+    }
+
+    if trajectory is not None:
+        result['trajectory'] = trajectory.pack()
+
+    return result
+
+def run_games(
+    n_games: int,
+    workers: int=None,
+    seed: int=0,
+    record_trajectories: bool=False,
+    coeffs: dict=None
+) -> Iterator[dict]:
+    '''
+    Spreads N independent headless games across a pool of worker processes.
+    The results are yielded as soon as the games finish (not in seed order).
+
+        Parameters:
+            n_games (int)              : Number of games to play.
+            workers (int)              : Number of worker processes (None for all cores).
+            seed (int)                 : Base seed; the i-th game is played with seed + i.
+            record_trajectories (bool) : If True, the games return their trajectories.
+            coeffs (dict)              : Overrides of the search coefficients (see Bot).
+
+        Yields:
+            (dict) : Result of each finished game.
+    '''
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(play_game, seed + i, record_trajectories, coeffs) for i in range(n_games)
+        ]
+
+        for future in as_completed(futures):
+            yield future.result()
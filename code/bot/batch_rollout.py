@@ -0,0 +1,207 @@
+'''
+code/bot/batch_rollout.py
+
+2048-intelligent-bot: Vectorised rollouts for batches of packed boards.
+
+K packed boards are kept in a single np.uint64 array, and each step of
+the random playouts (moves, no-op detection, spawns and game over) is
+applied to the whole batch at once with the lookup tables of bot/bitboard.py.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import numpy as np
+from bot.bitboard import COL_DOWN, COL_UP, ROW_LEFT, ROW_RIGHT
+
+
+# Lookup tables as arrays (for vectorised gathers).
+ROW_LEFT_ARR = np.array(ROW_LEFT, dtype=np.uint64)
+ROW_RIGHT_ARR = np.array(ROW_RIGHT, dtype=np.uint64)
+COL_UP_ARR = np.array(COL_UP, dtype=np.uint64)
+COL_DOWN_ARR = np.array(COL_DOWN, dtype=np.uint64)
+
+# Constants as np.uint64 (so that shifts/masks never promote to floats).
+SHIFT = [np.uint64(n) for n in range(64)]
+ROW_MASK = np.uint64(0xFFFF)
+EMPTY_MASK = np.uint64(0x1111111111111111)
+SUM_NIBBLES = np.uint64(0x1111111111111111)
+
+
+def transpose_batch(boards: np.ndarray) -> np.ndarray:
+    '''
+    Transposes a batch of packed boards (see bitboard.transpose).
+
+        Parameters:
+            boards (np.ndarray) : Packed boards (np.uint64).
+
+        Returns:
+            (np.ndarray) : Transposed packed boards.
+    '''
+    a1 = boards & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = boards & np.uint64(0x0000F0F00000F0F0)
+    a3 = boards & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << SHIFT[12]) | (a3 >> SHIFT[12])
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> SHIFT[24]) | (b3 << SHIFT[24])
+
+def _move_rows(boards: np.ndarray, table: np.ndarray) -> np.ndarray:
+    '''
+    Applies a row table (left/right) to a batch of packed boards.
+    '''
+    result = boards.copy()
+
+    for i in range(4):
+        result ^= table[(boards >> SHIFT[16 * i]) & ROW_MASK] << SHIFT[16 * i]
+
+    return result
+
+def _move_cols(boards: np.ndarray, table: np.ndarray) -> np.ndarray:
+    '''
+    Applies a column table (up/down) to a batch of packed boards.
+    '''
+    t = transpose_batch(boards)
+    result = boards.copy()
+
+    for i in range(4):
+        result ^= table[(t >> SHIFT[16 * i]) & ROW_MASK] << SHIFT[4 * i]
+
+    return result
+
+def move_batch_all(boards: np.ndarray) -> np.ndarray:
+    '''
+    Applies each of the four moves to a batch of packed boards.
+
+        Parameters:
+            boards (np.ndarray) : Packed boards (np.uint64), shape (K,).
+
+        Returns:
+            (np.ndarray) : Boards after each move, shape (4, K), where the
+                           moves follow GameBoard.MOVES ('right', 'left', 'up', 'down').
+    '''
+    return np.stack((
+        _move_rows(boards, ROW_RIGHT_ARR),
+        _move_rows(boards, ROW_LEFT_ARR),
+        _move_cols(boards, COL_UP_ARR),
+        _move_cols(boards, COL_DOWN_ARR)
+    ))
+
+def empty_mask_batch(boards: np.ndarray) -> np.ndarray:
+    '''
+    Returns masks with the lowest bit of each empty nibble set.
+    '''
+    x = boards | ((boards >> SHIFT[2]) & np.uint64(0x3333333333333333))
+    x |= (x >> SHIFT[1])
+    return ~x & EMPTY_MASK
+
+def _count_nibbles(mask: np.ndarray) -> np.ndarray:
+    '''
+    Counts the set nibbles of each empty mask (the sum of the nibbles lands in
+    the top nibble, which overflows to 0 for a full mask, i.e. an empty board).
+    '''
+    count = ((mask * SUM_NIBBLES) >> SHIFT[60]).astype(np.int64)
+    return np.where(mask == EMPTY_MASK, 16, count)
+
+def count_empty_batch(boards: np.ndarray) -> np.ndarray:
+    '''
+    Counts the empty cells of each packed board.
+
+        Parameters:
+            boards (np.ndarray) : Packed boards (np.uint64).
+
+        Returns:
+            (np.ndarray) : Number of empty cells per board.
+    '''
+    return _count_nibbles(empty_mask_batch(boards))
+
+def max_tile_batch(boards: np.ndarray) -> np.ndarray:
+    '''
+    Returns the max tile value (not the exponent) of each packed board.
+
+        Parameters:
+            boards (np.ndarray) : Packed boards (np.uint64).
+
+        Returns:
+            (np.ndarray) : Max tile values (0 for empty boards).
+    '''
+    exps = np.zeros(len(boards), dtype=np.int64)
+
+    for i in range(16):
+        exps = np.maximum(exps, ((boards >> SHIFT[4 * i]) & np.uint64(0xF)).astype(np.int64))
+
+    return np.where(exps > 0, np.left_shift(1, exps), 0)
+
+def insert_batch(boards: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Inserts a new tile (2) into a uniformly drawn empty cell of each board.
+    Each board must have at least one empty cell.
+
+        Parameters:
+            boards (np.ndarray)       : Packed boards (np.uint64).
+            rng (np.random.Generator) : Random number generator.
+
+        Returns:
+            (np.ndarray) : Packed boards with the new tiles.
+    '''
+    mask = empty_mask_batch(boards)
+    count = _count_nibbles(mask)
+    target = (rng.random(len(boards)) * count).astype(np.int64)
+    seen = np.zeros(len(boards), dtype=np.int64)
+    spawn = np.zeros(len(boards), dtype=np.uint64)
+
+    for i in range(16):
+        bit = ((mask >> SHIFT[4 * i]) & np.uint64(1)).astype(np.int64)
+        spawn[(bit == 1) & (seen == target)] = np.uint64(1) << SHIFT[4 * i]
+        seen += bit
+
+    return boards | spawn
+
+def simulate_batch(
+    boards: np.ndarray,
+    search_depth: int | np.ndarray,
+    score: int | np.ndarray,
+    empty_coeff: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    '''
+    Runs one random playout per board (vectorised Bot.simulate_move), and
+    returns the cost of each playout (as accumulated by Bot.update_costs).
+
+        Parameters:
+            boards (np.ndarray)       : Starting packed boards (np.uint64).
+            search_depth (int)        : Depth of each playout (or an array, per board).
+            score (int)               : Current score of the game (or an array, per board).
+            empty_coeff (int)         : Coefficient for the empty cells.
+            rng (np.random.Generator) : Random number generator.
+
+        Returns:
+            (np.ndarray) : Cost of each playout.
+    '''
+    boards = boards.astype(np.uint64)
+    search_depth = np.broadcast_to(search_depth, boards.shape)
+    counter = np.ones(len(boards), dtype=np.int64)
+    active = counter < search_depth
+
+    while active.any():
+        idx = np.flatnonzero(active)
+        curr = boards[idx]
+        results = move_batch_all(curr)
+
+        # A move changes a board only if it also leaves an empty cell behind,
+        # so the game is over only if none of the moves changes the board.
+        game_over = (results == curr).all(axis=0)
+        moves = rng.integers(0, 4, size=len(idx))
+        new = results[moves, np.arange(len(idx))]
+        diff = (new != curr) & ~game_over
+
+        if diff.any():
+            new[diff] = insert_batch(new[diff], rng)
+
+        boards[idx] = new
+        counter[idx] += diff
+        active[idx] = ~game_over & (counter[idx] < search_depth[idx])
+
+    # The simulated score is constant (as in the serial playouts).
+    return score * (counter - 1) + empty_coeff * count_empty_batch(boards)
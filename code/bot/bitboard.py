@@ -0,0 +1,351 @@
+'''
+code/bot/bitboard.py
+
+2048-intelligent-bot: Bitboard engine for the 4x4 game board.
+
+The grid is packed into a single 64-bit integer, where each 4-bit nibble
+holds the log2 exponent of a cell value (0 denotes an empty cell). The cell
+(row, col) is stored at the nibble with index 4 * row + col. All the four
+moves are resolved with lookup tables precomputed for each of the 65,536
+possible rows.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import numpy as np
+
+
+# Masks for a single row and for the first column of the packed board.
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+EMPTY_MASK = 0x1111111111111111
+
+# Max exponent that fits into a nibble (i.e. the tile of 32768).
+MAX_EXPONENT = 15
+
+
+def _slide_row(cells: list) -> list:
+    '''
+    Returns a row (list of exponents) after sliding it to the left.
+
+        Parameters:
+            cells (list) : Exponents of the row (index 0 is the left edge).
+
+        Returns:
+            new (list) : Updated exponents of the row.
+    '''
+    temp = [n for n in cells if (n != 0)]
+    new = []
+    skip = False
+
+    for i in range(len(temp)):
+        # Skip an element that was just merged (so that it is not repeated).
+        if skip:
+            skip = False
+            continue
+        # If two consecutive elements are equal, merge them into a single tile.
+        if (i != len(temp) - 1) and (temp[i] == temp[i + 1]):
+            skip = True
+            new.append(min(temp[i] + 1, MAX_EXPONENT))
+        else:
+            new.append(temp[i])
+
+    while len(new) != len(cells):
+        new.append(0)
+
+    return new
+
+def _pack_row(cells: list) -> int:
+    '''
+    Packs a list of four exponents into a 16-bit row.
+    '''
+    return cells[0] | (cells[1] << 4) | (cells[2] << 8) | (cells[3] << 12)
+
+def _unpack_col(row: int) -> int:
+    '''
+    Spreads a 16-bit row into the first column of the packed board.
+    '''
+    return (row | (row << 12) | (row << 24) | (row << 36)) & COL_MASK
+
+def _build_tables() -> tuple:
+    '''
+    Precomputes the XOR deltas for all the possible rows, so that a move is
+    resolved by applying a single table lookup per row/column.
+
+        Returns:
+            (tuple) : Lookup tables for left, right, up and down moves.
+    '''
+    size = ROW_MASK + 1
+    left, right, up, down = [0] * size, [0] * size, [0] * size, [0] * size
+
+    for row in range(size):
+        cells = [(row >> (4 * i)) & 0xF for i in range(4)]
+        result = _pack_row(_slide_row(cells))
+        rev_row = _pack_row(cells[::-1])
+        rev_result = _pack_row(_slide_row(cells)[::-1])
+
+        left[row] = row ^ result
+        right[rev_row] = rev_row ^ rev_result
+        up[row] = _unpack_col(row) ^ _unpack_col(result)
+        down[rev_row] = _unpack_col(rev_row) ^ _unpack_col(rev_result)
+
+    return left, right, up, down
+
+
+ROW_LEFT, ROW_RIGHT, COL_UP, COL_DOWN = _build_tables()
+
+# Legal slides of each row: bit 0 if it changes when moved left, bit 1 if
+# it changes when moved right (the same holds for columns, up and down).
+ROW_LEGAL = [
+    (ROW_LEFT[row] != 0) | ((ROW_RIGHT[row] != 0) << 1)
+    for row in range(ROW_MASK + 1)
+]
+
+
+def transpose(board: int) -> int:
+    '''
+    Transposes the packed board (rows become columns).
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (int) : Transposed packed board.
+    '''
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+def move_left(board: int) -> int:
+    '''
+    Returns the packed board after moving the tiles to the left.
+    '''
+    return (
+        board
+        ^ ROW_LEFT[board & ROW_MASK]
+        ^ (ROW_LEFT[(board >> 16) & ROW_MASK] << 16)
+        ^ (ROW_LEFT[(board >> 32) & ROW_MASK] << 32)
+        ^ (ROW_LEFT[(board >> 48) & ROW_MASK] << 48)
+    )
+
+def move_right(board: int) -> int:
+    '''
+    Returns the packed board after moving the tiles to the right.
+    '''
+    return (
+        board
+        ^ ROW_RIGHT[board & ROW_MASK]
+        ^ (ROW_RIGHT[(board >> 16) & ROW_MASK] << 16)
+        ^ (ROW_RIGHT[(board >> 32) & ROW_MASK] << 32)
+        ^ (ROW_RIGHT[(board >> 48) & ROW_MASK] << 48)
+    )
+
+def move_up(board: int) -> int:
+    '''
+    Returns the packed board after moving the tiles up.
+    '''
+    t = transpose(board)
+    return (
+        board
+        ^ COL_UP[t & ROW_MASK]
+        ^ (COL_UP[(t >> 16) & ROW_MASK] << 4)
+        ^ (COL_UP[(t >> 32) & ROW_MASK] << 8)
+        ^ (COL_UP[(t >> 48) & ROW_MASK] << 12)
+    )
+
+def move_down(board: int) -> int:
+    '''
+    Returns the packed board after moving the tiles down.
+    '''
+    t = transpose(board)
+    return (
+        board
+        ^ COL_DOWN[t & ROW_MASK]
+        ^ (COL_DOWN[(t >> 16) & ROW_MASK] << 4)
+        ^ (COL_DOWN[(t >> 32) & ROW_MASK] << 8)
+        ^ (COL_DOWN[(t >> 48) & ROW_MASK] << 12)
+    )
+
+
+# Mapping of the move names (as in GameBoard.MOVES) to the move functions.
+MOVE_FUNCTIONS = {
+    'right': move_right,
+    'left': move_left,
+    'up': move_up,
+    'down': move_down
+}
+
+# Legal moves for each 4-bit mask (bits in the order of MOVE_FUNCTIONS).
+LEGAL_MOVES = [
+    tuple(mv for i, mv in enumerate(MOVE_FUNCTIONS) if mask & (1 << i))
+    for mask in range(16)
+]
+
+
+def legal_mask(board: int) -> int:
+    '''
+    Returns a mask of the moves that change the packed board, using the row
+    table only (no move is applied).
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (int) : Bits 0-3 set for the legal 'right', 'left', 'up', 'down' moves.
+    '''
+    rows = (
+        ROW_LEGAL[board & ROW_MASK]
+        | ROW_LEGAL[(board >> 16) & ROW_MASK]
+        | ROW_LEGAL[(board >> 32) & ROW_MASK]
+        | ROW_LEGAL[board >> 48]
+    )
+    t = transpose(board)
+    cols = (
+        ROW_LEGAL[t & ROW_MASK]
+        | ROW_LEGAL[(t >> 16) & ROW_MASK]
+        | ROW_LEGAL[(t >> 32) & ROW_MASK]
+        | ROW_LEGAL[t >> 48]
+    )
+    return ((rows & 1) << 1) | (rows >> 1) | ((cols & 1) << 2) | ((cols & 2) << 2)
+
+def legal_moves(board: int) -> tuple:
+    '''
+    Lists the moves that change the packed board.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (tuple) : Names of the legal moves (in the order of MOVE_FUNCTIONS).
+    '''
+    return LEGAL_MOVES[legal_mask(board)]
+
+def empty_mask(board: int) -> int:
+    '''
+    Returns a mask with the lowest bit of each empty nibble set.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (int) : Mask of the empty cells.
+    '''
+    x = board | ((board >> 2) & 0x3333333333333333)
+    x |= (x >> 1)
+    return ~x & EMPTY_MASK
+
+def count_empty(board: int) -> int:
+    '''
+    Counts the empty cells on the packed board.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (int) : Number of empty cells.
+    '''
+    return empty_mask(board).bit_count()
+
+def empty_cells(board: int) -> list:
+    '''
+    Lists the indices of the empty cells (nibbles) on the packed board.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            cells (list) : Nibble indices (4 * row + col) of the empty cells.
+    '''
+    mask = empty_mask(board)
+    cells = []
+
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() >> 2)
+        mask ^= low
+
+    return cells
+
+def nth_empty_cell(board: int, n: int) -> int:
+    '''
+    Returns the index of the n-th empty cell (without listing all of them).
+
+        Parameters:
+            board (int) : Packed board.
+            n (int)     : Rank of the empty cell (0 for the lowest nibble).
+
+        Returns:
+            (int) : Nibble index (4 * row + col) of the empty cell.
+    '''
+    mask = empty_mask(board)
+
+    for _ in range(n):
+        mask &= mask - 1
+
+    return (mask & -mask).bit_length() >> 2
+
+def max_tile(board: int) -> int:
+    '''
+    Returns the max tile value (not the exponent) on the packed board.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (int) : Max tile value (0 for an empty board).
+    '''
+    exp = max((board >> shift) & 0xF for shift in range(0, 64, 4))
+    return (1 << exp) if exp else 0
+
+def is_over(board: int) -> bool:
+    '''
+    Checks if none of the moves changes the packed board.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (bool) : True if the game is over; False otherwise.
+    '''
+    # Any board with both empty and non-empty cells has at least one move.
+    if board and empty_mask(board):
+        return False
+
+    return legal_mask(board) == 0
+
+def pack_grid(grid: np.ndarray) -> int:
+    '''
+    Packs a 4x4 grid of tile values into a 64-bit integer.
+
+        Parameters:
+            grid (np.ndarray) : Grid of tile values (0 for empty cells).
+
+        Returns:
+            board (int) : Packed board.
+    '''
+    board = 0
+
+    for i, val in enumerate(np.asarray(grid).flat):
+        if val:
+            board |= (int(val).bit_length() - 1) << (4 * i)
+
+    return board
+
+def unpack_grid(board: int) -> np.ndarray:
+    '''
+    Unpacks a 64-bit integer into a 4x4 grid of tile values.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (np.ndarray) : Grid of tile values (0 for empty cells).
+    '''
+    exps = np.array([(board >> (4 * i)) & 0xF for i in range(16)], dtype=int)
+    return np.where(exps > 0, 1 << exps, 0).reshape(4, 4)
@@ -7,11 +7,24 @@ Author: Filip J. Cierkosz 2022 (updated: 2023)
 '''
 
 
+import math
 import numpy as np
-import pygame
-from pygame.locals import *
+from time import perf_counter, time
+from bot.batch_rollout import simulate_batch
 from bot.game_board import GameBoard
-from bot.graphics import *
+from bot.search_pool import ROLLOUT_CHUNK, SearchPool
+from bot.symmetry import canonicalize
+from bot.transposition import TranspositionTable
+
+
+# Coefficients of the search that can be overridden (e.g. by the tuner).
+SEARCH_COEFFS = ('SEARCH_PER_MOVE_COEFF', 'SEARCH_DEPTH_COEFF', 'SEARCH_COEFF', 'EMPTY_SPOT_COEFF')
+
+# Min number of rollouts of a decision (or of an anytime round) run as one
+# vectorised batch. Below it, the numpy overhead per step outweighs the gain,
+# and the batched mode runs the serial rollouts instead (measured crossover on
+# the 4x4 corpus: about 70 rollouts per first move, i.e. ~250 per decision).
+BATCHED_MIN_ROLLOUTS = 256
 
 
 class Bot(GameBoard):
@@ -21,21 +34,99 @@ class Bot(GameBoard):
     -----------
     '''
 
-    def __init__(self: 'Bot') -> None:
+    def __init__(
+        self: 'Bot',
+        headless: bool=False,
+        seed: int=None,
+        search_workers: int=None,
+        batched_rollouts: bool=False,
+        transpositions: TranspositionTable=None,
+        strategy: object=None,
+        time_budget: float=None,
+        rollout_budget: int=None,
+        early_stop_z: float=None,
+        allocation: str=None,
+        rollout_policy: object=None,
+        instrument: object=None,
+        trajectory: object=None,
+        opening_book: object=None,
+        size: int=4,
+        spawn: dict=None,
+        coeffs: dict=None
+    ) -> None:
         '''
         Constructor to initialize the bot (and game GUI through parent class).
 
             Parameters:
                 self ('Bot')
+                headless (bool)                     : If True, the bot plays without the GUI.
+                seed (int)                          : Seed for the game and search randomness.
+                search_workers (int)                : If set, rollouts run in a pool of N processes.
+                batched_rollouts (bool)             : If True, rollouts run as one vectorised batch
+                                                      (once a decision has at least
+                                                      BATCHED_MIN_ROLLOUTS of them).
+                transpositions (TranspositionTable) : If set, cache of rollouts (can be shared).
+                strategy (object)                   : If set, used in place of Monte Carlo search
+                                                      (e.g. bot.expectimax.Expectimax).
+                time_budget (float)                 : If set, anytime search with a time budget
+                                                      per move (in seconds).
+                rollout_budget (int)                : If set, anytime search with a budget of
+                                                      rollouts per move.
+                early_stop_z (float)                : If set, anytime search stops once the lead
+                                                      of the best move exceeds z std. errors.
+                allocation (str)                    : If set, rollouts are allocated adaptively
+                                                      across the first moves ('ucb'/'halving').
+                rollout_policy (object)             : If set, selects the moves of the rollouts
+                                                      (e.g. bot.policy.HeuristicPolicy).
+                instrument (object)                 : If set, records per-decision statistics
+                                                      (e.g. bot.instrument.Instrument).
+                trajectory (object)                 : If set, records the moves and spawns of
+                                                      the game (bot.trajectory.Trajectory).
+                opening_book (object)               : If set, precomputed moves looked up before
+                                                      searching (bot.opening_book.OpeningBook).
+                size (int)                          : Size of the NxN grid (3 to 8; the boards
+                                                      other than 4x4 support the Monte Carlo
+                                                      search with random rollouts only).
+                spawn (dict)                        : Probabilities of the inserted values
+                                                      (e.g. {2: 0.9, 4: 0.1}; values other than 2
+                                                      are not supported by the batched rollouts,
+                                                      the strategies and the opening book).
+                coeffs (dict)                       : Overrides of the search coefficients
+                                                      (see SEARCH_COEFFS), e.g. from tune.py.
         '''
-        super().__init__()
+        super().__init__(headless=headless, seed=seed, size=size, spawn=spawn)
+
+        # The batched rollouts, the strategies, the policies, the symmetries
+        # and the trajectories work with packed 4x4 boards only.
+        extensions = (transpositions, strategy, rollout_policy, trajectory, opening_book)
+
+        if size != 4 and (batched_rollouts or any(ext is not None for ext in extensions)):
+            raise ValueError(f'Only the Monte Carlo search with random rollouts supports {size}x{size} boards.')
+
+        # The batched rollouts, the expectimax strategy and the opening book
+        # (built from games with 2s only) insert 2s only.
+        only_twos = self.SPAWN_EXPONENTS == [1]
+
+        if not only_twos and (batched_rollouts or strategy is not None or opening_book is not None):
+            raise ValueError('Only the Monte Carlo search without batched rollouts, strategies or '
+                             f'an opening book supports inserting values other than 2, got {spawn}.')
+
+        # The cached rollouts are recorded by the in-process rollouts only.
+        if transpositions is not None and (search_workers or batched_rollouts):
+            raise ValueError('The transposition table needs the serial rollouts (no search_workers/batched_rollouts).')
 
         # Constant coefficient for dynamic search.
         self.SEARCH_PER_MOVE_COEFF = 10
         self.SEARCH_DEPTH_COEFF = 4
-        self.SEARCH_COEFF = 200
+        self.SEARCH_COEFF = 200 * size * size // 16
         self.EMPTY_SPOT_COEFF = 10
 
+        for name, value in (coeffs or {}).items():
+            if name not in SEARCH_COEFFS:
+                raise ValueError(f'Unknown search coefficient: {name} (one of {SEARCH_COEFFS}).')
+
+            setattr(self, name, value)
+
         # Dictionary for calculating costs while searching.
         self.costs = {mv: 0 for mv in self.MOVES}
 
@@ -43,6 +134,90 @@ class Bot(GameBoard):
         self.search_depth = 0
         self.move_num = 0
 
+        # Persistent pool for root-parallel search (None for serial search). The
+        # rollout policy is sent to the workers once, when they start.
+        self.search_pool = SearchPool(search_workers, size, spawn, rollout_policy) if search_workers else None
+
+        # Vectorised rollouts (with a generator derived from the game seed).
+        self.batched_rollouts = batched_rollouts
+        self.np_rng = np.random.default_rng(self.rng.getrandbits(64))
+
+        # Rollout statistics reused across searches (None to search from scratch).
+        self.transpositions = transpositions
+
+        # Pluggable decision strategy (None for the Monte Carlo search below).
+        self.strategy = strategy
+
+        # Anytime search: rollouts run in rounds until the budget is spent.
+        self.time_budget = time_budget
+        self.rollout_budget = rollout_budget
+        self.early_stop_z = early_stop_z
+        self.rollouts_per_round = 64 if batched_rollouts else 4
+        self.MIN_ROLLOUTS_EARLY_STOP = 8
+
+        # Adaptive allocation of the rollouts across the first moves.
+        self.allocation = allocation
+        self.UCB_COEFF = 1.0
+
+        # Rollout policy (None for uniformly random legal moves).
+        # NB: Batched rollouts are always uniformly random.
+        self.rollout_policy = rollout_policy
+
+        # Number of rollouts run for each first move in the last decision.
+        self.rollout_counts = {mv: 0 for mv in self.MOVES}
+
+        # Steps simulated by the (in-process) rollouts so far.
+        self.simulated_steps = 0
+
+        # Afterstate after the first move of the last rollout (None if it made
+        # no move), and the number of its steps.
+        self.last_rollout = (None, 0)
+
+        # Per-decision instrumentation (None to skip it entirely).
+        self.instrument = instrument
+
+        # Record of the game for storage and replay (None to skip it).
+        self.trajectory = trajectory
+
+        # Book of precomputed moves for frequent positions (None to always search).
+        self.opening_book = opening_book
+
+    def __enter__(self: 'Bot') -> 'Bot':
+        '''
+        Enters the context of the bot (closed on exit, see close).
+
+            Parameters:
+                self ('Bot')
+
+            Returns:
+                ('Bot') : The bot itself.
+        '''
+        return self
+
+    def __exit__(self: 'Bot', *exc_info: object) -> None:
+        '''
+        Exits the context of the bot, closing it.
+
+            Parameters:
+                self ('Bot')
+                exc_info (object) : Exception raised in the context (if any).
+        '''
+        self.close()
+
+    def close(self: 'Bot') -> None:
+        '''
+        Releases the resources of the bot: shuts down the worker processes of
+        the search pool (the later searches are serial). Called by play once
+        the game is over, and to be called by any caller that drives
+        search_move directly (or use the bot as a context manager).
+
+            Parameters:
+                self ('Bot')
+        '''
+        if self.search_pool is not None:
+            self.search_pool.close()
+            self.search_pool = None
+
     def update_costs(self: 'Bot', move: str, score: int) -> None:
         '''
         Updates the cost using score sum and the heuristics for counting empty
@@ -53,8 +228,21 @@ class Bot(GameBoard):
                 move (str)  : Current move.
                 score (int) : Score sum for the current move after simulations.
         '''
-        self.costs[move] += score
-        self.costs[move] += self.EMPTY_SPOT_COEFF * np.count_nonzero(self.grid == 0)
+        self.costs[move] += self.board_cost(score)
+
+    def board_cost(self: 'Bot', score: int) -> int:
+        '''
+        Returns the cost of the current board: the score sum and the number
+        of empty spots multiplied by the constant.
+
+            Parameters:
+                self ('Bot')
+                score (int) : Score sum for the current move after simulations.
+
+            Returns:
+                (int) : Cost of the board.
+        '''
+        return score + self.EMPTY_SPOT_COEFF * self.engine.count_empty(self.board)
 
     def update_search_params(self: 'Bot') -> None:
         '''
@@ -83,37 +271,561 @@ class Bot(GameBoard):
         
         return max(self.costs, key=self.costs.get)
 
-    def simulate_move(self: 'Bot') -> int:
+    def simulate_move(self: 'Bot', search_depth: int=None) -> int:
         '''
         Simulates the future state of the game for a given move.
 
             Parameters:
                 self ('Bot')
+                search_depth (int) : Depth of the rollout (self.search_depth if not set).
             
             Returns:
                 total_score (int) : Total score obtained in the simulations.
         '''
+        if search_depth is None:
+            search_depth = self.search_depth
+
+        if self.rollout_policy is not None:
+            return self.simulate_policy(search_depth)
+
         counter = 1
         total_score = 0
-        game_over = False
+        afterstate = None
+
+        while counter < search_depth:
+            # Only the legal moves are drawn (the same distribution as
+            # re-drawing the moves that do not change the board).
+            moves = self.legal_moves()
+
+            # Case: no legal moves (game over).
+            if not moves:
+                break
+
+            self.make_move(self.rng.choice(moves))
+
+            if afterstate is None:
+                afterstate = self.board
+
+            self.insert_new_num()
+            counter += 1
+            total_score += self.score
+
+        self.simulated_steps += counter - 1
+        self.last_rollout = (afterstate, counter - 1)
+        return total_score
+
+    def simulate_policy(self: 'Bot', search_depth: int) -> int:
+        '''
+        Simulates the future state of the game with the moves selected by the
+        rollout policy. The policy selects legal moves only, so each step
+        advances the rollout.
+
+            Parameters:
+                self ('Bot')
+                search_depth (int) : Depth of the rollout.
+
+            Returns:
+                total_score (int) : Total score obtained in the simulations.
+        '''
+        counter = 1
+        total_score = 0
+        afterstate = None
+
+        while counter < search_depth:
+            selected = self.rollout_policy.select(self.board, self.rng)
+
+            # Case: no legal moves (game over).
+            if selected is None:
+                break
 
-        while counter < self.search_depth and not game_over:
-            prev_simulated_grid = self.grid.copy()
-            random_move = self.shuffle_move()
-            self.make_move(random_move)
+            self.board = selected[1]
 
-            # State of the game after random move.
-            new_simulated_score = self.score
-            game_over = self.check_if_over()
-            diff_random_move = (not np.array_equal(self.grid, prev_simulated_grid))
+            if afterstate is None:
+                afterstate = self.board
 
-            if not game_over and diff_random_move:
-                self.insert_new_num()
-                counter += 1
-                total_score += new_simulated_score
+            self.insert_new_num()
+            counter += 1
+            total_score += self.score
 
+        self.simulated_steps += counter - 1
+        self.last_rollout = (afterstate, counter - 1)
         return total_score
 
+    def simulate_parallel(self: 'Bot', root_boards: dict) -> None:
+        '''
+        Simulates the future states for all the first moves at once, spreading
+        chunks of rollouts across the search pool. The seeds of the chunks are
+        drawn in a fixed order, so the decisions are the same for a fixed seed.
+
+            Parameters:
+                self ('Bot')
+                root_boards (dict) : First move -> (packed board after insert, rollouts).
+        '''
+        tasks = []
+
+        for first_move, (board, rollouts) in root_boards.items():
+            for start in range(0, rollouts, ROLLOUT_CHUNK):
+                n = min(ROLLOUT_CHUNK, rollouts - start)
+                tasks.append((
+                    first_move,
+                    board,
+                    self.search_depth,
+                    self.score,
+                    self.EMPTY_SPOT_COEFF,
+                    n,
+                    self.rng.getrandbits(32)
+                ))
+
+        for task, cost in zip(tasks, self.search_pool.simulate(tasks)):
+            self.costs[task[0]] += cost
+
+    def simulate_batched(self: 'Bot', root_boards: dict) -> None:
+        '''
+        Simulates the future states for all the first moves in a single
+        vectorised call. A batch pays off only from BATCHED_MIN_ROLLOUTS
+        rollouts (smaller ones are run serially, see use_batch), so the
+        early decisions of a game, with few rollouts each, are searched
+        serially even in the batched mode. The rollouts of many games are
+        batched together by bot.multi_game instead.
+
+            Parameters:
+                self ('Bot')
+                root_boards (dict) : First move -> (packed board after insert, rollouts).
+        '''
+        moves = list(root_boards)
+        rollouts = np.array([root_boards[mv][1] for mv in moves], dtype=np.int64)
+        boards = np.repeat(
+            np.array([root_boards[mv][0] for mv in moves], dtype=np.uint64),
+            rollouts
+        )
+        costs = simulate_batch(
+            boards,
+            self.search_depth,
+            int(self.score),
+            self.EMPTY_SPOT_COEFF,
+            self.np_rng
+        )
+        owners = np.repeat(np.arange(len(moves)), rollouts)
+        costs_per_move = np.bincount(owners, weights=costs, minlength=len(moves))
+
+        for first_move, cost in zip(moves, costs_per_move):
+            self.costs[first_move] += int(cost)
+
+    def use_batch(self: 'Bot', n_rollouts: int) -> bool:
+        '''
+        Checks if the rollouts are run as one vectorised batch: in the batched
+        mode, once there are at least BATCHED_MIN_ROLLOUTS of them.
+
+            Parameters:
+                self ('Bot')
+                n_rollouts (int) : Number of the rollouts.
+
+            Returns:
+                (bool) : True if the rollouts are batched; False otherwise.
+        '''
+        return self.batched_rollouts and n_rollouts >= BATCHED_MIN_ROLLOUTS
+
+    def reuse_samples(self: 'Bot', key: int) -> list:
+        '''
+        Returns the rollouts cached for an afterstate, to be reused in place of
+        new ones (at most searches_per_move of them). Besides the rollouts of
+        the search depth, the ones one step shorter are reused too: these are
+        recorded by the previous decision, whose rollouts passed through the
+        afterstate after their first move, and each of them is extended by the
+        missing step.
+
+            Parameters:
+                self ('Bot')
+                key (int) : Canonical afterstate of the first move.
+
+            Returns:
+                samples (list) : Reused rollouts as (steps, final board).
+        '''
+        found = self.transpositions.get([(key, self.search_depth), (key, self.search_depth - 1)])
+
+        if found is None:
+            return []
+
+        (_, depth), cached = found
+        samples = []
+
+        for steps, board in cached[:self.searches_per_move]:
+            if depth < self.search_depth:
+                self.push_board()
+                self.board = board
+                self.simulate_move(self.search_depth - depth + 1)
+                steps += self.last_rollout[1]
+                board = self.board
+                self.pop_board()
+
+            samples.append((steps, board))
+
+        self.transpositions.rollouts_saved += len(samples)
+        return samples
+
+    def sample_cost(self: 'Bot', steps: int, board: int) -> int:
+        '''
+        Returns the cost of a rollout (as accumulated by update_costs), given
+        its number of steps and its final board.
+
+            Parameters:
+                self ('Bot')
+                steps (int) : Number of steps of the rollout.
+                board (int) : Final packed board of the rollout.
+
+            Returns:
+                (int) : Cost of the rollout.
+        '''
+        return self.score * steps + self.EMPTY_SPOT_COEFF * self.engine.count_empty(board)
+
+    def store_samples(self: 'Bot', keys: dict, samples: dict, suffixes: list) -> None:
+        '''
+        Caches the rollouts of the decision: the rollouts of each first move,
+        and the remainders of the rollouts of the selected move after their
+        first step (one step shorter), keyed by the afterstate they passed
+        through. If the next spawn matches the one searched, these afterstates
+        are the first afterstates of the next decision.
+
+            Parameters:
+                self ('Bot')
+                keys (dict)     : Canonical afterstate of each first move.
+                samples (dict)  : Rollouts of each first move as (steps, final board).
+                suffixes (list) : Remainders of the rollouts of the selected move
+                                  as (afterstate, steps, final board).
+        '''
+        for first_move, key in keys.items():
+            self.transpositions.store((key, self.search_depth), samples[first_move])
+
+        grouped = {}
+
+        for afterstate, steps, board in suffixes:
+            grouped.setdefault(afterstate, []).append((steps, board))
+
+        for afterstate, remainders in grouped.items():
+            self.transpositions.add((canonicalize(afterstate)[0], self.search_depth - 1), remainders)
+
+    def expand_first_move(self: 'Bot', first_move: str) -> int:
+        '''
+        Makes the first move of a search (and inserts a new number), updating
+        its costs. The board is left in the state after the insert, with the
+        original board on the undo stack (restored by pop_board).
+
+            Parameters:
+                self ('Bot')
+                first_move (str) : Current first move (one of self.legal_moves()).
+
+            Returns:
+                afterstate (int) : Packed board after the move (before the insert).
+        '''
+        afterstate = self.push_move(first_move)
+
+        # Update the costs for the current move (max tile after the move).
+        self.update_costs(first_move, self.engine.max_tile(afterstate))
+
+        return afterstate
+
+    def run_round(self: 'Bot', root_boards: dict, budget: int=None) -> list:
+        '''
+        Runs a round of rollouts (self.rollouts_per_round per first move). The
+        round is trimmed to the remaining budget, split evenly across the moves.
+
+            Parameters:
+                self ('Bot')
+                root_boards (dict) : First move -> packed board after the first insert.
+                budget (int)       : Max number of the rollouts of the round (None for no limit).
+
+            Returns:
+                results (list) : Pairs of (first move, cost of the rollout).
+        '''
+        moves = list(root_boards)
+        counts = [self.rollouts_per_round] * len(moves)
+
+        if budget is not None and budget < sum(counts):
+            counts = [budget // len(moves) + (i < budget % len(moves)) for i in range(len(moves))]
+
+        if self.use_batch(sum(counts)):
+            boards = np.repeat(
+                np.array([root_boards[mv] for mv in moves], dtype=np.uint64),
+                counts
+            )
+            costs = simulate_batch(
+                boards,
+                self.search_depth,
+                int(self.score),
+                self.EMPTY_SPOT_COEFF,
+                self.np_rng
+            )
+            owners = np.repeat(moves, counts)
+            return [(mv, int(cost)) for mv, cost in zip(owners, costs)]
+
+        results = []
+
+        for (first_move, board), n in zip(root_boards.items(), counts):
+            for _ in range(n):
+                self.push_board()
+                self.board = board
+                total_score = self.simulate_move()
+                results.append((first_move, self.board_cost(total_score)))
+                self.pop_board()
+
+        return results
+
+    def rollout_mean(self: 'Bot', move: str, first_costs: dict) -> float:
+        '''
+        Returns the mean cost of the rollouts run for a first move so far
+        (derived from self.costs and self.rollout_counts).
+
+            Parameters:
+                self ('Bot')
+                move (str)         : First move.
+                first_costs (dict) : Costs of the first moves only (before rollouts).
+
+            Returns:
+                (float) : Mean cost of a rollout.
+        '''
+        return (self.costs[move] - first_costs[move]) / self.rollout_counts[move]
+
+    def rollout_variance(self: 'Bot', move: str, first_costs: dict, sq_sums: dict) -> float:
+        '''
+        Returns the sample variance of the rollout costs of a first move.
+
+            Parameters:
+                self ('Bot')
+                move (str)         : First move.
+                first_costs (dict) : Costs of the first moves only (before rollouts).
+                sq_sums (dict)     : Sums of squared rollout costs per first move.
+
+            Returns:
+                (float) : Sample variance of the rollout costs.
+        '''
+        n = self.rollout_counts[move]
+
+        if n < 2:
+            return 0.0
+
+        mean = self.rollout_mean(move, first_costs)
+        return max(sq_sums[move] - n * mean * mean, 0.0) / (n - 1)
+
+    def lead_is_safe(self: 'Bot', candidates: list, first_costs: dict, sq_sums: dict) -> bool:
+        '''
+        Checks if the best move leads all the others by at least
+        self.early_stop_z standard errors (Welch's z-statistic).
+
+            Parameters:
+                self ('Bot')
+                candidates (list)  : First moves still in contention.
+                first_costs (dict) : Costs of the first moves only (before rollouts).
+                sq_sums (dict)     : Sums of squared rollout costs per first move.
+
+            Returns:
+                (bool) : True if the search can stop early; False otherwise.
+        '''
+        if len(candidates) < 2:
+            return True
+
+        summary = {}
+
+        for mv in candidates:
+            n = self.rollout_counts[mv]
+
+            if n < self.MIN_ROLLOUTS_EARLY_STOP:
+                return False
+
+            summary[mv] = (
+                self.rollout_mean(mv, first_costs),
+                self.rollout_variance(mv, first_costs, sq_sums) / n
+            )
+
+        best = max(summary, key=lambda mv: summary[mv][0])
+
+        for mv, (mean, sq_err) in summary.items():
+            if mv == best:
+                continue
+
+            err = math.sqrt(summary[best][1] + sq_err)
+            lead = summary[best][0] - mean
+
+            if (err == 0 and lead <= 0) or (err > 0 and lead / err < self.early_stop_z):
+                return False
+
+        return True
+
+    def allocate_round(self: 'Bot', candidates: list, first_costs: dict, sq_sums: dict) -> list:
+        '''
+        Selects the first moves to receive the next round of rollouts:
+            - None (uniform) / 'halving' : all the moves still in contention,
+            - 'ucb' : the move with the highest upper confidence bound (UCB1,
+                      scaled by the pooled std of the rollout costs).
+
+            Parameters:
+                self ('Bot')
+                candidates (list)  : First moves still in contention.
+                first_costs (dict) : Costs of the first moves only (before rollouts).
+                sq_sums (dict)     : Sums of squared rollout costs per first move.
+
+            Returns:
+                (list) : First moves for the next round.
+        '''
+        if self.allocation != 'ucb':
+            return candidates
+
+        unexplored = [mv for mv in candidates if self.rollout_counts[mv] == 0]
+
+        if unexplored:
+            return unexplored
+
+        # Pooled variance, with total - len(candidates) degrees of freedom
+        # (none if each move has a single rollout, e.g. after a trimmed round).
+        total = sum(self.rollout_counts[mv] for mv in candidates)
+        dof = total - len(candidates)
+        pooled_var = sum(
+            (self.rollout_counts[mv] - 1) * self.rollout_variance(mv, first_costs, sq_sums)
+            for mv in candidates
+        ) / dof if dof > 0 else 0.0
+        scale = self.UCB_COEFF * math.sqrt(pooled_var)
+
+        def ucb(mv: str) -> float:
+            n = self.rollout_counts[mv]
+            return self.rollout_mean(mv, first_costs) + scale * math.sqrt(2 * math.log(total) / n)
+
+        return [max(candidates, key=ucb)]
+
+    def halve_candidates(self: 'Bot', candidates: list, first_costs: dict) -> list:
+        '''
+        Keeps the better half of the moves still in contention (successive halving).
+
+            Parameters:
+                self ('Bot')
+                candidates (list)  : First moves still in contention.
+                first_costs (dict) : Costs of the first moves only (before rollouts).
+
+            Returns:
+                (list) : First moves kept in contention.
+        '''
+        ranked = sorted(
+            candidates,
+            key=lambda mv: self.rollout_mean(mv, first_costs),
+            reverse=True
+        )
+        return ranked[:math.ceil(len(ranked) / 2)]
+
+    def halving_rounds(self: 'Bot', n_candidates: int, rollout_budget: int, phase: int) -> int:
+        '''
+        Returns the number of rounds in a phase of successive halving. With
+        a rollout budget, it is split evenly across the phases (and the moves
+        in contention); otherwise the k-th phase lasts 2^k rounds.
+
+            Parameters:
+                self ('Bot')
+                n_candidates (int)   : Number of moves in contention.
+                rollout_budget (int) : Budget of rollouts per decision (or None).
+                phase (int)          : Index of the phase.
+
+            Returns:
+                (int) : Number of rounds in the phase.
+        '''
+        if rollout_budget is None:
+            return 2 ** phase
+
+        n_phases = max(1, math.ceil(math.log2(len(self.MOVES))))
+        per_move = rollout_budget // (max(1, n_candidates) * n_phases)
+        return max(1, math.ceil(per_move / self.rollouts_per_round))
+
+    def search_anytime(self: 'Bot') -> str:
+        '''
+        Anytime version of search_move. Rollouts run in rounds, until the time
+        (or rollout) budget of the move is spent, or, optionally, until the
+        lead of the best move is statistically safe. Each round is allocated
+        to the moves still in contention (see allocate_round). Without an
+        explicit budget, the budget is searches_per_move rollouts per move (the
+        last round is trimmed to the budget left). The costs are rescaled to
+        searches_per_move rollouts, as in the fixed search (or, before the
+        search parameters are first set, to the mean rollouts per move).
+
+            Parameters:
+                self ('Bot')
+
+            Returns:
+                best_move (str) : Best searched move ('right'/'left'/'up'/'down').
+        '''
+        deadline = time() + self.time_budget if self.time_budget else None
+        root_boards = {}
+        first_costs = {}
+
+        for first_move in self.legal_moves():
+            self.expand_first_move(first_move)
+            root_boards[first_move] = self.board
+            first_costs[first_move] = self.costs[first_move]
+            self.pop_board()
+
+        rollout_budget = self.rollout_budget
+        if rollout_budget is None and deadline is None:
+            rollout_budget = self.searches_per_move * len(root_boards)
+
+        self.rollout_counts = {mv: 0 for mv in self.MOVES}
+        sq_sums = {mv: 0.0 for mv in root_boards}
+        candidates = list(root_boards)
+        total_rollouts = 0
+
+        # Successive halving: number of rounds in the current phase.
+        rounds_left = self.halving_rounds(len(candidates), rollout_budget, 0)
+        phase = 0
+
+        while len(candidates) > 1:
+            budget_left = None if rollout_budget is None else rollout_budget - total_rollouts
+
+            if budget_left is not None and budget_left <= 0:
+                break
+
+            moves = self.allocate_round(candidates, first_costs, sq_sums)
+
+            for first_move, cost in self.run_round({mv: root_boards[mv] for mv in moves}, budget_left):
+                self.costs[first_move] += cost
+                self.rollout_counts[first_move] += 1
+                sq_sums[first_move] += cost * cost
+                total_rollouts += 1
+
+            # A trimmed (last) round can leave moves without rollouts, so the
+            # candidates are not halved after it.
+            if rollout_budget is not None and total_rollouts >= rollout_budget:
+                break
+
+            if self.allocation == 'halving':
+                rounds_left -= 1
+
+                if rounds_left == 0:
+                    candidates = self.halve_candidates(candidates, first_costs)
+                    phase += 1
+                    rounds_left = self.halving_rounds(len(candidates), rollout_budget, phase)
+
+            if deadline is not None and time() >= deadline:
+                break
+            if self.early_stop_z and self.lead_is_safe(candidates, first_costs, sq_sums):
+                break
+
+        explored = [mv for mv in root_boards if self.rollout_counts[mv]]
+        scale = self.searches_per_move or (total_rollouts / len(explored) if explored else 0)
+
+        for first_move in explored:
+            self.costs[first_move] = (
+                first_costs[first_move]
+                + self.rollout_mean(first_move, first_costs) * scale
+            )
+
+        # Find the best move among the ones still in contention.
+        if candidates and (len(candidates) == 1 or self.allocation == 'halving'):
+            best_move = max(candidates, key=self.costs.get)
+        else:
+            best_move = self.select_best_move()
+
+        if self.instrument is not None:
+            self.instrument.record_costs(self.costs)
+
+        # Reset the dictionary (the board is restored after each rollout).
+        self.costs = {mv: 0 for mv in self.MOVES}
+
+        return best_move
+
     def search_move(self: 'Bot') -> str:
         '''
         AI bot searches the most optimal path by simulating future states of the
@@ -127,44 +839,184 @@ class Bot(GameBoard):
             Returns:
                 best_move (str) : Best searched move ('right'/'left'/'up'/'down').
         '''
-        original_grid = self.grid.copy()
+        # The book moves and the strategies run no rollouts (and no costs are
+        # recorded for them).
+        if self.opening_book is not None or self.strategy is not None:
+            self.rollout_counts = {mv: 0 for mv in self.MOVES}
 
-        for first_move in self.MOVES:
-            self.make_move(first_move)
+            if self.instrument is not None:
+                self.instrument.record_costs({})
 
-            # State of the game after first move.
-            score_first_move = np.max(self.grid)
-            game_over_first_move = self.check_if_over()
-            diff_first_move = (not (self.grid == original_grid).all())
+        if self.opening_book is not None:
+            book_move = self.opening_book.lookup(self.board)
 
-            if not game_over_first_move and diff_first_move:
-                self.insert_new_num()
-                search_board_after_first_insert = self.grid.copy()
+            if book_move is not None:
+                return book_move
 
-                # Update the costs for the current move.
-                self.update_costs(first_move, score_first_move)
-            else:
-                continue
+        if self.strategy is not None:
+            return self.strategy.search_move(self.board) or self.shuffle_move()
+
+        if self.time_budget or self.rollout_budget or self.allocation:
+            return self.search_anytime()
+
+        # The board is mutated in place and restored from the undo stack.
+        legal_moves = self.legal_moves()
+        batched = self.use_batch(self.searches_per_move * len(legal_moves))
+        root_boards = {}
+        first_costs = {}
+        rollouts = {}
+        keys = {}
+        samples = {}
+        suffixes = {}
+
+        # Illegal first moves (that do not change the board) are never tried.
+        for first_move in legal_moves:
+            afterstate = self.expand_first_move(first_move)
+            search_board_after_first_insert = self.board
+            first_costs[first_move] = self.costs[first_move]
+
+            # Afterstate key, shared by its 8 symmetric variants.
+            if self.transpositions is not None:
+                keys[first_move] = canonicalize(afterstate)[0]
+                samples[first_move] = self.reuse_samples(keys[first_move])
+                suffixes[first_move] = []
+
+                for steps, board in samples[first_move]:
+                    self.costs[first_move] += self.sample_cost(steps, board)
+
+            rollouts[first_move] = self.searches_per_move - len(samples.get(first_move, ()))
 
             # Simulate the future state of the game for the current first move.
-            for _ in range(self.searches_per_move):
-                self.grid = search_board_after_first_insert.copy()
-                total_score = self.simulate_move()
+            if self.search_pool is not None or batched:
+                root_boards[first_move] = (search_board_after_first_insert, rollouts[first_move])
+            else:
+                for _ in range(rollouts[first_move]):
+                    self.push_board()
+                    total_score = self.simulate_move()
+
+                    # Update the costs after simulation.
+                    self.update_costs(first_move, total_score)
+
+                    if self.transpositions is not None:
+                        rollout_afterstate, steps = self.last_rollout
+                        samples[first_move].append((steps, self.board))
+
+                        if rollout_afterstate is not None:
+                            suffixes[first_move].append((rollout_afterstate, steps - 1, self.board))
 
-                # Update the costs after simulation.
-                self.update_costs(first_move, total_score)
+                    self.pop_board()
 
-            self.grid = original_grid.copy()
+            self.pop_board()
+
+        if root_boards and self.search_pool is not None:
+            self.simulate_parallel(root_boards)
+        elif root_boards:
+            self.simulate_batched(root_boards)
+
+        self.rollout_counts = {mv: rollouts.get(mv, 0) for mv in self.MOVES}
 
         # Find the best (most optimal) move denoted by highest cost.
         best_move = self.select_best_move()
 
-        # Reset the grid and the dictionary to their original states.
-        self.grid = original_grid.copy()
+        if self.transpositions is not None:
+            self.store_samples(keys, samples, suffixes.get(best_move, []))
+
+        if self.instrument is not None:
+            self.instrument.record_costs(self.costs)
+
+        # Reset the dictionary (the board is restored by the undo stack).
         self.costs = {mv: 0 for mv in self.MOVES}
 
         return best_move
 
+    def run_phase(self: 'Bot', name: str, func: callable, *args: object) -> object:
+        '''
+        Runs a phase of the game loop (timed by the instrument, if attached).
+
+            Parameters:
+                self ('Bot')
+                name (str)      : Name of the phase.
+                func (callable) : Function of the phase.
+                args (object)   : Arguments of the function.
+
+            Returns:
+                (object) : Result of the function.
+        '''
+        if self.instrument is None:
+            return func(*args)
+
+        return self.instrument.run_phase(name, func, *args)
+
+    def play_step(self: 'Bot') -> bool:
+        '''
+        Plays a single step of the game loop: checks if the game is won, then
+        searches and makes the next move, and inserts a new number (if the move
+        changed the board). Shared by play and the offline tools (e.g. the
+        opening book builder), so that all of them play the same games.
+
+            Parameters:
+                self ('Bot')
+
+            Returns:
+                True/False (bool) : True if the game is over (won or lost); False otherwise.
+        '''
+        instrument = self.instrument
+        trajectory = self.trajectory
+
+        if instrument is not None:
+            instrument.begin_decision(self)
+
+        self.update_score()
+        self.run_phase('render', self.notify_move)
+
+        # Case: BOT WIN.
+        if self.score >= 2048:
+            self.win = 1
+
+            if instrument is not None:
+                instrument.end_decision(self, None, False)
+
+            return True
+
+        # Perform search for the next move.
+        old_board = self.board
+        decision_start = perf_counter() if trajectory is not None else 0
+        next_move = self.run_phase('search', self.search_move)
+
+        if trajectory is not None:
+            trajectory.add_move(
+                next_move,
+                self.search_depth,
+                self.searches_per_move,
+                sum(self.rollout_counts.values()),
+                int((perf_counter() - decision_start) * 1e6)
+            )
+
+        # Peform the most optimal move.
+        self.run_phase('move', self.make_move, next_move)
+        self.move_num += 1
+
+        # Case: BOT LOSS.
+        if self.run_phase('check_if_over', self.check_if_over):
+            if instrument is not None:
+                instrument.end_decision(self, next_move, self.board != old_board)
+
+            return True
+
+        if self.board != old_board:
+            # Update the search-related params and insert new number.
+            self.update_search_params()
+            moved_board = self.board
+            self.run_phase('insert', self.insert_new_num, 1, self.spawn_rng)
+
+            if trajectory is not None:
+                trajectory.add_spawns(moved_board, self.board)
+
+        if instrument is not None:
+            instrument.end_decision(self, next_move, self.board != old_board)
+
+        return False
+
     def play(self: 'Bot') -> None:
         '''
         Main method to make the bot play the game.
@@ -172,50 +1024,22 @@ class Bot(GameBoard):
             Parameters:
                 self ('Bot')
         '''
-        # Initialize the board, with 2 starting numbers in the grid.
-        self.insert_new_num(n=2)
+        # Initialize the board, with 2 starting numbers in the grid (the numbers
+        # of the played game are drawn from their own stream).
+        self.insert_new_num(n=2, rng=self.spawn_rng)
         start = self.set_timer()
 
+        if self.trajectory is not None:
+            self.trajectory.add_spawns(0, self.board)
+
         try:
             # Play as long as the game is neither over, nor won by the AI bot.
-            while True:
-                self.draw()
-                self.update_score()
-                text_area = self.font_score.render(
-                    f'SCORE: {self.score:06d}',
-                    True,
-                    WINDOW_FONT_COLOR
-                )
-                self.window.blit(
-                    text_area,
-                    text_area.get_rect(center=(115, 20))
-                )
-                pygame.display.flip()
-
-                # Case: BOT WIN.
-                if self.score == 2048:
-                    self.timer = self.stop_timer(start)
-                    self.win = 1
-                    self.draw_win_screen()
-                    return
-
-                # Perform search for the next move.
-                old_grid = self.grid.copy()
-                next_move = self.search_move()
-
-                # Peform the most optimal move.
-                self.make_move(next_move)
-                self.move_num += 1
-
-                # Case: BOT LOSS.
-                if self.check_if_over():
-                    self.timer = self.stop_timer(start)
-                    self.draw_loss_screen()
-                    return
-
-                if not (self.grid == old_grid).all():
-                    # Update the search-related params and insert new number.
-                    self.update_search_params()
-                    self.insert_new_num()
+            while not self.play_step():
+                pass
+
+            self.timer = self.stop_timer(start)
+            self.notify_game_over()
         except KeyboardInterrupt:
             print('\nCtrl+C detected. Exiting the game...\n')
+        finally:
+            self.close()
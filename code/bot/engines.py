@@ -0,0 +1,435 @@
+'''
+code/bot/engines.py
+
+2048-intelligent-bot: Board engines for the NxN game boards (3x3 to 8x8).
+
+Any NxN grid is packed into a single integer of N*N nibbles, where the cell
+(row, col) is stored at the nibble with index N * row + col (as in the 4x4
+bitboard). Each engine resolves the moves of one board size:
+    - 4x4 : the bitboard module itself (the fast path, see bot/bitboard.py),
+    - 3x3 : PackedEngine, lookup tables precomputed for each possible row,
+    - 5x5 to 8x8 : ArrayEngine, all the rows slid at once with numpy (the
+                   rows are too wide for the tables).
+All the engines expose the same functions as the bitboard module, so the
+game and the bot work with any of them.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import numpy as np
+from bot import bitboard
+from bot.bitboard import MAX_EXPONENT, _slide_row
+
+
+MIN_SIZE = 3
+MAX_SIZE = 8
+
+# Largest board size, for which the rows fit into the lookup tables.
+MAX_PACKED_SIZE = 4
+
+
+class NibbleEngine:
+    '''
+    -----------
+    Class with the operations on the packed NxN boards that do not depend on
+    the moves (empty cells, max tile, packing).
+    -----------
+    '''
+
+    def __init__(self: 'NibbleEngine', size: int) -> None:
+        '''
+        Constructor to precompute the masks of the board size.
+
+            Parameters:
+                self ('NibbleEngine')
+                size (int) : Size of the NxN board.
+        '''
+        self.SIZE = size
+        self.CELLS = size * size
+        self.EMPTY_MASK = int('1' * self.CELLS, 16)
+        self.PAIR_MASK = int('3' * self.CELLS, 16)
+
+    def empty_mask(self: 'NibbleEngine', board: int) -> int:
+        '''
+        Returns a mask with the lowest bit of each empty nibble set.
+        '''
+        x = board | ((board >> 2) & self.PAIR_MASK)
+        x |= (x >> 1)
+        return ~x & self.EMPTY_MASK
+
+    def count_empty(self: 'NibbleEngine', board: int) -> int:
+        '''
+        Counts the empty cells on the packed board.
+        '''
+        return self.empty_mask(board).bit_count()
+
+    def empty_cells(self: 'NibbleEngine', board: int) -> list:
+        '''
+        Lists the indices of the empty cells (nibbles) on the packed board.
+        '''
+        mask = self.empty_mask(board)
+        cells = []
+
+        while mask:
+            low = mask & -mask
+            cells.append(low.bit_length() >> 2)
+            mask ^= low
+
+        return cells
+
+    def nth_empty_cell(self: 'NibbleEngine', board: int, n: int) -> int:
+        '''
+        Returns the index of the n-th empty cell (without listing all of them).
+        '''
+        mask = self.empty_mask(board)
+
+        for _ in range(n):
+            mask &= mask - 1
+
+        return (mask & -mask).bit_length() >> 2
+
+    def max_tile(self: 'NibbleEngine', board: int) -> int:
+        '''
+        Returns the max tile value (not the exponent) on the packed board.
+        '''
+        # The hex digits of the board are its nibbles.
+        exp = int(max(f'{board:x}'), 16)
+        return (1 << exp) if exp else 0
+
+    def legal_moves(self: 'NibbleEngine', board: int) -> tuple:
+        '''
+        Lists the moves that change the packed board.
+        '''
+        return bitboard.LEGAL_MOVES[self.legal_mask(board)]
+
+    def is_over(self: 'NibbleEngine', board: int) -> bool:
+        '''
+        Checks if none of the moves changes the packed board.
+        '''
+        # Any board with both empty and non-empty cells has at least one move.
+        if board and self.empty_mask(board):
+            return False
+
+        return self.legal_mask(board) == 0
+
+    def pack_grid(self: 'NibbleEngine', grid: np.ndarray) -> int:
+        '''
+        Packs an NxN grid of tile values into an integer.
+        '''
+        board = 0
+
+        for i, val in enumerate(np.asarray(grid).flat):
+            if val:
+                board |= (int(val).bit_length() - 1) << (4 * i)
+
+        return board
+
+    def unpack_grid(self: 'NibbleEngine', board: int) -> np.ndarray:
+        '''
+        Unpacks an integer into an NxN grid of tile values.
+        '''
+        exps = np.array([(board >> (4 * i)) & 0xF for i in range(self.CELLS)], dtype=int)
+        return np.where(exps > 0, 1 << exps, 0).reshape(self.SIZE, self.SIZE)
+
+
+class PackedEngine(NibbleEngine):
+    '''
+    -----------
+    Class to resolve the moves on small boards with precomputed row tables
+    (the generalisation of the 4x4 bitboard).
+    -----------
+    '''
+
+    def __init__(self: 'PackedEngine', size: int) -> None:
+        '''
+        Constructor to precompute the XOR deltas for all the possible rows.
+
+            Parameters:
+                self ('PackedEngine')
+                size (int) : Size of the NxN board (at most MAX_PACKED_SIZE).
+        '''
+        super().__init__(size)
+        self.ROW_BITS = 4 * size
+        self.ROW_MASK = (1 << self.ROW_BITS) - 1
+        self.ROW_SHIFTS = [self.ROW_BITS * i for i in range(size)]
+        self.COL_SHIFTS = [4 * i for i in range(size)]
+
+        n_rows = self.ROW_MASK + 1
+        self.ROW_LEFT, self.ROW_RIGHT = [0] * n_rows, [0] * n_rows
+        self.COL_UP, self.COL_DOWN = [0] * n_rows, [0] * n_rows
+
+        # Row spread into the first column (used to transpose the board).
+        self.COL_SPREAD = [self.spread_col(row) for row in range(n_rows)]
+
+        for row in range(n_rows):
+            cells = [(row >> (4 * i)) & 0xF for i in range(size)]
+            result = self.pack_row(_slide_row(cells))
+            rev_row = self.pack_row(cells[::-1])
+            rev_result = self.pack_row(_slide_row(cells)[::-1])
+
+            self.ROW_LEFT[row] = row ^ result
+            self.ROW_RIGHT[rev_row] = rev_row ^ rev_result
+            self.COL_UP[row] = self.COL_SPREAD[row] ^ self.spread_col(result)
+            self.COL_DOWN[rev_row] = self.COL_SPREAD[rev_row] ^ self.spread_col(rev_result)
+
+        # Legal slides of each row (bit 0 for left, bit 1 for right).
+        self.ROW_LEGAL = [
+            (self.ROW_LEFT[row] != 0) | ((self.ROW_RIGHT[row] != 0) << 1)
+            for row in range(n_rows)
+        ]
+
+        self.MOVE_FUNCTIONS = {
+            'right': self.move_right,
+            'left': self.move_left,
+            'up': self.move_up,
+            'down': self.move_down
+        }
+
+    def pack_row(self: 'PackedEngine', cells: list) -> int:
+        '''
+        Packs a list of N exponents into a row.
+        '''
+        return sum(cell << (4 * i) for i, cell in enumerate(cells))
+
+    def spread_col(self: 'PackedEngine', row: int) -> int:
+        '''
+        Spreads a row into the first column of the packed board.
+        '''
+        return sum(((row >> (4 * i)) & 0xF) << shift for i, shift in enumerate(self.ROW_SHIFTS))
+
+    def transpose(self: 'PackedEngine', board: int) -> int:
+        '''
+        Transposes the packed board (rows become columns).
+        '''
+        spread, mask = self.COL_SPREAD, self.ROW_MASK
+        t = 0
+
+        for i, shift in enumerate(self.ROW_SHIFTS):
+            t |= spread[(board >> shift) & mask] << (4 * i)
+
+        return t
+
+    def move_rows(self: 'PackedEngine', board: int, table: list) -> int:
+        '''
+        Returns the packed board after sliding its rows (with a row table).
+        '''
+        mask = self.ROW_MASK
+
+        for shift in self.ROW_SHIFTS:
+            board ^= table[(board >> shift) & mask] << shift
+
+        return board
+
+    def move_cols(self: 'PackedEngine', board: int, table: list) -> int:
+        '''
+        Returns the packed board after sliding its columns (with a column table).
+        '''
+        t = self.transpose(board)
+        mask = self.ROW_MASK
+
+        for row_shift, col_shift in zip(self.ROW_SHIFTS, self.COL_SHIFTS):
+            board ^= table[(t >> row_shift) & mask] << col_shift
+
+        return board
+
+    def move_left(self: 'PackedEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles to the left.
+        '''
+        return self.move_rows(board, self.ROW_LEFT)
+
+    def move_right(self: 'PackedEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles to the right.
+        '''
+        return self.move_rows(board, self.ROW_RIGHT)
+
+    def move_up(self: 'PackedEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles up.
+        '''
+        return self.move_cols(board, self.COL_UP)
+
+    def move_down(self: 'PackedEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles down.
+        '''
+        return self.move_cols(board, self.COL_DOWN)
+
+    def legal_mask(self: 'PackedEngine', board: int) -> int:
+        '''
+        Returns a mask of the moves that change the packed board (bits 0-3 for
+        'right', 'left', 'up', 'down'), using the row table only.
+        '''
+        legal, mask = self.ROW_LEGAL, self.ROW_MASK
+        t = self.transpose(board)
+        rows = cols = 0
+
+        for shift in self.ROW_SHIFTS:
+            rows |= legal[(board >> shift) & mask]
+            cols |= legal[(t >> shift) & mask]
+
+        return ((rows & 1) << 1) | (rows >> 1) | ((cols & 1) << 2) | ((cols & 2) << 2)
+
+
+class ArrayEngine(NibbleEngine):
+    '''
+    -----------
+    Class to resolve the moves on large boards with numpy. All the rows of
+    the board, in all the four directions, are slid at once, and the results
+    are kept for the last board (a rollout lists the legal moves of a board
+    and then makes one of them).
+    -----------
+    '''
+
+    def __init__(self: 'ArrayEngine', size: int) -> None:
+        '''
+        Constructor to set up the byte layout of the board size.
+
+            Parameters:
+                self ('ArrayEngine')
+                size (int) : Size of the NxN board.
+        '''
+        super().__init__(size)
+        self.N_BYTES = (self.CELLS + 1) // 2
+        self.COLS = np.arange(size)
+
+        # Row indices of the slid rows (all the rows of the four directions).
+        self.ROW_INDEX = np.arange(4 * size)[:, None]
+
+        # Low and high nibble of each byte value.
+        self.NIBBLES = np.array([[b & 0xF, b >> 4] for b in range(256)], dtype=np.uint8)
+
+        # Results of the four moves (in the order of MOVE_FUNCTIONS) for the last board.
+        self.last_board = None
+        self.last_results = None
+
+        self.MOVE_FUNCTIONS = {
+            'right': self.move_right,
+            'left': self.move_left,
+            'up': self.move_up,
+            'down': self.move_down
+        }
+
+    def to_cells(self: 'ArrayEngine', board: int) -> np.ndarray:
+        '''
+        Unpacks the board into an NxN array of exponents.
+        '''
+        packed = np.frombuffer(board.to_bytes(self.N_BYTES, 'little'), dtype=np.uint8)
+        return self.NIBBLES[packed].ravel()[:self.CELLS].reshape(self.SIZE, self.SIZE)
+
+    def slide_rows(self: 'ArrayEngine', rows: np.ndarray) -> np.ndarray:
+        '''
+        Slides the rows (of exponents) to the left, merging the equal tiles.
+
+            Parameters:
+                self ('ArrayEngine')
+                rows (np.ndarray) : Rows of exponents (R x N).
+
+            Returns:
+                (np.ndarray) : Slid rows.
+        '''
+        # Compact the tiles to the left (the stable sort keeps their order).
+        index = self.ROW_INDEX[:len(rows)]
+        rows = rows[index, np.argsort(rows == 0, axis=1, kind='stable')]
+
+        # In each run of equal tiles, the tiles pair up from the left: a tile
+        # merges with the next one if it is at an even position in its run.
+        starts = np.ones(rows.shape, dtype=bool)
+        starts[:, 1:] = rows[:, 1:] != rows[:, :-1]
+        run_start = np.maximum.accumulate(np.where(starts, self.COLS, 0), axis=1)
+        even = (self.COLS - run_start) % 2 == 0
+        merge = ~starts[:, 1:] & (rows[:, 1:] != 0) & even[:, :-1]
+
+        rows[:, :-1] = np.minimum(rows[:, :-1] + merge, MAX_EXPONENT)
+        rows[:, 1:][merge] = 0
+
+        return rows[index, np.argsort(rows == 0, axis=1, kind='stable')]
+
+    def slide_all(self: 'ArrayEngine', board: int) -> tuple:
+        '''
+        Returns the packed boards after each of the four moves (in the order of
+        MOVE_FUNCTIONS), sliding all the directions in one go.
+
+            Parameters:
+                self ('ArrayEngine')
+                board (int) : Packed board.
+
+            Returns:
+                (tuple) : Packed boards after the 'right', 'left', 'up', 'down' moves.
+        '''
+        if board == self.last_board:
+            return self.last_results
+
+        n = self.SIZE
+        cells = self.to_cells(board)
+        rows = np.concatenate((cells[:, ::-1], cells, cells.T, cells.T[:, ::-1]))
+        slid = self.slide_rows(rows).reshape(4, n, n)
+
+        # Back to the original orientation of each direction.
+        grids = np.stack((slid[0][:, ::-1], slid[1], slid[2].T, slid[3][:, ::-1].T)).reshape(4, -1)
+        flat = np.zeros((4, 2 * self.N_BYTES), dtype=np.uint8)
+        flat[:, :self.CELLS] = grids
+        packed = (flat[:, 0::2] | (flat[:, 1::2] << 4)).tobytes()
+        size = self.N_BYTES
+
+        self.last_board = board
+        self.last_results = tuple(
+            int.from_bytes(packed[i * size:(i + 1) * size], 'little') for i in range(4)
+        )
+        return self.last_results
+
+    def move_right(self: 'ArrayEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles to the right.
+        '''
+        return self.slide_all(board)[0]
+
+    def move_left(self: 'ArrayEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles to the left.
+        '''
+        return self.slide_all(board)[1]
+
+    def move_up(self: 'ArrayEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles up.
+        '''
+        return self.slide_all(board)[2]
+
+    def move_down(self: 'ArrayEngine', board: int) -> int:
+        '''
+        Returns the packed board after moving the tiles down.
+        '''
+        return self.slide_all(board)[3]
+
+    def legal_mask(self: 'ArrayEngine', board: int) -> int:
+        '''
+        Returns a mask of the moves that change the packed board (bits 0-3 for
+        'right', 'left', 'up', 'down').
+        '''
+        results = self.slide_all(board)
+        return sum(1 << i for i in range(4) if results[i] != board)
+
+
+_engines = {MAX_PACKED_SIZE: bitboard}
+
+
+def get_engine(size: int) -> object:
+    '''
+    Returns the engine of the board size (created once per process).
+
+        Parameters:
+            size (int) : Size of the NxN board (MIN_SIZE to MAX_SIZE).
+
+        Returns:
+            (object) : Engine (the bitboard module for 4x4 boards).
+    '''
+    if not MIN_SIZE <= size <= MAX_SIZE:
+        raise ValueError(f'Board size must be between {MIN_SIZE} and {MAX_SIZE}, got {size}.')
+
+    if size not in _engines:
+        _engines[size] = PackedEngine(size) if size <= MAX_PACKED_SIZE else ArrayEngine(size)
+
+    return _engines[size]
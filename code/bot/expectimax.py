@@ -0,0 +1,154 @@
+'''
+code/bot/expectimax.py
+
+2048-intelligent-bot: Expectimax search strategy (alternative to Monte Carlo rollouts).
+
+The search alternates max nodes (the four moves) with chance nodes (a new 2
+inserted into any of the empty cells with equal probability). It deepens
+iteratively until the time budget runs out, and evaluates statically any
+chance branch, whose probability drops below the cutoff.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+from time import time
+from bot.bitboard import MOVE_FUNCTIONS, empty_cells, legal_moves
+from bot.heuristics import HeuristicTable
+
+
+class SearchTimeout(Exception):
+    '''
+    Raised internally when the time budget of a search runs out.
+    '''
+
+
+class Expectimax:
+    '''
+    -----------
+    Class to select moves with a depth-limited expectimax search.
+    -----------
+    '''
+
+    def __init__(
+        self: 'Expectimax',
+        time_budget: float=0.1,
+        max_depth: int=6,
+        prob_cutoff: float=1e-4,
+        evaluate: callable=None
+    ) -> None:
+        '''
+        Constructor to initialize the search parameters.
+
+            Parameters:
+                self ('Expectimax')
+                time_budget (float) : Time budget per move (in seconds).
+                max_depth (int)     : Max depth (number of moves) of the search.
+                prob_cutoff (float) : Min probability of a chance branch to expand.
+                evaluate (callable) : Heuristic evaluation of a packed board
+                                      (default: bot.heuristics.HeuristicTable).
+        '''
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.prob_cutoff = prob_cutoff
+        self.evaluate = evaluate or HeuristicTable()
+
+        # Depth reached by the last search and its number of expanded nodes.
+        self.depth_reached = 0
+        self.nodes = 0
+
+        self.deadline = 0
+        self.cache = {}
+
+    def search_move(self: 'Expectimax', board: int) -> str:
+        '''
+        Searches the best move for the board with iterative deepening.
+
+            Parameters:
+                self ('Expectimax')
+                board (int) : Packed board.
+
+            Returns:
+                best_move (str) : Best move (None if no move changes the board).
+        '''
+        self.deadline = time() + self.time_budget
+        self.depth_reached = 0
+        self.nodes = 0
+        best_move = None
+
+        for depth in range(1, self.max_depth + 1):
+            # Values are cached per search, since depth changes their meaning.
+            self.cache = {}
+
+            try:
+                move = self.max_node(board, depth, 1.0)[1]
+            except SearchTimeout:
+                break
+
+            if move is None:
+                break
+
+            best_move = move
+            self.depth_reached = depth
+
+        self.cache = {}
+        return best_move
+
+    def max_node(self: 'Expectimax', board: int, depth: int, prob: float) -> tuple:
+        '''
+        Evaluates a max node (the bot selects a move).
+
+            Parameters:
+                self ('Expectimax')
+                board (int)  : Packed board.
+                depth (int)  : Remaining depth (number of moves).
+                prob (float) : Probability of reaching the node.
+
+            Returns:
+                (tuple) : (value, best move) of the node.
+        '''
+        if self.nodes & 0xFF == 0 and time() > self.deadline:
+            raise SearchTimeout
+
+        self.nodes += 1
+        best_value, best_move = 0.0, None
+
+        for move in legal_moves(board):
+            value = self.chance_node(MOVE_FUNCTIONS[move](board), depth, prob)
+
+            if best_move is None or value > best_value:
+                best_value, best_move = value, move
+
+        return best_value, best_move
+
+    def chance_node(self: 'Expectimax', board: int, depth: int, prob: float) -> float:
+        '''
+        Evaluates a chance node (a new 2 is inserted into an empty cell).
+
+            Parameters:
+                self ('Expectimax')
+                board (int)  : Packed board (after the move).
+                depth (int)  : Remaining depth (number of moves).
+                prob (float) : Probability of reaching the node.
+
+            Returns:
+                (float) : Expected value of the node.
+        '''
+        if depth <= 1 or prob < self.prob_cutoff:
+            return self.evaluate(board)
+
+        key = (board, depth)
+
+        if key in self.cache:
+            return self.cache[key]
+
+        cells = empty_cells(board)
+        child_prob = prob / len(cells)
+        total = 0.0
+
+        for i in cells:
+            total += self.max_node(board | (1 << (4 * i)), depth - 1, child_prob)[0]
+
+        value = total / len(cells)
+        self.cache[key] = value
+        return value
@@ -9,12 +9,14 @@ Author: Filip J. Cierkosz 2022 (updated: 2023)
 '''
 
 
-import random
 import numpy as np
-import pygame
-from pygame.locals import *
-from time import time, sleep
-from bot.graphics import *
+import warnings
+from bisect import bisect
+from itertools import accumulate
+from time import time
+from bot.bitboard import MAX_EXPONENT
+from bot.engines import get_engine
+from bot.rng import RandomStream
 
 
 class GameBoard:
@@ -24,58 +26,119 @@ class GameBoard:
     -----------
     '''
 
-    def __init__(self: 'GameBoard') -> None:
+    def __init__(
+        self: 'GameBoard',
+        headless: bool=False,
+        seed: int=None,
+        size: int=4,
+        spawn: dict=None
+    ) -> None:
         '''
         Constructor to initialize an appropriately-sized grid for the game with all attributes.
 
             Parameters:
                 self ('GameBoard')
+                headless (bool) : If True, no window is created (pygame is not imported).
+                seed (int)      : Seed for the game randomness (None for a random seed).
+                size (int)      : Size of the NxN grid (3 to 8).
+                spawn (dict)    : Probabilities of the inserted values, e.g. {2: 0.9, 4: 0.1}
+                                  (only 2s if not set).
         '''
-        self.GRID_SIZE = 4
+        self.GRID_SIZE = size
         self.MOVES = ['right', 'left', 'up', 'down']
 
-        self.grid = np.zeros((self.GRID_SIZE, self.GRID_SIZE), dtype=int)
+        # The grid is stored as a packed board of nibbles, with the moves
+        # resolved by the engine of its size (see bot/engines.py).
+        self.engine = get_engine(size)
+        self.board = 0
         self.score = 0
+
+        # Boards saved by push_board/push_move (restored by pop_board).
+        self.undo_stack = []
         self.timer = 0
         self.win = 0
 
-        # Pygame GUI settings.
-        self.HEIGHT = 540
-        self.WIDTH = 500
-        self.TOP_SPACE = self.HEIGHT - self.WIDTH
-        self.SPACE = 5
-        self.SQUARE_SIZE = (self.WIDTH - (self.GRID_SIZE + 1) * self.SPACE) / self.GRID_SIZE
-        pygame.init()
-        pygame.display.set_caption('2048: AI BOT')
-        self.window = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
-        pygame.font.init()
-        self.font_game = pygame.font.SysFont(
-            FONT_BOARD[0],
-            FONT_SIZES[f'{self.GRID_SIZE}'],
-            FONT_BOARD[1]
-        )
-        self.font_score = pygame.font.SysFont(
-            FONT_BOARD[0],
-            FONT_SIZES['score'],
-            FONT_BOARD[1]
-        )
-        self.font_msg = pygame.font.SysFont(
-            FONT_BOARD[0],
-            FONT_SIZES['final_msg'],
-            FONT_BOARD[1]
-        )
+        # Pre-sampled random streams (seeded per game, so that runs are reproducible):
+        # one for the search, and one for the numbers inserted in the played game,
+        # so that the game sees the same spawns however many draws the search uses.
+        self.rng = RandomStream(seed)
+        self.spawn_rng = RandomStream(None if seed is None else (seed, 1))
+
+        # Exponents of the inserted values, selected by the thresholds of their
+        # cumulative probabilities (no draw is needed for a single value).
+        spawn = spawn or {2: 1.0}
+
+        if any(type(val) is not int for val in spawn):
+            raise ValueError(f'Inserted values must be ints, got {list(spawn)}.')
+
+        if any(val < 2 or val & (val - 1) or val.bit_length() - 1 > MAX_EXPONENT for val in spawn):
+            raise ValueError(f'Inserted values must be powers of 2 (2 to 2^{MAX_EXPONENT}), got {list(spawn)}.')
+
+        if any(type(p) not in (int, float) or p <= 0 for p in spawn.values()):
+            raise ValueError(f'Probabilities of the inserted values must be positive numbers, got {list(spawn.values())}.')
+
+        total = sum(spawn.values())
+        self.SPAWN_EXPONENTS = [val.bit_length() - 1 for val in spawn]
+        self.SPAWN_THRESHOLDS = list(accumulate(p / total for p in spawn.values()))[:-1]
+
+        # Observers notified on each move/game over (e.g. the pygame renderer).
+        self.observers = []
+
+        if not headless:
+            # Imported lazily, so that headless runs never load pygame.
+            from bot.renderer import Renderer
+            self.attach(Renderer(self.GRID_SIZE))
+
+    @property
+    def grid(self: 'GameBoard') -> np.ndarray:
+        '''
+        Returns the grid of tile values unpacked from the board.
+
+        NB: The grid is a read-only copy (the state is the packed board), so
+        in-place writes (e.g. game.grid[r][c] = 4) raise a ValueError instead
+        of being silently lost. Set the whole grid instead (game.grid = grid).
+
+            Parameters:
+                self ('GameBoard')
+
+            Returns:
+                grid (np.ndarray) : Grid of tile values (0 for empty cells).
+        '''
+        grid = self.engine.unpack_grid(self.board)
+        grid.setflags(write=False)
+        return grid
+
+    @grid.setter
+    def grid(self: 'GameBoard', grid: np.ndarray) -> None:
+        '''
+        Packs the grid of tile values into the board.
+
+            Parameters:
+                self ('GameBoard')
+                grid (np.ndarray) : Grid of tile values (0 for empty cells).
+        '''
+        self.board = self.engine.pack_grid(grid)
 
     @staticmethod
     def update_arr(curr: np.array) -> np.array:
         '''
         Returns an updated array for row/column of the grid.
 
+        Deprecated: the moves are resolved on the packed board by the engine
+        of the board size (see make_move and bot/engines.py), and the grid is
+        no longer updated row by row. Kept for the external callers only.
+
             Parameters:
                 cur (np.array) : Array of numbers in the current state of column/row.
 
             Returns:
                 new (np.array) : Updated column/row to the grid.
         '''
+        warnings.warn(
+            'GameBoard.update_arr is deprecated, use make_move on the packed board instead.',
+            DeprecationWarning,
+            stacklevel=2
+        )
         temp = [n for n in curr if (n != 0)]
         new = []
         skip = False
@@ -104,162 +167,122 @@ class GameBoard:
             Parameters:
                 self ('GameBoard')
         '''
-        self.score = np.max(self.grid)
+        self.score = self.engine.max_tile(self.board)
 
-    def draw(self: 'GameBoard') -> None:
+    def attach(self: 'GameBoard', observer: object) -> None:
         '''
-        Draws the initialized game window.
+        Attaches an observer to the game. The observer has to implement the
+        on_move(game) and on_game_over(game) hooks.
 
             Parameters:
                 self ('GameBoard')
+                observer (object) : Observer (e.g. bot.renderer.Renderer).
+        '''
+        self.observers.append(observer)
+
+    def detach(self: 'GameBoard', observer: object) -> None:
         '''
-        self.window.fill((GRID_COLOR))
-
-        # Display squares in the NxN grid.
-        for r in range(self.GRID_SIZE):
-            for c in range(self.GRID_SIZE):
-                x = (c + 1) * self.SPACE + c * self.SQUARE_SIZE
-                y = self.TOP_SPACE + (r + 1) * self.SPACE + r * self.SQUARE_SIZE
-                num = self.grid[r][c]
-                
-                # If a number on the grid is greater or equal to 2048, it will not
-                # change anymore, since dictionary has colors up to 2048.
-                color = CELL_COLORS[2048] if num >= 2048 else CELL_COLORS[num]
-
-                pygame.draw.rect(
-                    self.window,
-                    color,
-                    pygame.Rect(x, y, self.SQUARE_SIZE, self.SQUARE_SIZE),
-                    border_radius=8
-                )
-
-                if num != 0:
-                    text_area = self.font_game.render(
-                        f'{num}',
-                        True,
-                        GRID_FONT_COLOR
-                    )
-                    self.window.blit(
-                        text_area,
-                        text_area.get_rect(center=(x + self.SQUARE_SIZE / 2, y + self.SQUARE_SIZE / 2))
-                    )
-    
-    def draw_loss_screen(self: 'GameBoard') -> None:
-        '''
-        Displays the screen on bot loss.
+        Detaches an observer from the game.
 
             Parameters:
                 self ('GameBoard')
+                observer (object) : Previously attached observer.
         '''
-        self.window.fill((GRID_COLOR))
-        text_area = self.font_msg.render(
-            'BOT LOST.',
-            True,
-            WINDOW_FONT_COLOR
-        )
-        self.window.blit(
-            text_area,
-            text_area.get_rect(
-                center=(self.WIDTH / 2, self.HEIGHT / 2 - 50)
-            )
-        )
-        text_area = self.font_msg.render(
-            f'TIME PLAYED: {self.timer:.1f} SEC',
-            True,
-            WINDOW_FONT_COLOR
-        )
-        self.window.blit(
-            text_area,
-            text_area.get_rect(
-                center=(self.WIDTH / 2, self.HEIGHT / 2 + 20)
-            )
-        )
-        pygame.display.flip()
-        sleep(1)
+        self.observers.remove(observer)
 
-    def draw_win_screen(self: 'GameBoard') -> None:
+    def notify_move(self: 'GameBoard') -> None:
         '''
-        Displays the screen on bot win.
+        Notifies all the observers about the current state of the game.
 
             Parameters:
                 self ('GameBoard')
         '''
-        self.window.fill((GRID_COLOR))
-        text_area = self.font_msg.render(
-            'BOT WINS THE GAME!',
-            True,
-            WINDOW_FONT_COLOR
-        )
-        self.window.blit(
-            text_area,
-            text_area.get_rect(
-                center=(self.WIDTH / 2, self.HEIGHT / 2 - 50)
-            )
-        )
-        text_area = self.font_msg.render(
-            f'TIME PLAYED: {self.timer:.1f} SEC',
-            True,
-            WINDOW_FONT_COLOR
-        )
-        self.window.blit(
-            text_area,
-            text_area.get_rect(
-                center=(self.WIDTH / 2, self.HEIGHT / 2 + 20)
-            )
-        )
-        pygame.display.flip()
-        sleep(1)
+        for observer in self.observers:
+            observer.on_move(self)
+
+    def notify_game_over(self: 'GameBoard') -> None:
+        '''
+        Notifies all the observers that the game is over (either won or lost).
+
+            Parameters:
+                self ('GameBoard')
+        '''
+        for observer in self.observers:
+            observer.on_game_over(self)
 
-    def insert_new_num(self: 'GameBoard', n=1) -> None:
+    def insert_new_num(self: 'GameBoard', n=1, rng: RandomStream=None) -> None:
         '''
         Updates a grid with a new number.
 
-        Probability rates for values: 2 (100%).
+        Probability rates for values: as set by the spawn distribution
+        (2 with 100% by default).
 
             Parameters:
                 self ('GameBoard')
-                n (int) : Quantity of new numbers to be inserted.
+                n (int)            : Quantity of new numbers to be inserted.
+                rng (RandomStream) : Stream of the draws (self.rng, the stream of
+                                     the search, if not set).
         '''
-        available_coords = []
+        engine = self.engine
+        thresholds = self.SPAWN_THRESHOLDS
+        rng = self.rng if rng is None else rng
 
-        for row, col in np.ndindex(self.grid.shape):
-            if self.grid[row][col] == 0:
-                available_coords.append((row, col))
-
-        for c in random.sample(available_coords, k=n):
-            self.grid[c] = 2
+        for _ in range(n):
+            board = self.board
+            i = engine.nth_empty_cell(board, rng.randrange(engine.count_empty(board)))
+            k = bisect(thresholds, rng.random()) if thresholds else 0
+            self.board = board | (self.SPAWN_EXPONENTS[k] << (4 * i))
 
     def make_move(self: 'GameBoard', move: str) -> None:
         '''
         Makes a move on the board (based on bot decision).
 
-        If moving to the left/right - check the rows of the grid.
-        If moving up/down - check the columns.
+        Each row (left/right) or column (up/down) of the packed board is
+        resolved with a single lookup in the precomputed move tables (the
+        boards larger than 4x4 are slid with numpy instead).
 
             Parameters:
                 self ('GameBoard')
                 move (str) : String describing the user's move (one from self.MOVES).
         '''
-        for i in range(self.GRID_SIZE):
-            if move == 'left':
-                curr = self.grid[i]
-            elif move == 'right':
-                curr = self.grid[i][::-1]
-            elif move == 'up':
-                curr = self.grid[:, i]
-            elif move == 'down':
-                curr = self.grid[:, i][::-1]
-
-            new = self.update_arr(curr)
-
-            if move == 'left':
-                self.grid[i] = new
-            elif move == 'up':
-                self.grid[:, i] = new
-            elif move == 'right':
-                self.grid[i] = new[::-1]
-            elif move == 'down':
-                self.grid[:, i] = new[::-1]
+        self.board = self.engine.MOVE_FUNCTIONS[move](self.board)
+
+    def push_board(self: 'GameBoard') -> None:
+        '''
+        Saves the board onto the undo stack (so that a search can mutate it
+        in place). The undo record is the packed board itself.
+
+            Parameters:
+                self ('GameBoard')
+        '''
+        self.undo_stack.append(self.board)
+
+    def push_move(self: 'GameBoard', move: str) -> int:
+        '''
+        Saves the board onto the undo stack, then makes the move and inserts
+        a new number in place.
+
+            Parameters:
+                self ('GameBoard')
+                move (str) : Move to make (one of self.legal_moves()).
+
+            Returns:
+                afterstate (int) : Packed board after the move (before the insert).
+        '''
+        self.undo_stack.append(self.board)
+        self.make_move(move)
+        afterstate = self.board
+        self.insert_new_num()
+        return afterstate
+
+    def pop_board(self: 'GameBoard') -> None:
+        '''
+        Restores the board saved by the last push_board/push_move.
+
+            Parameters:
+                self ('GameBoard')
+        '''
+        self.board = self.undo_stack.pop()
 
     def check_if_over(self: 'GameBoard') -> bool:
         '''
@@ -271,16 +294,19 @@ class GameBoard:
             Returns:
                 True/False (bool) : True if over; False otherwise.
         '''
-        original = self.grid.copy()
+        return self.engine.is_over(self.board)
 
-        for mv in self.MOVES:
-            self.make_move(mv)
+    def legal_moves(self: 'GameBoard') -> tuple:
+        '''
+        Lists the moves that change the board (without making any of them).
 
-            if not (self.grid == original).all():
-                self.grid = original
-                return False
+            Parameters:
+                self ('GameBoard')
 
-        return True
+            Returns:
+                (tuple) : Legal moves (in the order of self.MOVES).
+        '''
+        return self.engine.legal_moves(self.board)
 
     def shuffle_move(self: 'GameBoard') -> str:
         '''
@@ -292,7 +318,7 @@ class GameBoard:
             Returns:
                 (str) : Randomly selected move.
         '''
-        return np.random.choice(self.MOVES, 1)
+        return self.rng.choice(self.MOVES)
 
     def set_timer(self: 'GameBoard') -> time:
         '''
@@ -328,6 +354,6 @@ class GameBoard:
         '''
         try:
             while True:
-                self.draw()
+                self.notify_move()
         except KeyboardInterrupt:
             print('\nCtrl+C detected. Exiting the game...\n')
@@ -37,7 +37,12 @@ CELL_COLORS = {
 
 # Font sizes for different usages.
 FONT_SIZES = {
+    '3': 45,
     '4': 35,
+    '5': 30,
+    '6': 25,
+    '7': 21,
+    '8': 18,
     'final_msg': 30,
     'score': 25
 }
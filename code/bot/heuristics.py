@@ -0,0 +1,156 @@
+'''
+code/bot/heuristics.py
+
+2048-intelligent-bot: Board evaluation with precomputed per-row heuristic tables.
+
+A score is precomputed for each of the 65,536 possible rows (4 exponents),
+so the evaluation of a packed board takes only eight table lookups: four
+rows and four columns (rows of the transposed board).
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+from bot.bitboard import ROW_MASK, transpose
+
+
+# Default weights of the heuristic terms (penalties are subtracted).
+DEFAULT_WEIGHTS = {
+    'lost_penalty': 200000.0,
+    'empty': 270.0,
+    'merges': 700.0,
+    'monotonicity': 47.0,
+    'sum': 11.0,
+    'max_tile': 100.0
+}
+
+# Powers applied to the exponents in the monotonicity and sum penalties.
+MONOTONICITY_POWER = 4
+SUM_POWER = 3.5
+
+# Features of all the rows (computed once, on first use).
+_row_features = None
+
+
+def _features(row: int) -> tuple:
+    '''
+    Computes the heuristic features of a 16-bit row/column.
+
+        Parameters:
+            row (int) : Packed row (4 exponents).
+
+        Returns:
+            (tuple) : (empty cells, merges, monotonicity penalty, sum penalty,
+                       max exponent if anchored at an edge of the row).
+    '''
+    cells = [(row >> (4 * i)) & 0xF for i in range(4)]
+    merges, counter, prev = 0, 0, 0
+
+    # Count the tiles that can merge (ignoring the empty cells between them).
+    for cell in cells:
+        if cell == 0:
+            continue
+        if prev == cell:
+            counter += 1
+        elif counter > 0:
+            merges += 1 + counter
+            counter = 0
+        prev = cell
+
+    if counter > 0:
+        merges += 1 + counter
+
+    mono_left, mono_right = 0, 0
+
+    for i in range(1, 4):
+        left = cells[i - 1] ** MONOTONICITY_POWER
+        right = cells[i] ** MONOTONICITY_POWER
+
+        if cells[i - 1] > cells[i]:
+            mono_left += left - right
+        else:
+            mono_right += right - left
+
+    max_exp = max(cells)
+    max_edge = max_exp if max_exp in (cells[0], cells[3]) else 0
+
+    return (
+        cells.count(0),
+        merges,
+        min(mono_left, mono_right),
+        sum(cell ** SUM_POWER for cell in cells),
+        max_edge
+    )
+
+def row_features() -> list:
+    '''
+    Returns the features of all the possible rows (computed on first call).
+
+        Returns:
+            (list) : Features (see _features) indexed by the packed row.
+    '''
+    global _row_features
+
+    if _row_features is None:
+        _row_features = [_features(row) for row in range(ROW_MASK + 1)]
+
+    return _row_features
+
+
+class HeuristicTable:
+    '''
+    -----------
+    Class to evaluate packed boards with a table of weighted row scores.
+    -----------
+    '''
+
+    def __init__(self: 'HeuristicTable', weights: dict=None) -> None:
+        '''
+        Constructor to precompute the weighted score of each row.
+
+            Parameters:
+                self ('HeuristicTable')
+                weights (dict) : Weights overriding DEFAULT_WEIGHTS.
+        '''
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        w = self.weights
+        self.table = [
+            w['lost_penalty']
+            + w['empty'] * empty
+            + w['merges'] * merges
+            - w['monotonicity'] * mono
+            - w['sum'] * total
+            + w['max_tile'] * max_edge
+            for empty, merges, mono, total, max_edge in row_features()
+        ]
+
+    def evaluate(self: 'HeuristicTable', board: int) -> float:
+        '''
+        Evaluates the packed board (sum of the scores of its rows and columns).
+
+            Parameters:
+                self ('HeuristicTable')
+                board (int) : Packed board.
+
+            Returns:
+                (float) : Heuristic value of the board.
+        '''
+        table = self.table
+        t = transpose(board)
+
+        return (
+            table[board & ROW_MASK]
+            + table[(board >> 16) & ROW_MASK]
+            + table[(board >> 32) & ROW_MASK]
+            + table[(board >> 48) & ROW_MASK]
+            + table[t & ROW_MASK]
+            + table[(t >> 16) & ROW_MASK]
+            + table[(t >> 32) & ROW_MASK]
+            + table[(t >> 48) & ROW_MASK]
+        )
+
+    def __call__(self: 'HeuristicTable', board: int) -> float:
+        '''
+        Evaluates the packed board (so that the table can be used as a callable).
+        '''
+        return self.evaluate(board)
@@ -0,0 +1,185 @@
+'''
+code/bot/instrument.py
+
+2048-intelligent-bot: Per-decision instrumentation and profiling of the bot.
+
+An Instrument attached to a bot (Bot(instrument=...)) records, for each
+decision: the search parameters, the rollouts run, the simulated steps,
+the no-op moves, the final costs of the moves and the wall time of each
+phase of the game loop. Selected phases can be wrapped in cProfile. With
+no instrument attached, the bot skips all of it.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import cProfile
+import json
+import pstats
+from time import perf_counter
+
+
+class Instrument:
+    '''
+    -----------
+    Class to record the per-decision statistics of a game played by the bot.
+    -----------
+    '''
+
+    def __init__(self: 'Instrument', callback: callable=None, profile_phases: tuple=()) -> None:
+        '''
+        Constructor to initialize the (empty) trace.
+
+            Parameters:
+                self ('Instrument')
+                callback (callable)    : If set, called with each finished record.
+                profile_phases (tuple) : Phases wrapped in cProfile (e.g. ('search',)).
+        '''
+        self.callback = callback
+        self.profile_phases = set(profile_phases)
+        self.profiler = cProfile.Profile() if self.profile_phases else None
+
+        # Finished records (one per decision) and the one in progress.
+        self.decisions = []
+        self.current = None
+        self.steps_start = 0
+
+    def begin_decision(self: 'Instrument', bot: 'Bot') -> None:
+        '''
+        Opens the record of the next decision.
+
+            Parameters:
+                self ('Instrument')
+                bot ('Bot') : Instrumented bot.
+        '''
+        self.current = {
+            'move_num': bot.move_num,
+            'search_depth': bot.search_depth,
+            'searches_per_move': bot.searches_per_move,
+            'move': None,
+            'noop_move': False,
+            'rollouts': 0,
+            'simulated_steps': 0,
+            'costs': {},
+            'phase_sec': {}
+        }
+        self.steps_start = bot.simulated_steps
+
+    def run_phase(self: 'Instrument', name: str, func: callable, *args: object) -> object:
+        '''
+        Runs a phase of the game loop, adding its wall time to the current
+        record (and profiling it, if selected).
+
+            Parameters:
+                self ('Instrument')
+                name (str)      : Name of the phase (e.g. 'search', 'render').
+                func (callable) : Function of the phase.
+                args (object)   : Arguments of the function.
+
+            Returns:
+                (object) : Result of the function.
+        '''
+        profile = name in self.profile_phases
+        start = perf_counter()
+
+        if profile:
+            self.profiler.enable()
+
+        try:
+            return func(*args)
+        finally:
+            if profile:
+                self.profiler.disable()
+
+            phases = self.current['phase_sec']
+            phases[name] = phases.get(name, 0.0) + perf_counter() - start
+
+    def record_costs(self: 'Instrument', costs: dict) -> None:
+        '''
+        Records the final costs of the moves (before the search resets them).
+
+            Parameters:
+                self ('Instrument')
+                costs (dict) : Move -> cost.
+        '''
+        self.current['costs'] = {mv: float(cost) for mv, cost in costs.items()}
+
+    def end_decision(self: 'Instrument', bot: 'Bot', move: str, changed: bool) -> None:
+        '''
+        Closes the record of the current decision.
+
+            Parameters:
+                self ('Instrument')
+                bot ('Bot')    : Instrumented bot.
+                move (str)     : Move made (None if the game was won before a move).
+                changed (bool) : True if the move changed the board.
+        '''
+        record = self.current
+        record['move'] = move
+        record['noop_move'] = move is not None and not changed
+        record['rollouts'] = sum(bot.rollout_counts.values()) if move is not None else 0
+        record['simulated_steps'] = bot.simulated_steps - self.steps_start
+
+        self.decisions.append(record)
+        self.current = None
+
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self: 'Instrument') -> dict:
+        '''
+        Aggregates the trace over the whole game.
+
+            Parameters:
+                self ('Instrument')
+
+            Returns:
+                (dict) : Decisions, rollouts, simulated steps, no-op moves and
+                         total wall time of each phase.
+        '''
+        phase_sec = {}
+
+        for record in self.decisions:
+            for name, sec in record['phase_sec'].items():
+                phase_sec[name] = phase_sec.get(name, 0.0) + sec
+
+        return {
+            'decisions': len(self.decisions),
+            'rollouts': sum(record['rollouts'] for record in self.decisions),
+            'simulated_steps': sum(record['simulated_steps'] for record in self.decisions),
+            'noop_moves': sum(record['noop_move'] for record in self.decisions),
+            'phase_sec': phase_sec
+        }
+
+    def dump_trace(self: 'Instrument', path: str) -> None:
+        '''
+        Saves the trace of the game (one JSON record per line).
+
+            Parameters:
+                self ('Instrument')
+                path (str) : Path of the output file.
+        '''
+        with open(path, 'w') as f:
+            for record in self.decisions:
+                f.write(json.dumps(record) + '\n')
+
+    def dump_profile(self: 'Instrument', path: str) -> None:
+        '''
+        Saves the profile of the profiled phases (readable with pstats).
+
+            Parameters:
+                self ('Instrument')
+                path (str) : Path of the output file.
+        '''
+        self.profiler.dump_stats(path)
+
+    def print_profile(self: 'Instrument', sort: str='cumulative', limit: int=20) -> None:
+        '''
+        Prints the top entries of the profile of the profiled phases.
+
+            Parameters:
+                self ('Instrument')
+                sort (str)  : Sort key (as in pstats.Stats.sort_stats).
+                limit (int) : Number of the entries printed.
+        '''
+        pstats.Stats(self.profiler).sort_stats(sort).print_stats(limit)
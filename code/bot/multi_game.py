@@ -0,0 +1,297 @@
+'''
+code/bot/multi_game.py
+
+2048-intelligent-bot: Many independent games advanced in lockstep inside one process.
+
+M games are kept as a stacked np.uint64 array of packed boards. Each tick
+runs the decision logic of Bot.search_move for all the active games at
+once: the first moves of every game are expanded together, and all their
+rollouts run in a single vectorised batch. Finished games are retired and
+their slots refilled from the queue of games still to play.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import numpy as np
+from time import time
+from typing import Iterator
+from bot.batch_rollout import (
+    count_empty_batch,
+    insert_batch,
+    max_tile_batch,
+    move_batch_all,
+    simulate_batch
+)
+from bot.bot import Bot
+
+
+class MultiGameBoard:
+    '''
+    -----------
+    Class to hold M game boards as a stacked array (a batched GameBoard).
+    -----------
+    '''
+
+    def __init__(self: 'MultiGameBoard', n_slots: int, seed: int=None) -> None:
+        '''
+        Constructor to initialize M empty (inactive) game slots.
+
+            Parameters:
+                self ('MultiGameBoard')
+                n_slots (int) : Number of the games held at once (M).
+                seed (int)    : Seed of the randomness of all the games.
+        '''
+        self.n_slots = n_slots
+        self.boards = np.zeros(n_slots, dtype=np.uint64)
+        self.scores = np.zeros(n_slots, dtype=np.int64)
+        self.active = np.zeros(n_slots, dtype=bool)
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self: 'MultiGameBoard', slots: np.ndarray) -> None:
+        '''
+        Starts new games in the slots (with 2 starting numbers each).
+
+            Parameters:
+                self ('MultiGameBoard')
+                slots (np.ndarray) : Indices of the slots.
+        '''
+        boards = np.zeros(len(slots), dtype=np.uint64)
+        self.boards[slots] = insert_batch(insert_batch(boards, self.rng), self.rng)
+        self.scores[slots] = 0
+        self.active[slots] = True
+
+    def update_score(self: 'MultiGameBoard') -> None:
+        '''
+        Updates the score (max tile) of each game.
+
+            Parameters:
+                self ('MultiGameBoard')
+        '''
+        self.scores = max_tile_batch(self.boards)
+
+    def insert_new_num(self: 'MultiGameBoard', mask: np.ndarray) -> None:
+        '''
+        Inserts a new number into each selected game.
+
+            Parameters:
+                self ('MultiGameBoard')
+                mask (np.ndarray) : Games to update (each with an empty cell).
+        '''
+        self.boards[mask] = insert_batch(self.boards[mask], self.rng)
+
+    def make_move(self: 'MultiGameBoard', moves: np.ndarray, mask: np.ndarray) -> None:
+        '''
+        Makes a move in each selected game.
+
+            Parameters:
+                self ('MultiGameBoard')
+                moves (np.ndarray) : Index of the move (into GameBoard.MOVES) per game.
+                mask (np.ndarray)  : Games to update.
+        '''
+        idx = np.flatnonzero(mask)
+        results = move_batch_all(self.boards[idx])
+        self.boards[idx] = results[moves[idx], np.arange(len(idx))]
+
+    def check_if_over(self: 'MultiGameBoard') -> np.ndarray:
+        '''
+        Checks which of the games are over (no move changes the board).
+
+            Parameters:
+                self ('MultiGameBoard')
+
+            Returns:
+                (np.ndarray) : True for each game that is over.
+        '''
+        return (move_batch_all(self.boards) == self.boards).all(axis=0)
+
+
+class LockstepRunner:
+    '''
+    -----------
+    Class to play N games in lockstep, M at a time, with the bot's search.
+    -----------
+    '''
+
+    def __init__(self: 'LockstepRunner', n_slots: int=64, seed: int=0) -> None:
+        '''
+        Constructor to initialize the batched board and the search parameters.
+
+            Parameters:
+                self ('LockstepRunner')
+                n_slots (int) : Number of the games played at once.
+                seed (int)    : Seed of the run (the results are reproducible
+                                for a fixed seed and number of slots).
+        '''
+        self.games = MultiGameBoard(n_slots, seed)
+
+        # The coefficients of the search are taken from a (template) bot.
+        self.bot = Bot(headless=True, seed=seed)
+        self.move_nums = np.zeros(n_slots, dtype=np.int64)
+        self.search_depth = np.zeros(n_slots, dtype=np.int64)
+        self.searches_per_move = np.zeros(n_slots, dtype=np.int64)
+
+        # Index and start time of the game in each slot.
+        self.game_ids = np.full(n_slots, -1, dtype=np.int64)
+        self.start_times = np.zeros(n_slots)
+
+    def update_search_params(self: 'LockstepRunner', mask: np.ndarray) -> None:
+        '''
+        Updates the search parameters of the selected games (see Bot.update_search_params).
+
+            Parameters:
+                self ('LockstepRunner')
+                mask (np.ndarray) : Games to update.
+        '''
+        stage = 1 + self.move_nums[mask] // self.bot.SEARCH_COEFF
+        self.search_depth[mask] = self.bot.SEARCH_DEPTH_COEFF * stage
+        self.searches_per_move[mask] = self.bot.SEARCH_PER_MOVE_COEFF * stage
+
+    def search_moves(self: 'LockstepRunner', idx: np.ndarray) -> np.ndarray:
+        '''
+        Searches the best move of each selected game (Bot.search_move, for all
+        the games at once).
+
+            Parameters:
+                self ('LockstepRunner')
+                idx (np.ndarray) : Indices of the games.
+
+            Returns:
+                (np.ndarray) : Index of the best move (into GameBoard.MOVES) per game.
+        '''
+        games = self.games
+        coeff = self.bot.EMPTY_SPOT_COEFF
+        boards = games.boards[idx]
+        results = move_batch_all(boards)
+
+        # Legal (first move, game) pairs, flattened in move-major order.
+        legal = results != boards
+        pair_move, pair_game = np.nonzero(legal)
+        first = results[pair_move, pair_game]
+        first_insert = insert_batch(first, games.rng)
+
+        costs = np.zeros((4, len(idx)))
+        costs[pair_move, pair_game] = (
+            max_tile_batch(first) + coeff * count_empty_batch(first_insert)
+        )
+
+        # All the rollouts of all the games run in a single batch.
+        rollouts = self.searches_per_move[idx][pair_game]
+
+        if rollouts.sum():
+            owners = np.repeat(np.arange(len(pair_game)), rollouts)
+            playout_costs = simulate_batch(
+                first_insert[owners],
+                self.search_depth[idx][pair_game][owners],
+                games.scores[idx][pair_game][owners],
+                coeff,
+                games.rng
+            )
+            costs[pair_move, pair_game] += np.bincount(
+                owners, weights=playout_costs, minlength=len(pair_game)
+            )
+
+        best = costs.argmax(axis=0)
+
+        # As in Bot.select_best_move: a random move if all the costs are 0.
+        no_costs = ~costs.any(axis=0)
+        best[no_costs] = games.rng.integers(0, 4, size=int(no_costs.sum()))
+
+        return best
+
+    def run(self: 'LockstepRunner', n_games: int) -> Iterator[dict]:
+        '''
+        Plays the games, refilling each slot as soon as its game finishes.
+
+            Parameters:
+                self ('LockstepRunner')
+                n_games (int) : Number of games to play.
+
+            Yields:
+                (dict) : Result of each finished game (game, win, score, time played).
+        '''
+        games = self.games
+        next_game = 0
+
+        while True:
+            # Refill the free slots from the queue of games.
+            free = np.flatnonzero(~games.active)[:max(n_games - next_game, 0)]
+
+            if len(free):
+                games.reset(free)
+                self.game_ids[free] = np.arange(next_game, next_game + len(free))
+                self.start_times[free] = time()
+                self.move_nums[free] = 0
+                self.search_depth[free] = 0
+                self.searches_per_move[free] = 0
+                next_game += len(free)
+
+            if not games.active.any():
+                return
+
+            games.update_score()
+
+            # Case: BOT WIN.
+            won = games.active & (games.scores >= 2048)
+            yield from self.retire(won, 1)
+
+            idx = np.flatnonzero(games.active)
+
+            if not len(idx):
+                continue
+
+            moves = np.zeros(games.n_slots, dtype=np.int64)
+            moves[idx] = self.search_moves(idx)
+            old_boards = games.boards.copy()
+            games.make_move(moves, games.active)
+            self.move_nums[idx] += 1
+
+            # Case: BOT LOSS.
+            lost = games.active & games.check_if_over()
+            yield from self.retire(lost, 0)
+
+            changed = games.active & (games.boards != old_boards)
+            self.update_search_params(changed)
+            games.insert_new_num(changed)
+
+    def retire(self: 'LockstepRunner', mask: np.ndarray, win: int) -> Iterator[dict]:
+        '''
+        Retires the finished games, freeing their slots.
+
+            Parameters:
+                self ('LockstepRunner')
+                mask (np.ndarray) : Finished games.
+                win (int)         : 1 for wins, 0 for losses.
+
+            Yields:
+                (dict) : Result of each finished game.
+        '''
+        now = time()
+
+        for slot in np.flatnonzero(mask):
+            self.games.active[slot] = False
+            yield {
+                'game': int(self.game_ids[slot]),
+                'win': win,
+                'score': int(self.games.scores[slot]),
+                't_sec': now - self.start_times[slot]
+            }
+
+
+def run_lockstep(n_games: int, n_slots: int=64, seed: int=0) -> Iterator[dict]:
+    '''
+    Plays N headless games in lockstep inside this process, M at a time.
+
+        Parameters:
+            n_games (int) : Number of games to play.
+            n_slots (int) : Number of the games played at once.
+            seed (int)    : Seed of the run.
+
+        Yields:
+            (dict) : Result of each finished game (as they finish).
+    '''
+    runner = LockstepRunner(n_slots, seed)
+
+    # The template bot is closed once the games are over (or the generator is closed).
+    with runner.bot:
+        yield from runner.run(n_games)
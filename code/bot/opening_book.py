@@ -0,0 +1,123 @@
+'''
+code/bot/opening_book.py
+
+2048-intelligent-bot: Opening book of precomputed best moves, memory-mapped from disk.
+
+File format (little-endian):
+    - magic  : 8 bytes (b'2048BOOK'),
+    - count  : uint64, number of the entries,
+    - keys   : count x uint64, canonical packed boards (sorted),
+    - moves  : count x uint8, best move on the canonical board (index into MOVES).
+The file is mapped read-only, so all the processes using the same book
+share a single copy of it in the page cache.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import mmap
+import numpy as np
+from bot.bitboard import MOVE_FUNCTIONS, legal_moves
+from bot.symmetry import canonicalize, map_move, unmap_move
+
+
+MAGIC = b'2048BOOK'
+HEADER_SIZE = 16
+
+# Moves in the order of their byte codes (as in GameBoard.MOVES).
+MOVES = list(MOVE_FUNCTIONS)
+
+
+def write_book(path: str, entries: dict) -> None:
+    '''
+    Writes an opening book to disk.
+
+        Parameters:
+            path (str)     : Path of the book file.
+            entries (dict) : Canonical packed board -> best move on that board.
+    '''
+    keys = np.array(sorted(entries), dtype='<u8')
+    moves = np.array([MOVES.index(entries[int(key)]) for key in keys], dtype=np.uint8)
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([len(keys)], dtype='<u8').tobytes())
+        f.write(keys.tobytes())
+        f.write(moves.tobytes())
+
+def book_entry(board: int, move: str) -> tuple:
+    '''
+    Maps a position and its best move to a book entry.
+
+        Parameters:
+            board (int) : Packed board (original orientation).
+            move (str)  : Best move on the board.
+
+        Returns:
+            (tuple) : (canonical packed board, best move on the canonical board).
+    '''
+    key, k = canonicalize(board)
+    return key, map_move(move, k)
+
+
+class OpeningBook:
+    '''
+    -----------
+    Class to look up the precomputed best moves of a memory-mapped book.
+    -----------
+    '''
+
+    def __init__(self: 'OpeningBook', path: str) -> None:
+        '''
+        Constructor to map the book file into memory.
+
+            Parameters:
+                self ('OpeningBook')
+                path (str) : Path of the book file (see write_book).
+        '''
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'Not an opening book file: {path}')
+
+        count = int(np.frombuffer(self.mm, dtype='<u8', count=1, offset=len(MAGIC))[0])
+        self.keys = np.frombuffer(self.mm, dtype='<u8', count=count, offset=HEADER_SIZE)
+        self.moves = np.frombuffer(self.mm, dtype=np.uint8, count=count, offset=HEADER_SIZE + 8 * count)
+
+        # Number of lookups and hits so far.
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self: 'OpeningBook') -> int:
+        '''
+        Returns the number of the entries in the book.
+        '''
+        return len(self.keys)
+
+    def lookup(self: 'OpeningBook', board: int) -> str:
+        '''
+        Looks up the best move for the board (in any of its 8 orientations).
+
+            Parameters:
+                self ('OpeningBook')
+                board (int) : Packed board.
+
+            Returns:
+                (str) : Best move on the board (None if not in the book).
+        '''
+        self.lookups += 1
+        key, k = canonicalize(board)
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+
+        if i == len(self.keys) or int(self.keys[i]) != key:
+            return None
+
+        move = unmap_move(MOVES[self.moves[i]], k)
+
+        # Guard against a corrupted entry (the move must change the board).
+        if move not in legal_moves(board):
+            return None
+
+        self.hits += 1
+        return move
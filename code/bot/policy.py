@@ -0,0 +1,122 @@
+'''
+code/bot/policy.py
+
+2048-intelligent-bot: Rollout policies for the Monte Carlo simulations.
+
+A policy selects the next move of a rollout among the legal moves only
+(i.e. the moves that change the board), so no-op moves are never tried.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import math
+from bot.bitboard import MOVE_FUNCTIONS, legal_moves
+from bot.heuristics import HeuristicTable
+
+
+def legal_children(board: int) -> list:
+    '''
+    Lists the legal moves for the packed board with the resulting boards.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            children (list) : Pairs of (move, packed board after the move).
+    '''
+    return [(move, MOVE_FUNCTIONS[move](board)) for move in legal_moves(board)]
+
+
+class RandomPolicy:
+    '''
+    -----------
+    Class for the uniformly random rollout policy (over the legal moves only,
+    which is the same distribution as re-drawing the no-op moves).
+    -----------
+    '''
+
+    def select(self: 'RandomPolicy', board: int, rng: 'RandomStream') -> tuple:
+        '''
+        Selects the next move of a rollout.
+
+            Parameters:
+                self ('RandomPolicy')
+                board (int)         : Packed board.
+                rng (RandomStream)  : Random number stream.
+
+            Returns:
+                (tuple) : (move, packed board after the move); None if game over.
+        '''
+        moves = legal_moves(board)
+
+        if not moves:
+            return None
+
+        # Only the selected move is applied to the board.
+        move = rng.choice(moves)
+        return move, MOVE_FUNCTIONS[move](board)
+
+
+class HeuristicPolicy:
+    '''
+    -----------
+    Class for the heuristic-guided rollout policy, with either epsilon-greedy
+    or softmax sampling over the legal moves.
+    -----------
+    '''
+
+    def __init__(
+        self: 'HeuristicPolicy',
+        epsilon: float=0.1,
+        temperature: float=None,
+        weights: dict=None
+    ) -> None:
+        '''
+        Constructor to initialize the sampling parameters.
+
+            Parameters:
+                self ('HeuristicPolicy')
+                epsilon (float)     : Probability of a random move (epsilon-greedy).
+                temperature (float) : If set, softmax sampling with this temperature.
+                weights (dict)      : Weights of the heuristic terms (see bot/heuristics.py).
+        '''
+        self.epsilon = epsilon
+        self.temperature = temperature
+        self.heuristics = HeuristicTable(weights)
+
+    def select(self: 'HeuristicPolicy', board: int, rng: 'RandomStream') -> tuple:
+        '''
+        Selects the next move of a rollout.
+
+            Parameters:
+                self ('HeuristicPolicy')
+                board (int)         : Packed board.
+                rng (RandomStream)  : Random number stream.
+
+            Returns:
+                (tuple) : (move, packed board after the move); None if game over.
+        '''
+        children = legal_children(board)
+
+        if len(children) < 2:
+            return children[0] if children else None
+
+        if self.temperature is None:
+            if rng.random() < self.epsilon:
+                return rng.choice(children)
+
+            return max(children, key=lambda child: self.heuristics.evaluate(child[1]))
+
+        values = [self.heuristics.evaluate(child[1]) / self.temperature for child in children]
+        top = max(values)
+        probs = [math.exp(val - top) for val in values]
+        threshold = rng.random() * sum(probs)
+
+        for child, prob in zip(children, probs):
+            threshold -= prob
+
+            if threshold <= 0:
+                return child
+
+        return children[-1]
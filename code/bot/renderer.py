@@ -0,0 +1,175 @@
+'''
+code/bot/renderer.py
+
+2048-intelligent-bot: Pygame renderer attached to a game board as an observer.
+
+Author: Filip J. Cierkosz (2023)
+
+(NB: Pygame is imported only by this module, so headless runs never load it.)
+'''
+
+
+import pygame
+from pygame.locals import *
+from time import sleep
+from bot.graphics import *
+
+
+class Renderer:
+    '''
+    -----------
+    Class to render the state of a live game in a pygame window.
+    -----------
+    '''
+
+    def __init__(self: 'Renderer', grid_size: int=4, every: int=1) -> None:
+        '''
+        Constructor to initialize the game window and the fonts.
+
+            Parameters:
+                self ('Renderer')
+                grid_size (int) : Size of the rendered NxN grid.
+                every (int)     : Render only every N-th observed move.
+        '''
+        self.GRID_SIZE = grid_size
+        self.every = every
+        self.moves_seen = 0
+
+        # Pygame GUI settings.
+        self.HEIGHT = 540
+        self.WIDTH = 500
+        self.TOP_SPACE = self.HEIGHT - self.WIDTH
+        self.SPACE = 5
+        self.SQUARE_SIZE = (self.WIDTH - (self.GRID_SIZE + 1) * self.SPACE) / self.GRID_SIZE
+        pygame.init()
+        pygame.display.set_caption('2048: AI BOT')
+        self.window = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        pygame.font.init()
+        self.font_game = pygame.font.SysFont(
+            FONT_BOARD[0],
+            FONT_SIZES[f'{self.GRID_SIZE}'],
+            FONT_BOARD[1]
+        )
+        self.font_score = pygame.font.SysFont(
+            FONT_BOARD[0],
+            FONT_SIZES['score'],
+            FONT_BOARD[1]
+        )
+        self.font_msg = pygame.font.SysFont(
+            FONT_BOARD[0],
+            FONT_SIZES['final_msg'],
+            FONT_BOARD[1]
+        )
+
+    def on_move(self: 'Renderer', game: 'GameBoard') -> None:
+        '''
+        Observer hook called by the game on each move. Renders the grid
+        and the score (only every N-th move, as set by self.every).
+
+            Parameters:
+                self ('Renderer')
+                game ('GameBoard') : Observed game.
+        '''
+        self.moves_seen += 1
+
+        if (self.moves_seen - 1) % self.every != 0:
+            return
+
+        self.draw(game.grid)
+        text_area = self.font_score.render(
+            f'SCORE: {game.score:06d}',
+            True,
+            WINDOW_FONT_COLOR
+        )
+        self.window.blit(
+            text_area,
+            text_area.get_rect(center=(115, 20))
+        )
+        pygame.display.flip()
+
+    def on_game_over(self: 'Renderer', game: 'GameBoard') -> None:
+        '''
+        Observer hook called by the game once it is either won or lost.
+
+            Parameters:
+                self ('Renderer')
+                game ('GameBoard') : Observed game.
+        '''
+        if game.win:
+            self.draw_final_screen('BOT WINS THE GAME!', game.timer)
+        else:
+            self.draw_final_screen('BOT LOST.', game.timer)
+
+    def draw(self: 'Renderer', grid: 'np.ndarray') -> None:
+        '''
+        Draws the grid in the game window.
+
+            Parameters:
+                self ('Renderer')
+                grid (np.ndarray) : Grid of tile values.
+        '''
+        self.window.fill((GRID_COLOR))
+
+        # Display squares in the NxN grid.
+        for r in range(self.GRID_SIZE):
+            for c in range(self.GRID_SIZE):
+                x = (c + 1) * self.SPACE + c * self.SQUARE_SIZE
+                y = self.TOP_SPACE + (r + 1) * self.SPACE + r * self.SQUARE_SIZE
+                num = grid[r][c]
+
+                # If a number on the grid is greater or equal to 2048, it will not
+                # change anymore, since dictionary has colors up to 2048.
+                color = CELL_COLORS[2048] if num >= 2048 else CELL_COLORS[num]
+
+                pygame.draw.rect(
+                    self.window,
+                    color,
+                    pygame.Rect(x, y, self.SQUARE_SIZE, self.SQUARE_SIZE),
+                    border_radius=8
+                )
+
+                if num != 0:
+                    text_area = self.font_game.render(
+                        f'{num}',
+                        True,
+                        GRID_FONT_COLOR
+                    )
+                    self.window.blit(
+                        text_area,
+                        text_area.get_rect(center=(x + self.SQUARE_SIZE / 2, y + self.SQUARE_SIZE / 2))
+                    )
+
+    def draw_final_screen(self: 'Renderer', msg: str, timer: float) -> None:
+        '''
+        Displays the final screen on bot win/loss.
+
+            Parameters:
+                self ('Renderer')
+                msg (str)     : Message to display.
+                timer (float) : Time played (in seconds).
+        '''
+        self.window.fill((GRID_COLOR))
+        text_area = self.font_msg.render(
+            msg,
+            True,
+            WINDOW_FONT_COLOR
+        )
+        self.window.blit(
+            text_area,
+            text_area.get_rect(
+                center=(self.WIDTH / 2, self.HEIGHT / 2 - 50)
+            )
+        )
+        text_area = self.font_msg.render(
+            f'TIME PLAYED: {timer:.1f} SEC',
+            True,
+            WINDOW_FONT_COLOR
+        )
+        self.window.blit(
+            text_area,
+            text_area.get_rect(
+                center=(self.WIDTH / 2, self.HEIGHT / 2 + 20)
+            )
+        )
+        pygame.display.flip()
+        sleep(1)
@@ -0,0 +1,125 @@
+'''
+code/bot/rng.py
+
+2048-intelligent-bot: Seeded stream of pre-sampled random numbers.
+
+Uniform numbers are drawn from numpy in large blocks and handed out one by
+one, which is much cheaper than a call into the generator per simulated
+step. The stream is fully determined by its seed, so the games (and their
+searches) are reproducible.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import numpy as np
+
+
+# Number of uniform numbers drawn at once.
+BLOCK_SIZE = 4096
+
+
+class RandomStream:
+    '''
+    -----------
+    Class to hand out the random numbers of a game (a drop-in replacement
+    for the methods of random.Random used by the bot).
+    -----------
+    '''
+
+    def __init__(self: 'RandomStream', seed: int=None, block_size: int=BLOCK_SIZE) -> None:
+        '''
+        Constructor to initialize the stream.
+
+            Parameters:
+                self ('RandomStream')
+                seed (int)       : Seed of the stream (None for a random seed).
+                block_size (int) : Number of uniform numbers drawn at once.
+        '''
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self: 'RandomStream', seed: int=None) -> None:
+        '''
+        Restarts the stream from a seed (discarding the buffered numbers).
+
+            Parameters:
+                self ('RandomStream')
+                seed (int) : Seed of the stream (None for a random seed).
+        '''
+        self.generator = np.random.default_rng(seed)
+        self.buffer = []
+        self.pos = 0
+
+    def refill(self: 'RandomStream') -> None:
+        '''
+        Draws the next block of uniform numbers into the buffer.
+
+            Parameters:
+                self ('RandomStream')
+        '''
+        # Plain floats, since indexing a list is cheaper than a numpy array.
+        self.buffer = self.generator.random(self.block_size).tolist()
+        self.pos = 0
+
+    def random(self: 'RandomStream') -> float:
+        '''
+        Returns the next uniform number in [0, 1).
+
+            Parameters:
+                self ('RandomStream')
+
+            Returns:
+                (float) : Uniform number.
+        '''
+        if self.pos == len(self.buffer):
+            self.refill()
+
+        self.pos += 1
+        return self.buffer[self.pos - 1]
+
+    def randrange(self: 'RandomStream', n: int) -> int:
+        '''
+        Returns a uniform index in range(n).
+
+            Parameters:
+                self ('RandomStream')
+                n (int) : Number of the indices (n > 0).
+
+            Returns:
+                (int) : Uniform index.
+        '''
+        if n <= 0:
+            raise ValueError('empty range for randrange()')
+
+        return int(self.random() * n)
+
+    def choice(self: 'RandomStream', seq: list) -> object:
+        '''
+        Returns a uniformly selected element of a non-empty sequence.
+
+            Parameters:
+                self ('RandomStream')
+                seq (list) : Sequence (e.g. of moves).
+
+            Returns:
+                (object) : Selected element.
+        '''
+        if self.pos == len(self.buffer):
+            self.refill()
+
+        self.pos += 1
+        return seq[int(self.buffer[self.pos - 1] * len(seq))]
+
+    def getrandbits(self: 'RandomStream', k: int) -> int:
+        '''
+        Returns an integer with k random bits (e.g. to seed other generators).
+
+            Parameters:
+                self ('RandomStream')
+                k (int) : Number of the bits (at most 64).
+
+            Returns:
+                (int) : Random integer in range(2 ** k).
+        '''
+        return int(self.generator.integers(0, 1 << k, dtype=np.uint64))
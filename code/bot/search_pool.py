@@ -0,0 +1,108 @@
+'''
+code/bot/search_pool.py
+
+2048-intelligent-bot: Persistent worker pool for root-parallel Monte Carlo search.
+
+Author: Filip J. Cierkosz (2023)
+
+(NB: Workers receive compact tuples with packed boards, never a pickled Bot.)
+'''
+
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Number of rollouts in a single task. The chunking does not depend on the
+# number of workers, so the decisions are the same for a fixed seed.
+ROLLOUT_CHUNK = 8
+
+# Headless bot instance owned by each worker process.
+_worker_bot = None
+
+
+def _init_worker(size: int=4, spawn: dict=None, policy: object=None) -> None:
+    '''
+    Initializes a worker process with its own headless bot (of the searching
+    bot's board size, spawn distribution and rollout policy). The policy is
+    sent once per worker, since it can be large (e.g. the heuristic tables).
+    '''
+    global _worker_bot
+    from bot.bot import Bot
+    _worker_bot = Bot(headless=True, size=size, spawn=spawn, rollout_policy=policy)
+
+def run_rollouts(task: tuple) -> int:
+    '''
+    Runs a chunk of rollouts for a single first move (inside a worker process).
+
+        Parameters:
+            task (tuple) : (move, board, search_depth, score, empty_coeff, n, seed).
+
+        Returns:
+            (int) : Costs accumulated by the rollouts in the chunk.
+    '''
+    move, board, search_depth, score, empty_coeff, n, seed = task
+    bot = _worker_bot
+    bot.rng.seed(seed)
+    bot.search_depth = search_depth
+    bot.score = score
+    bot.EMPTY_SPOT_COEFF = empty_coeff
+    bot.costs = {move: 0}
+
+    for _ in range(n):
+        bot.board = board
+        bot.update_costs(move, bot.simulate_move())
+
+    return bot.costs[move]
+
+
+class SearchPool:
+    '''
+    -----------
+    Class to spread the rollouts of a single decision across worker processes.
+    -----------
+    '''
+
+    def __init__(
+        self: 'SearchPool',
+        workers: int=None,
+        size: int=4,
+        spawn: dict=None,
+        policy: object=None
+    ) -> None:
+        '''
+        Constructor to start the persistent pool of worker processes.
+
+            Parameters:
+                self ('SearchPool')
+                workers (int)   : Number of worker processes (None for all cores).
+                size (int)      : Size of the NxN grid of the searched boards.
+                spawn (dict)    : Probabilities of the inserted values (only 2s if not set).
+                policy (object) : Rollout policy of the workers (None for random rollouts).
+        '''
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(size, spawn, policy)
+        )
+
+    def simulate(self: 'SearchPool', tasks: list) -> list:
+        '''
+        Runs the rollout tasks in parallel.
+
+            Parameters:
+                self ('SearchPool')
+                tasks (list) : Tasks as accepted by run_rollouts.
+
+            Returns:
+                (list) : Costs of each task (in the order of tasks).
+        '''
+        return list(self.executor.map(run_rollouts, tasks))
+
+    def close(self: 'SearchPool') -> None:
+        '''
+        Shuts down the worker processes.
+
+            Parameters:
+                self ('SearchPool')
+        '''
+        self.executor.shutdown()
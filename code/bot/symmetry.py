@@ -0,0 +1,179 @@
+'''
+code/bot/symmetry.py
+
+2048-intelligent-bot: Symmetry canonicalisation of packed 4x4 boards.
+
+The 8 rotations/reflections (dihedral group) of a board are strategically
+equivalent. Each transform is encoded as an index k in range(8), being the
+composition of: horizontal flip (k & 1), vertical flip (k & 2) and
+transpose (k & 4), applied in that order.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+from bot.bitboard import transpose
+
+
+# Number of the board symmetries (dihedral group of the square).
+N_TRANSFORMS = 8
+
+# Moves swapped by each of the basic transforms.
+FLIP_H_MOVES = {'right': 'left', 'left': 'right', 'up': 'up', 'down': 'down'}
+FLIP_V_MOVES = {'right': 'right', 'left': 'left', 'up': 'down', 'down': 'up'}
+TRANSPOSE_MOVES = {'right': 'down', 'left': 'up', 'up': 'left', 'down': 'right'}
+
+
+def flip_h(board: int) -> int:
+    '''
+    Mirrors the packed board horizontally (reverses the columns).
+    '''
+    return (
+        ((board & 0x000F000F000F000F) << 12)
+        | ((board & 0x00F000F000F000F0) << 4)
+        | ((board & 0x0F000F000F000F00) >> 4)
+        | ((board & 0xF000F000F000F000) >> 12)
+    )
+
+def flip_v(board: int) -> int:
+    '''
+    Mirrors the packed board vertically (reverses the rows).
+    '''
+    return (
+        ((board & 0xFFFF) << 48)
+        | ((board & 0xFFFF0000) << 16)
+        | ((board >> 16) & 0xFFFF0000)
+        | (board >> 48)
+    )
+
+def transform(board: int, k: int) -> int:
+    '''
+    Applies the k-th symmetry to the packed board.
+
+        Parameters:
+            board (int) : Packed board.
+            k (int)     : Index of the transform (0 is identity).
+
+        Returns:
+            board (int) : Transformed packed board.
+    '''
+    if k & 1:
+        board = flip_h(board)
+    if k & 2:
+        board = flip_v(board)
+    if k & 4:
+        board = transpose(board)
+
+    return board
+
+def inverse_transform(board: int, k: int) -> int:
+    '''
+    Reverts the k-th symmetry (i.e. inverse of transform).
+
+        Parameters:
+            board (int) : Transformed packed board.
+            k (int)     : Index of the transform used.
+
+        Returns:
+            board (int) : Packed board in the original orientation.
+    '''
+    if k & 4:
+        board = transpose(board)
+    if k & 2:
+        board = flip_v(board)
+    if k & 1:
+        board = flip_h(board)
+
+    return board
+
+def map_move(move: str, k: int) -> str:
+    '''
+    Maps a move on the original board onto the equivalent move on the
+    board transformed with the k-th symmetry.
+
+        Parameters:
+            move (str) : Move in the original orientation.
+            k (int)    : Index of the transform.
+
+        Returns:
+            move (str) : Move in the transformed orientation.
+    '''
+    if k & 1:
+        move = FLIP_H_MOVES[move]
+    if k & 2:
+        move = FLIP_V_MOVES[move]
+    if k & 4:
+        move = TRANSPOSE_MOVES[move]
+
+    return move
+
+def unmap_move(move: str, k: int) -> str:
+    '''
+    Maps a move on the transformed board back to the original orientation.
+
+        Parameters:
+            move (str) : Move in the transformed orientation.
+            k (int)    : Index of the transform.
+
+        Returns:
+            move (str) : Move in the original orientation.
+    '''
+    if k & 4:
+        move = TRANSPOSE_MOVES[move]
+    if k & 2:
+        move = FLIP_V_MOVES[move]
+    if k & 1:
+        move = FLIP_H_MOVES[move]
+
+    return move
+
+def canonicalize(board: int) -> tuple:
+    '''
+    Maps the packed board to its canonical representative, which is the
+    smallest packed integer among all its 8 symmetric variants.
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (tuple) : (canonical packed board, index of the transform used).
+    '''
+    best, best_k = board, 0
+
+    for k in range(1, N_TRANSFORMS):
+        variant = transform(board, k)
+
+        if variant < best:
+            best, best_k = variant, k
+
+    return best, best_k
+
+def canonical_moves(board: int, values: dict) -> dict:
+    '''
+    Translates values keyed by moves on the original board (e.g. costs)
+    into the orientation of the canonical board.
+
+        Parameters:
+            board (int)   : Packed board (original orientation).
+            values (dict) : Move -> value, in the original orientation.
+
+        Returns:
+            (dict) : Move -> value, in the canonical orientation.
+    '''
+    k = canonicalize(board)[1]
+    return {map_move(mv, k): val for mv, val in values.items()}
+
+def original_moves(board: int, values: dict) -> dict:
+    '''
+    Translates values keyed by moves on the canonical board (e.g. cached
+    costs) back into the orientation of the original board.
+
+        Parameters:
+            board (int)   : Packed board (original orientation).
+            values (dict) : Move -> value, in the canonical orientation.
+
+        Returns:
+            (dict) : Move -> value, in the original orientation.
+    '''
+    k = canonicalize(board)[1]
+    return {unmap_move(mv, k): val for mv, val in values.items()}
@@ -0,0 +1,170 @@
+'''
+code/bot/trajectory.py
+
+2048-intelligent-bot: Compact record of a played game (moves, spawns, search stats).
+
+A trajectory is stored as three byte streams:
+    - moves  : one byte per move (index into GameBoard.MOVES),
+    - spawns : one byte per new number (cell index | exponent << 4),
+    - stats  : one fixed-size record per move (see STATS_DTYPE).
+A move that does not change the board is followed by no spawn, so the
+game can be replayed exactly from the streams alone.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import zlib
+import numpy as np
+from bot.bitboard import MOVE_FUNCTIONS
+
+
+# Moves in the order of their byte codes (as in GameBoard.MOVES).
+MOVES = list(MOVE_FUNCTIONS)
+
+# Per-move search stats.
+STATS_DTYPE = np.dtype([
+    ('search_depth', '<u2'),
+    ('searches_per_move', '<u2'),
+    ('rollouts', '<u4'),
+    ('decision_us', '<u4')
+])
+
+
+class Trajectory:
+    '''
+    -----------
+    Class to record (and replay) the moves and spawns of a single game.
+    -----------
+    '''
+
+    def __init__(self: 'Trajectory') -> None:
+        '''
+        Constructor to initialize an empty trajectory.
+
+            Parameters:
+                self ('Trajectory')
+        '''
+        self.moves = bytearray()
+        self.spawns = bytearray()
+        self.stats = []
+
+    def add_spawns(self: 'Trajectory', before: int, after: int) -> None:
+        '''
+        Records the numbers inserted into the board.
+
+            Parameters:
+                self ('Trajectory')
+                before (int) : Packed board before the insert.
+                after (int)  : Packed board after the insert.
+        '''
+        diff = before ^ after
+
+        while diff:
+            i = ((diff & -diff).bit_length() - 1) >> 2
+            self.spawns.append(i | (((after >> (4 * i)) & 0xF) << 4))
+            diff &= ~(0xF << (4 * i))
+
+    def add_move(
+        self: 'Trajectory',
+        move: str,
+        search_depth: int,
+        searches_per_move: int,
+        rollouts: int,
+        decision_us: int
+    ) -> None:
+        '''
+        Records a move made by the bot with the stats of its search.
+
+            Parameters:
+                self ('Trajectory')
+                move (str)              : Move made.
+                search_depth (int)      : Search depth of the decision.
+                searches_per_move (int) : Searches per move of the decision.
+                rollouts (int)          : Rollouts run for the decision.
+                decision_us (int)       : Time of the decision (in microseconds).
+        '''
+        self.moves.append(MOVES.index(move))
+        self.stats.append((search_depth, searches_per_move, rollouts, decision_us))
+
+    def pack(self: 'Trajectory', compress: bool=True) -> tuple:
+        '''
+        Packs the trajectory into binary blobs.
+
+            Parameters:
+                self ('Trajectory')
+                compress (bool) : If True, the blobs are compressed with zlib.
+
+            Returns:
+                (tuple) : (moves, spawns, stats) blobs.
+        '''
+        blobs = (
+            bytes(self.moves),
+            bytes(self.spawns),
+            np.array(self.stats, dtype=STATS_DTYPE).tobytes()
+        )
+
+        if compress:
+            blobs = tuple(zlib.compress(blob) for blob in blobs)
+
+        return blobs
+
+    @classmethod
+    def unpack(cls: type, moves: bytes, spawns: bytes, stats: bytes, compressed: bool=True) -> 'Trajectory':
+        '''
+        Restores a trajectory from its binary blobs.
+
+            Parameters:
+                cls (type)
+                moves (bytes)     : Blob of the moves.
+                spawns (bytes)    : Blob of the spawns.
+                stats (bytes)     : Blob of the search stats.
+                compressed (bool) : True if the blobs are compressed with zlib.
+
+            Returns:
+                trajectory ('Trajectory') : Restored trajectory.
+        '''
+        if compressed:
+            moves, spawns, stats = (zlib.decompress(blob) for blob in (moves, spawns, stats))
+
+        trajectory = cls()
+        trajectory.moves = bytearray(moves)
+        trajectory.spawns = bytearray(spawns)
+        trajectory.stats = np.frombuffer(stats, dtype=STATS_DTYPE).tolist()
+        return trajectory
+
+    def replay(self: 'Trajectory', initial_spawns: int=2) -> list:
+        '''
+        Replays the game, returning the board after each move (and its spawn).
+
+            Parameters:
+                self ('Trajectory')
+                initial_spawns (int) : Number of the numbers inserted at the start.
+
+            Returns:
+                boards (list) : Packed boards, from the start of the game.
+        '''
+        move_funcs = [MOVE_FUNCTIONS[mv] for mv in MOVES]
+        spawns = iter(self.spawns)
+        board = 0
+
+        for _ in range(initial_spawns):
+            spawn = next(spawns)
+            board |= (spawn >> 4) << (4 * (spawn & 0xF))
+
+        boards = [board]
+
+        for code in self.moves:
+            new_board = move_funcs[code](board)
+
+            if new_board != board:
+                spawn = next(spawns, None)
+
+                # Case: the game stopped before the insert.
+                if spawn is not None:
+                    new_board |= (spawn >> 4) << (4 * (spawn & 0xF))
+
+            board = new_board
+            boards.append(board)
+
+        return boards
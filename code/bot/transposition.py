@@ -0,0 +1,124 @@
+'''
+code/bot/transposition.py
+
+2048-intelligent-bot: Transposition table for rollouts reused across moves.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    '''
+    -----------
+    Class to cache the rollouts sampled from afterstates (boards after a move,
+    before the spawn), with a bounded number of entries and LRU eviction.
+    Each entry is keyed by the afterstate, canonicalised over the board
+    symmetries (see bot/symmetry.py), and the depth of its rollouts. The
+    rollouts are kept as (steps, final board) samples, so that their costs
+    can be recomputed with the current score, and the rollouts one step
+    shorter than needed can be extended (see Bot.reuse_samples).
+    -----------
+    '''
+
+    def __init__(self: 'TranspositionTable', max_entries: int=65536, max_samples: int=256) -> None:
+        '''
+        Constructor to initialize an empty table.
+
+            Parameters:
+                self ('TranspositionTable')
+                max_entries (int) : Max number of cached entries (memory budget).
+                max_samples (int) : Max number of rollouts kept per entry.
+        '''
+        self.max_entries = max_entries
+        self.max_samples = max_samples
+        self.entries = OrderedDict()
+
+        # Counters to measure how much search the table saves.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rollouts_saved = 0
+
+    def get(self: 'TranspositionTable', keys: list) -> tuple:
+        '''
+        Returns the samples cached for the first of the keys found (and marks
+        it as recently used). A lookup counts as a single hit or miss.
+
+            Parameters:
+                self ('TranspositionTable')
+                keys (list) : Keys (afterstate, depth), in the order of preference.
+
+            Returns:
+                (tuple) : (key found, list of (steps, final board)); None if not cached.
+        '''
+        for key in keys:
+            samples = self.entries.get(key)
+
+            if samples is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return key, samples
+
+        self.misses += 1
+        return None
+
+    def store(self: 'TranspositionTable', key: tuple, samples: list) -> None:
+        '''
+        Stores the samples for a key (replacing the cached ones), evicting the
+        least recently used entry if the table is full.
+
+            Parameters:
+                self ('TranspositionTable')
+                key (tuple)    : Key (afterstate, depth).
+                samples (list) : Rollouts as (steps, final board).
+        '''
+        self.entries[key] = samples[-self.max_samples:]
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def add(self: 'TranspositionTable', key: tuple, samples: list) -> None:
+        '''
+        Adds the samples to the ones cached for a key (the newest are kept).
+
+            Parameters:
+                self ('TranspositionTable')
+                key (tuple)    : Key (afterstate, depth).
+                samples (list) : Rollouts as (steps, final board).
+        '''
+        self.store(key, self.entries.get(key, []) + samples)
+
+    def clear(self: 'TranspositionTable') -> None:
+        '''
+        Removes all the cached entries (the counters are kept).
+
+            Parameters:
+                self ('TranspositionTable')
+        '''
+        self.entries.clear()
+
+    def stats(self: 'TranspositionTable') -> dict:
+        '''
+        Returns the counters of the table.
+
+            Parameters:
+                self ('TranspositionTable')
+
+            Returns:
+                (dict) : Hits, misses, hit rate, evictions, saved rollouts and size.
+        '''
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'rollouts_saved': self.rollouts_saved,
+            'size': len(self.entries)
+        }
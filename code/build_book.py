@@ -0,0 +1,143 @@
+'''
+code/build_book.py
+
+2048-intelligent-bot: Offline builder of the opening book (see bot/opening_book.py).
+
+The positions are collected from the first moves of seeded headless games
+(in their canonical orientation, so symmetric positions are merged). The
+positions seen in enough games are then searched with a larger budget of
+rollouts, and the best moves are written to the book file.
+
+Usage (from the code directory):
+    python build_book.py --games 200 --output db/opening_book.bin
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from bot.bot import Bot
+from bot.opening_book import write_book
+from bot.symmetry import canonicalize
+
+
+def play_opening(task: tuple) -> list:
+    '''
+    Plays the first moves of a seeded headless game (run inside a worker
+    process), step by step as in Bot.play, but stops after the decisions collected.
+
+        Parameters:
+            task (tuple) : (seed of the game, max number of the decisions).
+
+        Returns:
+            boards (list) : Packed board of each decision.
+    '''
+    seed, max_moves = task
+    boards = []
+
+    with Bot(headless=True, seed=seed) as bot:
+        bot.insert_new_num(n=2, rng=bot.spawn_rng)
+
+        while len(boards) < max_moves:
+            board = bot.board
+            over = bot.play_step()
+
+            # A won board is not searched (so it is not collected).
+            if not bot.win:
+                boards.append(board)
+
+            if over:
+                break
+
+    return boards
+
+def collect_positions(n_games: int, max_moves: int, workers: int, seed: int) -> tuple:
+    '''
+    Collects the canonical positions of the first moves of seeded games.
+
+        Parameters:
+            n_games (int)   : Number of games to play.
+            max_moves (int) : Number of the first moves of each game collected.
+            workers (int)   : Number of worker processes (None for all cores).
+            seed (int)      : Base seed of the games.
+
+        Returns:
+            (tuple) : (Counter of the canonical positions, move number at which
+                      each position was first seen).
+    '''
+    counts = Counter()
+    move_nums = {}
+    tasks = [(seed + i, max_moves) for i in range(n_games)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for boards in pool.map(play_opening, tasks):
+            for move_num, board in enumerate(boards):
+                key = canonicalize(board)[0]
+                counts[key] += 1
+                move_nums[key] = min(move_nums.get(key, move_num), move_num)
+
+    return counts, move_nums
+
+def search_position(task: tuple) -> str:
+    '''
+    Searches the best move of a position (run inside a worker process).
+
+        Parameters:
+            task (tuple) : (canonical board, move number, searches per move, seed).
+
+        Returns:
+            (str) : Best move on the canonical board.
+    '''
+    board, move_num, searches, seed = task
+    with Bot(headless=True, seed=seed) as bot:
+        bot.board = board
+        bot.move_num = move_num
+        bot.update_search_params()
+        bot.searches_per_move = searches
+        return bot.search_move()
+
+def build_book(args: argparse.Namespace) -> dict:
+    '''
+    Builds the entries of the opening book.
+
+        Parameters:
+            args (argparse.Namespace) : Parsed command-line arguments.
+
+        Returns:
+            (dict) : Canonical packed board -> best move.
+    '''
+    counts, move_nums = collect_positions(args.games, args.max_moves, args.workers, args.seed)
+    frequent = [key for key, n in counts.most_common(args.max_entries) if n >= args.min_count]
+    tasks = [(key, move_nums[key], args.searches, args.seed + i) for i, key in enumerate(frequent)]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        moves = list(pool.map(search_position, tasks, chunksize=16))
+
+    print(f'Positions collected : {len(counts)}')
+    print(f'Positions in the book : {len(frequent)}')
+    return dict(zip(frequent, moves))
+
+def parse_args() -> argparse.Namespace:
+    '''
+    Parses the command-line arguments of the builder.
+
+        Returns:
+            (argparse.Namespace) : Parsed arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Build the opening book of the 2048 bot.')
+    parser.add_argument('--games', type=int, default=200, help='number of games played')
+    parser.add_argument('--max-moves', type=int, default=50, help='first moves collected per game')
+    parser.add_argument('--min-count', type=int, default=2, help='min games a position is seen in')
+    parser.add_argument('--max-entries', type=int, default=None, help='max positions in the book')
+    parser.add_argument('--searches', type=int, default=200, help='rollouts per move of the search')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='base seed of the games')
+    parser.add_argument('--output', default='db/opening_book.bin', help='path of the book file')
+    return parser.parse_args()
+
+
+if __name__=='__main__':
+    args = parse_args()
+    write_book(args.output, build_book(args))
@@ -0,0 +1,349 @@
+'''
+code/check.py
+
+2048-intelligent-bot: Randomized self-checks of the game engines (and the DB aggregates).
+
+The checks compare the optimized code paths against simple references on
+seeded random inputs, and print the result of each check (the script exits
+with an error if any of them fails):
+    - engines : the moves, legal moves and game over of the engines of each
+                board size (bot/bitboard.py, bot/engines.py) match the row
+                slide of the original game (on the unpacked grids).
+    - spawn   : the new tiles of the batched boards (bot/batch_rollout.py and
+                bot/multi_game.py) land uniformly in the empty cells.
+    - summary : the aggregates precomputed by the triggers (db/analytics.py)
+                match the stored records after random inserts, updates and
+                deletes (on a temporary DB).
+
+Usage (from the code directory):
+    python check.py
+    python check.py --only engines --boards 5000
+    python check.py --only spawn --samples 200000
+    python check.py --only summary --rows 5000
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import numpy as np
+from bot.batch_rollout import insert_batch
+from bot.bitboard import MAX_EXPONENT
+from bot.engines import MAX_SIZE, MIN_SIZE, get_engine
+from bot.multi_game import MultiGameBoard
+from db.db_tools import create_db
+
+
+# Moves in the order of GameBoard.MOVES (and of the legal moves).
+MOVES = ['right', 'left', 'up', 'down']
+
+# Max number of the failed boards reported per board size.
+MAX_REPORTED = 5
+
+
+# Critical value of the chi-square test with 15 degrees of freedom (16 cells)
+# at the significance level of 0.001.
+CHI2_CRIT_16_CELLS = 37.70
+
+
+def reference_row(row: list) -> list:
+    '''
+    Slides a row of tile values to the left (as GameBoard.update_arr of the
+    original game, with the tiles capped at 2^MAX_EXPONENT).
+
+        Parameters:
+            row (list) : Tile values of the row (0 for empty cells).
+
+        Returns:
+            new (list) : Tile values of the row after the slide.
+    '''
+    temp = [n for n in row if n != 0]
+    new = []
+    skip = False
+
+    for i in range(len(temp)):
+        if skip:
+            skip = False
+            continue
+
+        if i != len(temp) - 1 and temp[i] == temp[i + 1]:
+            skip = True
+            new.append(min(2 * temp[i], 1 << MAX_EXPONENT))
+        else:
+            new.append(temp[i])
+
+    return new + [0] * (len(row) - len(new))
+
+def reference_move(grid: np.ndarray, move: str) -> np.ndarray:
+    '''
+    Makes a move on the grid of tile values, row by row (or column by column).
+
+        Parameters:
+            grid (np.ndarray) : Grid of tile values.
+            move (str)        : One of MOVES.
+
+        Returns:
+            (np.ndarray) : Grid after the move.
+    '''
+    # Each move is a left slide of the rows of a flipped/transposed grid.
+    view = {
+        'left': grid,
+        'right': grid[:, ::-1],
+        'up': grid.T,
+        'down': grid.T[:, ::-1]
+    }[move]
+    new = np.array([reference_row(list(row)) for row in view])
+
+    return {
+        'left': new,
+        'right': new[:, ::-1],
+        'up': new.T,
+        'down': new[:, ::-1].T
+    }[move]
+
+def random_grid(size: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Draws a random grid, with a random share of the empty cells and a random
+    range of the tiles (so that both the merges and the full boards are common).
+
+        Parameters:
+            size (int)                : Size of the NxN grid.
+            rng (np.random.Generator) : Random number generator.
+
+        Returns:
+            (np.ndarray) : Grid of tile values.
+    '''
+    top = rng.choice([2, 4, MAX_EXPONENT])
+    exps = rng.integers(1, top + 1, size=(size, size))
+    exps[rng.random((size, size)) < rng.choice([0.0, 0.2, 0.5, 0.8])] = 0
+    return np.where(exps > 0, 1 << exps, 0)
+
+def check_engines(n_boards: int, seed: int) -> list:
+    '''
+    Checks the engines of all the board sizes against the reference slide:
+    the boards after each move, the legal moves and the game over.
+
+        Parameters:
+            n_boards (int) : Number of the random boards per size.
+            seed (int)     : Seed of the randomness.
+
+        Returns:
+            failures (list) : Descriptions of the failed boards.
+    '''
+    failures = []
+    rng = np.random.default_rng(seed)
+
+    for size in range(MIN_SIZE, MAX_SIZE + 1):
+        engine = get_engine(size)
+        failed = 0
+
+        for _ in range(n_boards):
+            grid = random_grid(size, rng)
+            board = engine.pack_grid(grid)
+            expected = {move: reference_move(grid, move) for move in MOVES}
+            legal = tuple(move for move in MOVES if not np.array_equal(expected[move], grid))
+            errors = []
+
+            # The legal moves are checked first, so that the moves are made
+            # on a board cached by the engine too (see ArrayEngine.slide_all).
+            if engine.legal_moves(board) != legal:
+                errors.append(f'legal_moves {engine.legal_moves(board)} != {legal}')
+
+            if engine.is_over(board) != (not legal):
+                errors.append(f'is_over {engine.is_over(board)} != {not legal}')
+
+            for move in MOVES:
+                result = engine.unpack_grid(engine.MOVE_FUNCTIONS[move](board))
+
+                if not np.array_equal(result, expected[move]):
+                    errors.append(f'{move} gives {result.tolist()} != {expected[move].tolist()}')
+
+            if errors:
+                failed += 1
+
+                if failed <= MAX_REPORTED:
+                    failures.append(f'{size}x{size} {grid.tolist()}: ' + '; '.join(errors))
+
+        if failed > MAX_REPORTED:
+            failures.append(f'{size}x{size}: {failed - MAX_REPORTED} more boards failed')
+
+    return failures
+
+def chi_square(counts: np.ndarray) -> float:
+    '''
+    Returns the chi-square statistic of the counts against a uniform distribution.
+
+        Parameters:
+            counts (np.ndarray) : Observed count of each category.
+
+        Returns:
+            (float) : Chi-square statistic.
+    '''
+    expected = counts.sum() / len(counts)
+    return float(((counts - expected) ** 2 / expected).sum())
+
+def cell_counts(boards: np.ndarray) -> np.ndarray:
+    '''
+    Counts the boards with a tile in each cell (nibble) of the 4x4 grid.
+
+        Parameters:
+            boards (np.ndarray) : Packed boards (np.uint64).
+
+        Returns:
+            (np.ndarray) : Number of the boards with a tile, per cell.
+    '''
+    return np.array([
+        np.count_nonzero((boards >> np.uint64(4 * i)) & np.uint64(0xF)) for i in range(16)
+    ])
+
+def check_spawn(samples: int, seed: int) -> list:
+    '''
+    Checks that the first tiles of the batched boards are uniform over the
+    cells, both for single inserts and the starts of the lockstep games.
+
+        Parameters:
+            samples (int) : Number of the boards of each test.
+            seed (int)    : Seed of the randomness.
+
+        Returns:
+            failures (list) : Descriptions of the failed tests.
+    '''
+    failures = []
+    rng = np.random.default_rng(seed)
+    first = insert_batch(np.zeros(samples, dtype=np.uint64), rng)
+    stat = chi_square(cell_counts(first))
+
+    if stat > CHI2_CRIT_16_CELLS:
+        failures.append(f'insert_batch: first tiles not uniform (chi2 = {stat:.1f})')
+
+    games = MultiGameBoard(samples, seed)
+    games.reset(np.arange(samples))
+    counts = cell_counts(games.boards)
+
+    if counts.sum() != 2 * samples:
+        failures.append(f'MultiGameBoard.reset: {counts.sum()} tiles on {samples} boards (expected 2 each)')
+
+    # Each start holds 2 distinct cells, so every cell is taken in 1/8 of them
+    # (the statistic is conservative for the negatively correlated cells).
+    stat = chi_square(counts)
+
+    if stat > CHI2_CRIT_16_CELLS:
+        failures.append(f'MultiGameBoard.reset: starting tiles not uniform (chi2 = {stat:.1f})')
+
+    return failures
+
+def check_summary(n_rows: int, seed: int) -> list:
+    '''
+    Checks the precomputed aggregates (bot_summary) against the aggregates of
+    the stored records, after random inserts, updates and deletes of records
+    (on a temporary DB).
+
+        Parameters:
+            n_rows (int) : Number of the records inserted.
+            seed (int)   : Seed of the randomness.
+
+        Returns:
+            failures (list) : Descriptions of the mismatched aggregates.
+    '''
+    rng = np.random.default_rng(seed)
+    configs = ['default', 'a', 'b']
+    scores = [256, 512, 1024, 2048]
+
+    def random_record() -> tuple:
+        score = int(rng.choice(scores))
+        return score, int(score == 2048), float(rng.random() * 100), str(rng.choice(configs))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'check.db')
+        create_db(db_path)
+        db = sqlite3.connect(db_path)
+
+        try:
+            with db:
+                db.executemany(
+                    'INSERT INTO bot_records_2023 (score, win, time_played_sec, config) VALUES (?, ?, ?, ?)',
+                    [random_record() for _ in range(n_rows)]
+                )
+
+                # Re-runs of some games (each column alone, and all of them).
+                ids = rng.choice(np.arange(1, n_rows + 1), size=n_rows // 2, replace=False)
+
+                for i, game_id in enumerate(ids.tolist()):
+                    score, win, t_sec, config = random_record()
+                    sql, params = [
+                        ('score = ?, win = ?', (score, win)),
+                        ('time_played_sec = ?', (t_sec,)),
+                        ('config = ?', (config,)),
+                        ('score = ?, win = ?, time_played_sec = ?, config = ?', (score, win, t_sec, config))
+                    ][i % 4]
+                    db.execute(f'UPDATE bot_records_2023 SET {sql} WHERE id = ?', params + (game_id,))
+
+                db.execute('DELETE FROM bot_records_2023 WHERE id % 7 = 0')
+
+            expected = db.execute(
+                '''SELECT COALESCE(config, 'default') AS cfg, score, COUNT(*), SUM(win),
+                          SUM(time_played_sec),
+                          SUM(CASE WHEN win = 1 THEN time_played_sec ELSE 0 END)
+                   FROM bot_records_2023
+                   GROUP BY cfg, score'''
+            ).fetchall()
+            summary = db.execute('SELECT * FROM bot_summary WHERE games > 0').fetchall()
+        finally:
+            db.close()
+
+    expected = {row[:2]: row[2:] for row in expected}
+    summary = {row[:2]: row[2:] for row in summary}
+    failures = []
+
+    for key in sorted(expected.keys() | summary.keys()):
+        found, stored = expected.get(key), summary.get(key)
+
+        if found is None or stored is None or not np.allclose(found, stored):
+            failures.append(f'bot_summary {key}: {stored} != {found} (from the records)')
+
+    return failures
+
+
+# Checks in the order of the report.
+CHECKS = {
+    'engines': lambda args: check_engines(args.boards, args.seed),
+    'spawn': lambda args: check_spawn(args.samples, args.seed),
+    'summary': lambda args: check_summary(args.rows, args.seed)
+}
+
+
+def parse_args() -> argparse.Namespace:
+    '''
+    Parses the command-line arguments of the checks.
+
+        Returns:
+            (argparse.Namespace) : Parsed arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Run randomized self-checks of the 2048 engines.')
+    parser.add_argument('--only', nargs='+', choices=list(CHECKS), help='checks to run')
+    parser.add_argument('--boards', type=int, default=2000, help='boards per size of the engines check')
+    parser.add_argument('--samples', type=int, default=100000, help='boards sampled by the spawn check')
+    parser.add_argument('--rows', type=int, default=2000, help='records written by the summary check')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the randomness')
+    return parser.parse_args()
+
+
+if __name__=='__main__':
+    args = parse_args()
+    failed = False
+
+    for name in args.only or CHECKS:
+        failures = CHECKS[name](args)
+        print(f'{name:<10}{"FAIL" if failures else "ok"}')
+
+        for failure in failures:
+            print(f'    {failure}')
+
+        failed = failed or bool(failures)
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,246 @@
+'''
+code/db/analytics.py
+
+2048-intelligent-bot: Fast analytics over the results (indexes, aggregate views, loader).
+
+The aggregates are kept precomputed in the bot_summary table (one row per
+bot configuration and final score), maintained by triggers on every insert,
+update and delete. The views read only that table, so the win rate, the score
+distribution and the time to win return in milliseconds, no matter how
+many games are stored.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import sqlite3
+import pandas as pd
+from typing import Iterator
+from db.db_tools import DATE_FORMAT, DB_PATH, migrate_db
+
+
+# Indexes of the results table (the last one covers the per-config aggregates).
+# The dates are indexed by played_at, since date_played does not sort by date.
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_records_win ON bot_records_2023 (win)',
+    'CREATE INDEX IF NOT EXISTS idx_records_score ON bot_records_2023 (score)',
+    'DROP INDEX IF EXISTS idx_records_date',
+    'CREATE INDEX IF NOT EXISTS idx_records_played_at ON bot_records_2023 (played_at)',
+    '''CREATE INDEX IF NOT EXISTS idx_records_config
+       ON bot_records_2023 (config, win, score, time_played_sec)'''
+)
+
+SUMMARY = (
+    '''CREATE TABLE IF NOT EXISTS bot_summary (
+        config TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        games INTEGER NOT NULL,
+        wins INTEGER NOT NULL,
+        time_sec FLOAT NOT NULL,
+        win_time_sec FLOAT NOT NULL,
+        PRIMARY KEY (config, score)
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS bot_summary_insert
+       AFTER INSERT ON bot_records_2023
+       BEGIN
+           INSERT INTO bot_summary (config, score, games, wins, time_sec, win_time_sec)
+           VALUES (
+               COALESCE(NEW.config, 'default'), NEW.score, 1, NEW.win, NEW.time_played_sec,
+               CASE WHEN NEW.win = 1 THEN NEW.time_played_sec ELSE 0 END
+           )
+           ON CONFLICT (config, score) DO UPDATE SET
+               games = games + 1,
+               wins = wins + excluded.wins,
+               time_sec = time_sec + excluded.time_sec,
+               win_time_sec = win_time_sec + excluded.win_time_sec;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS bot_summary_delete
+       AFTER DELETE ON bot_records_2023
+       BEGIN
+           UPDATE bot_summary SET
+               games = games - 1,
+               wins = wins - OLD.win,
+               time_sec = time_sec - OLD.time_played_sec,
+               win_time_sec = win_time_sec
+                   - CASE WHEN OLD.win = 1 THEN OLD.time_played_sec ELSE 0 END
+           WHERE config = COALESCE(OLD.config, 'default') AND score = OLD.score;
+       END''',
+    # An update moves the game from the aggregates of the old row to the new one.
+    '''CREATE TRIGGER IF NOT EXISTS bot_summary_update
+       AFTER UPDATE OF score, win, time_played_sec, config ON bot_records_2023
+       BEGIN
+           UPDATE bot_summary SET
+               games = games - 1,
+               wins = wins - OLD.win,
+               time_sec = time_sec - OLD.time_played_sec,
+               win_time_sec = win_time_sec
+                   - CASE WHEN OLD.win = 1 THEN OLD.time_played_sec ELSE 0 END
+           WHERE config = COALESCE(OLD.config, 'default') AND score = OLD.score;
+           INSERT INTO bot_summary (config, score, games, wins, time_sec, win_time_sec)
+           VALUES (
+               COALESCE(NEW.config, 'default'), NEW.score, 1, NEW.win, NEW.time_played_sec,
+               CASE WHEN NEW.win = 1 THEN NEW.time_played_sec ELSE 0 END
+           )
+           ON CONFLICT (config, score) DO UPDATE SET
+               games = games + 1,
+               wins = wins + excluded.wins,
+               time_sec = time_sec + excluded.time_sec,
+               win_time_sec = win_time_sec + excluded.win_time_sec;
+       END'''
+)
+
+VIEWS = (
+    '''CREATE VIEW IF NOT EXISTS v_win_rate AS
+       SELECT config,
+              SUM(games) AS games,
+              SUM(wins) AS wins,
+              1.0 * SUM(wins) / SUM(games) AS win_rate
+       FROM bot_summary
+       WHERE games > 0
+       GROUP BY config''',
+    '''CREATE VIEW IF NOT EXISTS v_score_distribution AS
+       SELECT config,
+              score,
+              games,
+              1.0 * games / SUM(games) OVER (PARTITION BY config) AS share
+       FROM bot_summary
+       WHERE games > 0''',
+    '''CREATE VIEW IF NOT EXISTS v_time_played AS
+       SELECT config,
+              SUM(win_time_sec) / NULLIF(SUM(wins), 0) AS avg_time_to_win_sec,
+              (SUM(time_sec) - SUM(win_time_sec))
+                  / NULLIF(SUM(games) - SUM(wins), 0) AS avg_time_to_lose_sec
+       FROM bot_summary
+       GROUP BY config'''
+)
+
+# Compact column types of the loaded records.
+RECORD_DTYPES = {
+    'id': 'int64',
+    'score': 'int32',
+    'win': 'int8',
+    'time_played_sec': 'float32',
+    'config': 'category'
+}
+
+
+def init_analytics(db_path: str=DB_PATH) -> None:
+    '''
+    Creates the indexes, the summary table (with its triggers) and the
+    aggregate views. Safe to run more than once; on the first run, the
+    summary is backfilled from the stored records.
+
+        Parameters:
+            db_path (str) : Path of the DB file.
+    '''
+    db = sqlite3.connect(db_path)
+
+    try:
+        migrate_db(db)
+
+        with db:
+            new_summary = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bot_summary'"
+            ).fetchone() is None
+
+            for statement in INDEXES + SUMMARY + VIEWS:
+                db.execute(statement)
+
+            if new_summary:
+                db.execute(
+                    '''INSERT INTO bot_summary
+                       SELECT COALESCE(config, 'default') AS cfg, score, COUNT(*), SUM(win),
+                              SUM(time_played_sec),
+                              SUM(CASE WHEN win = 1 THEN time_played_sec ELSE 0 END)
+                       FROM bot_records_2023
+                       GROUP BY cfg, score'''
+                )
+    except sqlite3.Error as e:
+        print('Failed to initialize the analytics. An error occurred:\n', e)
+    finally:
+        db.close()
+
+def query(sql: str, db_path: str=DB_PATH, params: tuple=()) -> pd.DataFrame:
+    '''
+    Runs a read-only query on the DB.
+
+        Parameters:
+            sql (str)      : SQL query.
+            db_path (str)  : Path of the DB file.
+            params (tuple) : Parameters of the query.
+
+        Returns:
+            (pd.DataFrame) : Result of the query.
+    '''
+    db = sqlite3.connect(db_path)
+
+    try:
+        return pd.read_sql_query(sql, db, params=params)
+    finally:
+        db.close()
+
+def win_rate(db_path: str=DB_PATH) -> pd.DataFrame:
+    '''
+    Returns the number of games, wins and the win rate per bot configuration.
+    '''
+    return query('SELECT * FROM v_win_rate', db_path)
+
+def score_distribution(db_path: str=DB_PATH) -> pd.DataFrame:
+    '''
+    Returns the number (and share) of games per final score and bot configuration.
+    '''
+    return query('SELECT * FROM v_score_distribution ORDER BY config, score', db_path)
+
+def time_played(db_path: str=DB_PATH) -> pd.DataFrame:
+    '''
+    Returns the average time to win (and to lose) per bot configuration.
+    '''
+    return query('SELECT * FROM v_time_played', db_path)
+
+def load_records(
+    db_path: str=DB_PATH,
+    config: str=None,
+    chunksize: int=None
+) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    '''
+    Loads the game records with compact column types (and parsed dates).
+
+        Parameters:
+            db_path (str)   : Path of the DB file.
+            config (str)    : If set, only the games of this bot configuration.
+            chunksize (int) : If set, the records are yielded in chunks of this size.
+
+        Returns:
+            (pd.DataFrame) : Records (or an iterator of chunks, with chunksize).
+    '''
+    sql = 'SELECT id, score, win, time_played_sec, date_played, config FROM bot_records_2023'
+    params = ()
+
+    if config is not None:
+        sql += ' WHERE config = ?'
+        params = (config,)
+
+    if chunksize is None:
+        return _typed(query(sql, db_path, params))
+
+    return _load_chunks(sql, db_path, params, chunksize)
+
+def _load_chunks(sql: str, db_path: str, params: tuple, chunksize: int) -> Iterator[pd.DataFrame]:
+    '''
+    Yields the result of a query in typed chunks (see load_records).
+    '''
+    db = sqlite3.connect(db_path)
+
+    try:
+        for chunk in pd.read_sql_query(sql, db, params=params, chunksize=chunksize):
+            yield _typed(chunk)
+    finally:
+        db.close()
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Casts the loaded records to RECORD_DTYPES (and parses the dates).
+    '''
+    df = df.astype({col: dtype for col, dtype in RECORD_DTYPES.items() if col in df})
+    df['date_played'] = pd.to_datetime(df['date_played'], format=DATE_FORMAT, errors='coerce')
+    return df
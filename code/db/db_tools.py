@@ -9,30 +9,126 @@ Author: Filip J. Cierkosz 2022 (updated: 2023)
 
 import sqlite3
 import pandas as pd
+from datetime import datetime
 
 
-def init_db() -> None:
+# Default path of the DB file (relative to the code directory).
+DB_PATH = 'db/bot_records_2023.db'
+
+# Format of the date_played column (as written by main.py). The same date is
+# stored in played_at as ISO-8601 text too, which sorts chronologically.
+DATE_FORMAT = '%d %b %Y %I:%M:%S %p'
+
+
+RECORDS = '''CREATE TABLE IF NOT EXISTS bot_records_2023 (
+    id INTEGER PRIMARY KEY,
+    score INTEGER,
+    win INTEGER,
+    time_played_sec FLOAT,
+    date_played TEXT,
+    config TEXT DEFAULT 'default',
+    played_at TEXT
+)'''
+
+TRAJECTORIES = '''CREATE TABLE IF NOT EXISTS bot_trajectories (
+    game_id INTEGER PRIMARY KEY
+        REFERENCES bot_records_2023(id) ON DELETE CASCADE,
+    seed INTEGER,
+    n_moves INTEGER,
+    compressed INTEGER,
+    moves BLOB,
+    spawns BLOB,
+    stats BLOB
+)'''
+
+
+def init_db(db_path: str=DB_PATH) -> None:
     '''
     Initializes the database to store: 
-        sample's ID, score, win/loss, time played, date.
+        sample's ID, score, win/loss, time played, date,
+    and (optionally, per game) the trajectory of the moves.
+
+        Parameters:
+            db_path (str) : Path of the DB file.
     '''
-    db = sqlite3.connect('db/bot_records_2023.db')
+    db = sqlite3.connect(db_path)
     cursor = db.cursor()
+    cursor.execute('DROP TABLE IF EXISTS bot_tuning')
+    cursor.execute('DROP TABLE IF EXISTS bot_trajectories')
+    cursor.execute('DROP TABLE IF EXISTS bot_summary')
     cursor.execute('DROP TABLE IF EXISTS bot_records_2023')
-    cursor.execute(
-        '''CREATE TABLE bot_records_2023 (
-            id INTEGER PRIMARY KEY,
-            score INTEGER,
-            win INTEGER,
-            time_played_sec FLOAT,
-            date_played TEXT
-        )'''
-    )
     db.commit()
     db.close()
+
+    create_db(db_path)
     print('The DB has been successfully initialized.')
 
-def update_db(win: int, score: int, t_sec: float, date: str) -> None:
+def create_db(db_path: str=DB_PATH) -> None:
+    '''
+    Creates the tables missing in the database (the stored records are kept,
+    unlike in init_db), and migrates the ones created by an older version.
+
+        Parameters:
+            db_path (str) : Path of the DB file.
+    '''
+    db = sqlite3.connect(db_path)
+
+    try:
+        with db:
+            db.execute(RECORDS)
+            db.execute(TRAJECTORIES)
+
+        migrate_db(db)
+    finally:
+        db.close()
+
+    # Indexes, precomputed aggregates, views and the sweep results (imported
+    # lazily, since these modules depend on this one).
+    from db.analytics import init_analytics
+    from db.tuning import init_tuning
+    init_analytics(db_path)
+    init_tuning(db_path)
+
+def iso_date(date: str) -> str:
+    '''
+    Converts a date in DATE_FORMAT into ISO-8601 text (for the played_at column).
+
+        Parameters:
+            date (str) : Date in DATE_FORMAT.
+
+        Returns:
+            (str) : Date as 'YYYY-MM-DD HH:MM:SS' (None if it cannot be parsed).
+    '''
+    try:
+        return datetime.strptime(date, DATE_FORMAT).isoformat(sep=' ')
+    except (TypeError, ValueError):
+        return None
+
+def migrate_db(db: sqlite3.Connection) -> None:
+    '''
+    Adds the columns missing in a DB initialized by an older version
+    (i.e. the bot configuration/version of each game, and the sortable
+    date, which is backfilled from date_played).
+
+        Parameters:
+            db (sqlite3.Connection) : Open connection to the DB.
+    '''
+    columns = [row[1] for row in db.execute('PRAGMA table_info(bot_records_2023)')]
+
+    if columns and 'config' not in columns:
+        db.execute("ALTER TABLE bot_records_2023 ADD COLUMN config TEXT DEFAULT 'default'")
+        db.commit()
+
+    if columns and 'played_at' not in columns:
+        with db:
+            db.execute('ALTER TABLE bot_records_2023 ADD COLUMN played_at TEXT')
+            rows = db.execute('SELECT id, date_played FROM bot_records_2023').fetchall()
+            db.executemany(
+                'UPDATE bot_records_2023 SET played_at = ? WHERE id = ?',
+                [(iso_date(date), game_id) for game_id, date in rows]
+            )
+
+def update_db(win: int, score: int, t_sec: float, date: str, db_path: str=DB_PATH) -> None:
     '''
     Updates the database inserting a new row.
 
@@ -41,16 +137,17 @@ def update_db(win: int, score: int, t_sec: float, date: str) -> None:
             score (int)   : game score
             t_sec (float) : game time (in seconds)
             date (str)    : game date
+            db_path (str) : Path of the DB file.
     '''
     # Update only if the bot managed to run (i.e. no error/external interruption).
     if t_sec > 0:
         try:
-            db = sqlite3.connect('db/bot_records_2023.db')
+            db = sqlite3.connect(db_path)
             cursor = db.cursor()
             insert_with_params = '''INSERT INTO bot_records_2023
-                                    (score, win, time_played_sec, date_played)
-                                    VALUES (?, ?, ?, ?);'''
-            data = (score, win, t_sec, date)
+                                    (score, win, time_played_sec, date_played, played_at)
+                                    VALUES (?, ?, ?, ?, ?);'''
+            data = (score, win, t_sec, date, iso_date(date))
             cursor.execute(insert_with_params, data)
             db.commit()
             db.close()
@@ -66,13 +163,16 @@ def update_db(win: int, score: int, t_sec: float, date: str) -> None:
     else:
         print('\nNo updates to the DB.\n')
 
-def print_records_db() -> None:
+def print_records_db(db_path: str=DB_PATH) -> None:
     '''
     Displays the database records using pandas dataframe.
+
+        Parameters:
+            db_path (str) : Path of the DB file.
     '''
     try:
-        db = sqlite3.connect('db/bot_records_2023.db')
-        df = pd.read_sql_query('SELECT * FROM ', db)
+        db = sqlite3.connect(db_path)
+        df = pd.read_sql_query('SELECT * FROM bot_records_2023', db)
         print(df.to_string())
     except sqlite3.Error as e:
         print('Failed to process the DB. An error occurred:\n', e)
@@ -0,0 +1,54 @@
+'''
+code/db/trajectories.py
+
+2048-intelligent-bot: Loading and replay of the game trajectories stored in the DB.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import sqlite3
+from bot.trajectory import Trajectory
+from db.db_tools import DB_PATH
+
+
+def load_trajectory(game_id: int, db_path: str=DB_PATH) -> Trajectory:
+    '''
+    Loads the trajectory of a game.
+
+        Parameters:
+            game_id (int) : ID of the game (in bot_records_2023).
+            db_path (str) : Path of the DB file.
+
+        Returns:
+            (Trajectory) : Trajectory of the game (None if it was not recorded).
+    '''
+    db = sqlite3.connect(db_path)
+
+    try:
+        row = db.execute(
+            'SELECT moves, spawns, stats, compressed FROM bot_trajectories WHERE game_id = ?',
+            (game_id,)
+        ).fetchone()
+    finally:
+        db.close()
+
+    if row is None:
+        return None
+
+    moves, spawns, stats, compressed = row
+    return Trajectory.unpack(moves, spawns, stats, compressed=bool(compressed))
+
+def replay_game(game_id: int, db_path: str=DB_PATH) -> list:
+    '''
+    Replays a stored game.
+
+        Parameters:
+            game_id (int) : ID of the game (in bot_records_2023).
+            db_path (str) : Path of the DB file.
+
+        Returns:
+            (list) : Packed boards after each move (empty if not recorded).
+    '''
+    trajectory = load_trajectory(game_id, db_path)
+    return trajectory.replay() if trajectory is not None else []
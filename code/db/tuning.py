@@ -0,0 +1,112 @@
+'''
+code/db/tuning.py
+
+2048-intelligent-bot: Results of the parameter sweeps of the bot (see tune.py).
+
+Every game of a sweep is stored in bot_records_2023 (labelled with its
+configuration, so the analytics views cover it too), while bot_tuning keeps
+one row per configuration and round of a sweep, with its coefficients and
+the aggregates used to rank it.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import json
+import sqlite3
+import pandas as pd
+from db.db_tools import DB_PATH
+
+
+TUNING = '''CREATE TABLE IF NOT EXISTS bot_tuning (
+    id INTEGER PRIMARY KEY,
+    sweep TEXT NOT NULL,
+    config TEXT NOT NULL,
+    coeffs TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    win_rate FLOAT NOT NULL,
+    avg_time_to_win_sec FLOAT,
+    cpu_sec FLOAT NOT NULL,
+    wins_per_cpu_sec FLOAT NOT NULL,
+    date_tuned TEXT
+)'''
+
+INSERT_TUNING = '''INSERT INTO bot_tuning
+                   (sweep, config, coeffs, round, games, wins, win_rate,
+                    avg_time_to_win_sec, cpu_sec, wins_per_cpu_sec, date_tuned)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);'''
+
+
+def init_tuning(db_path: str=DB_PATH) -> None:
+    '''
+    Creates the table of the sweep results (if it does not exist yet).
+
+        Parameters:
+            db_path (str) : Path of the DB file.
+    '''
+    db = sqlite3.connect(db_path)
+
+    try:
+        with db:
+            db.execute(TUNING)
+            db.execute('CREATE INDEX IF NOT EXISTS idx_tuning_sweep ON bot_tuning (sweep, round)')
+    except sqlite3.Error as e:
+        print('Failed to initialize the tuning table. An error occurred:\n', e)
+    finally:
+        db.close()
+
+def record_round(sweep: str, round_num: int, stats: list, date: str, db_path: str=DB_PATH) -> None:
+    '''
+    Records the aggregates of all the configurations evaluated in a round.
+
+        Parameters:
+            sweep (str)     : Name of the sweep.
+            round_num (int) : Round of the sweep (0 for grid/random sweeps).
+            stats (list)    : Aggregates of each configuration (see tune.summarize_config).
+            date (str)      : Date of the round.
+            db_path (str)   : Path of the DB file.
+    '''
+    rows = [
+        (
+            sweep, s['config'], json.dumps(s['coeffs']), round_num, s['games'], s['wins'],
+            s['win_rate'], s['avg_time_to_win_sec'], s['cpu_sec'], s['wins_per_cpu_sec'], date
+        )
+        for s in stats
+    ]
+    db = sqlite3.connect(db_path)
+
+    try:
+        with db:
+            db.executemany(INSERT_TUNING, rows)
+    except sqlite3.Error as e:
+        print('Failed to record the tuning round. An error occurred:\n', e)
+    finally:
+        db.close()
+
+def load_tuning(sweep: str=None, db_path: str=DB_PATH) -> pd.DataFrame:
+    '''
+    Loads the sweep results, best configurations (of the last round) first.
+
+        Parameters:
+            sweep (str)   : If set, only the results of this sweep.
+            db_path (str) : Path of the DB file.
+
+        Returns:
+            (pd.DataFrame) : Results of each configuration and round.
+    '''
+    sql = 'SELECT * FROM bot_tuning'
+    params = ()
+
+    if sweep is not None:
+        sql += ' WHERE sweep = ?'
+        params = (sweep,)
+
+    sql += ' ORDER BY sweep, round DESC, wins_per_cpu_sec DESC, win_rate DESC'
+    db = sqlite3.connect(db_path)
+
+    try:
+        return pd.read_sql_query(sql, db, params=params)
+    finally:
+        db.close()
@@ -0,0 +1,236 @@
+'''
+code/db/writer.py
+
+2048-intelligent-bot: Batched SQLite writer for high-volume result ingestion.
+
+A single writer thread owns one long-lived connection (in WAL mode) and
+inserts the queued rows in executemany batches, flushed when a batch is
+full or when the oldest queued row is older than the flush interval. Any
+number of producer threads can write concurrently through the queue.
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import queue
+import sqlite3
+import threading
+import zlib
+from time import time
+from db.db_tools import DB_PATH, iso_date, migrate_db
+
+
+# Pragmas of the writer connection (WAL lets readers work during the writes,
+# and NORMAL sync is durable in WAL mode except on power loss).
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON'
+)
+
+INSERT_RECORD = '''INSERT INTO bot_records_2023
+                   (score, win, time_played_sec, date_played, config, played_at)
+                   VALUES (?, ?, ?, ?, ?, ?);'''
+
+INSERT_TRAJECTORY = '''INSERT INTO bot_trajectories
+                       (game_id, seed, n_moves, compressed, moves, spawns, stats)
+                       VALUES (?, ?, ?, ?, ?, ?, ?);'''
+
+# Marker closing the queue (the writer flushes and exits).
+_CLOSE = object()
+
+
+class ResultWriter:
+    '''
+    -----------
+    Class to write the game results to the DB in batches from a writer thread.
+    -----------
+    '''
+
+    def __init__(
+        self: 'ResultWriter',
+        db_path: str=DB_PATH,
+        batch_size: int=100,
+        flush_sec: float=1.0
+    ) -> None:
+        '''
+        Constructor to start the writer thread.
+
+            Parameters:
+                self ('ResultWriter')
+                db_path (str)     : Path of the DB file.
+                batch_size (int)  : Max number of rows in a single batch.
+                flush_sec (float) : Max time a row waits in the queue (in seconds).
+        '''
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_sec = flush_sec
+
+        # Number of rows written and dropped (failed batches or no DB) so far.
+        self.written = 0
+        self.dropped = 0
+
+        # Error of the connection (None if the DB was opened).
+        self.error = None
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self: 'ResultWriter') -> 'ResultWriter':
+        '''
+        Returns the writer (closed on leaving the with block).
+        '''
+        return self
+
+    def __exit__(self: 'ResultWriter', *exc: object) -> None:
+        '''
+        Flushes the queued rows and stops the writer thread.
+        '''
+        self.close()
+
+    def write(
+        self: 'ResultWriter',
+        win: int,
+        score: int,
+        t_sec: float,
+        date: str,
+        trajectory: tuple=None,
+        seed: int=None,
+        compressed: bool=True,
+        config: str='default'
+    ) -> None:
+        '''
+        Queues a new row (safe to call from any thread).
+
+            Parameters:
+                self ('ResultWriter')
+                win (int)          : 1 for win, 0 for loss
+                score (int)        : game score
+                t_sec (float)      : game time (in seconds)
+                date (str)         : game date (in db_tools.DATE_FORMAT)
+                trajectory (tuple) : If set, (moves, spawns, stats) blobs of the
+                                     game (see Trajectory.pack).
+                seed (int)         : Seed of the game (stored with the trajectory).
+                compressed (bool)  : True if the trajectory blobs are compressed.
+                config (str)       : Label of the bot configuration/version.
+        '''
+        # Write only if the bot managed to run (as in db_tools.update_db).
+        if t_sec <= 0:
+            return
+
+        extra = None
+
+        if trajectory is not None:
+            moves, spawns, stats = trajectory
+            n_moves = len(zlib.decompress(moves)) if compressed else len(moves)
+            extra = (seed, n_moves, int(compressed), moves, spawns, stats)
+
+        self.queue.put(((score, win, t_sec, date, config, iso_date(date)), extra))
+
+    def close(self: 'ResultWriter') -> None:
+        '''
+        Flushes the queued rows and stops the writer thread.
+
+            Parameters:
+                self ('ResultWriter')
+        '''
+        if self.thread.is_alive():
+            self.queue.put(_CLOSE)
+            self.thread.join()
+
+    def connect(self: 'ResultWriter') -> sqlite3.Connection:
+        '''
+        Opens the connection of the writer thread.
+
+            Parameters:
+                self ('ResultWriter')
+
+            Returns:
+                db (sqlite3.Connection) : Connection with the pragmas applied.
+        '''
+        db = sqlite3.connect(self.db_path)
+
+        try:
+            for pragma in PRAGMAS:
+                db.execute(pragma)
+
+            migrate_db(db)
+        except sqlite3.Error:
+            db.close()
+            raise
+
+        return db
+
+    def flush(self: 'ResultWriter', db: sqlite3.Connection, rows: list) -> None:
+        '''
+        Inserts a batch of rows in a single transaction. The rows with a
+        trajectory are inserted one by one (to link it to the game's ID).
+
+            Parameters:
+                self ('ResultWriter')
+                db (sqlite3.Connection) : Connection of the writer thread.
+                rows (list)             : Pairs of (record, trajectory or None).
+        '''
+        try:
+            with db:
+                db.executemany(INSERT_RECORD, [row for row, extra in rows if extra is None])
+
+                for row, extra in rows:
+                    if extra is not None:
+                        game_id = db.execute(INSERT_RECORD, row).lastrowid
+                        db.execute(INSERT_TRAJECTORY, (game_id, *extra))
+
+            self.written += len(rows)
+        except sqlite3.Error as e:
+            self.dropped += len(rows)
+            print('Failed to update the DB. An error occurred:\n', e)
+
+    def run(self: 'ResultWriter') -> None:
+        '''
+        Main loop of the writer thread.
+
+            Parameters:
+                self ('ResultWriter')
+        '''
+        try:
+            db = self.connect()
+        except sqlite3.Error as e:
+            # Without the DB, every queued row is dropped (until closed).
+            self.error = e
+            print('Failed to connect to the DB. An error occurred:\n', e)
+
+            while self.queue.get() is not _CLOSE:
+                self.dropped += 1
+
+            return
+
+        rows = []
+        deadline = None
+        closing = False
+
+        try:
+            while not closing:
+                timeout = None if deadline is None else max(deadline - time(), 0)
+
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _CLOSE:
+                    closing = True
+                elif item is not None:
+                    rows.append(item)
+
+                    if deadline is None:
+                        deadline = time() + self.flush_sec
+
+                if rows and (closing or len(rows) >= self.batch_size or time() >= deadline):
+                    self.flush(db, rows)
+                    rows = []
+                    deadline = None
+        finally:
+            db.close()
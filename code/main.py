@@ -7,8 +7,10 @@ Author: Filip J. Cierkosz 2022 (updated: 2023)
 '''
 
 
+from bot.batch import run_games
 from bot.bot import Bot
-from db.db_tools import init_db, update_db
+from db.db_tools import DATE_FORMAT, DB_PATH, init_db, update_db
+from db.writer import ResultWriter
 from datetime import datetime
 
 
@@ -24,18 +26,49 @@ def run_bot() -> None:
         win=bot.win,
         score=int(bot.score),
         t_sec=bot.timer,
-        date=now.strftime('%d %b %Y %I:%M:%S %p')
+        date=now.strftime(DATE_FORMAT)
     )
 
-def run_tests() -> None:
+def run_tests(
+    n_games: int=100,
+    workers: int=None,
+    seed: int=0,
+    db_path: str=DB_PATH,
+    record_trajectories: bool=False,
+    config: str='default'
+) -> None:
     '''
-    Performs 100 sample runs of the AI bot and stores 
-    the results in the initialized database. 
+    Performs sample runs of the AI bot (headless, in parallel across
+    the CPU cores) and stores the results in the initialized database.
 
-    NB: Takes several hours to complete!
+    The games are played by worker processes, while the results are
+    written to the DB in batches by a single writer (see db/writer.py)
+    as games finish.
+
+        Parameters:
+            n_games (int)              : Number of games to play.
+            workers (int)              : Number of worker processes (None for all cores).
+            seed (int)                 : Base seed; the i-th game is played with seed + i.
+            db_path (str)              : Path of the DB file.
+            record_trajectories (bool) : If True, the moves of each game are stored
+                                         too (see db/trajectories.py for replay).
+            config (str)               : Label of the bot configuration/version
+                                         (see db/analytics.py).
     '''
-    for _ in range(100):
-        run_bot()
+    games = run_games(n_games, workers=workers, seed=seed, record_trajectories=record_trajectories)
+
+    with ResultWriter(db_path) as writer:
+        for result in games:
+            now = datetime.now()
+            writer.write(
+                win=result['win'],
+                score=result['score'],
+                t_sec=result['t_sec'],
+                date=now.strftime(DATE_FORMAT),
+                trajectory=result.get('trajectory'),
+                seed=result['seed'],
+                config=config
+            )
 
 
 if __name__=='__main__':
@@ -45,5 +78,5 @@ if __name__=='__main__':
     # Run one sample of the AI bot.
     run_bot()
 
-    # Uncomment below to run 100 samples.
+    # Uncomment below to run 100 samples (in parallel, headless).
     # run_tests()
@@ -0,0 +1,470 @@
+'''
+code/service.py
+
+2048-intelligent-bot: Asynchronous "suggest next move" service.
+
+The service listens on a local TCP socket and speaks newline-delimited JSON.
+Each request carries a board and gets the best move back:
+    -> {"id": 1, "grid": [[2, 0, 0, 0], ...], "budget_ms": 250}
+    <- {"id": 1, "move": "left", "source": "search", "ms": 12.3}
+(the board can also be sent packed, as "board": <int>). The searches run in
+a pool of worker processes (each with its own headless bot), so the event
+loop is never blocked. Identical boards in flight share a single search,
+and a request whose search exceeds its latency budget is answered with a
+fast heuristic move instead ("source": "fallback").
+
+Usage (from the code directory):
+    python service.py --port 8048
+    python service.py --clients 200 --requests 5
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import multiprocessing.util
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from benchmark import build_corpus, summarize
+from bot.bitboard import MAX_EXPONENT, MOVE_FUNCTIONS, legal_moves, pack_grid
+from bot.heuristics import HeuristicTable
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8048
+DEFAULT_BUDGET_MS = 250
+
+# Headless bot instance owned by each worker process.
+_worker_bot = None
+
+
+def _init_worker() -> None:
+    '''
+    Initializes a worker process with its own headless bot.
+    '''
+    global _worker_bot
+    from bot.bot import Bot
+    _worker_bot = Bot(headless=True)
+
+    # The bot lives as long as the worker, and is closed when the worker exits.
+    multiprocessing.util.Finalize(_worker_bot, _worker_bot.close, exitpriority=0)
+
+def decide(task: tuple) -> str:
+    '''
+    Searches the best move of a board (inside a worker process).
+
+        Parameters:
+            task (tuple) : (packed board, move number, seed).
+
+        Returns:
+            (str) : Best move on the board.
+    '''
+    board, move_num, seed = task
+    bot = _worker_bot
+    bot.rng.seed(seed)
+    bot.board = board
+    bot.move_num = move_num
+    bot.update_search_params()
+    return bot.search_move()
+
+def estimate_move_num(board: int) -> int:
+    '''
+    Estimates the number of the moves played to reach the board (each move
+    inserts a 2, so the sum of the tiles grows by 2 per move).
+
+        Parameters:
+            board (int) : Packed board.
+
+        Returns:
+            (int) : Estimated move number.
+    '''
+    total = sum(1 << ((board >> (4 * i)) & 0xF) for i in range(16) if (board >> (4 * i)) & 0xF)
+    return max(total // 2 - 2, 0)
+
+def parse_board(request: dict) -> int:
+    '''
+    Reads the board of a request, either packed ("board") or as a 4x4 grid
+    of tile values ("grid").
+
+        Parameters:
+            request (dict) : Decoded request.
+
+        Returns:
+            (int) : Packed board.
+
+        Raises:
+            (ValueError) : If the board is not a valid 4x4 board.
+    '''
+    if 'board' in request:
+        board = request['board']
+
+        if type(board) is not int or not 0 <= board < 1 << 64:
+            raise ValueError('board must be an integer in [0, 2^64)')
+
+        return board
+
+    grid = request['grid']
+
+    if not isinstance(grid, list) or len(grid) != 4 or any(
+        not isinstance(row, list) or len(row) != 4 for row in grid
+    ):
+        raise ValueError('grid must be a 4x4 list of lists')
+
+    for val in (val for row in grid for val in row):
+        if type(val) is not int or (val and (val < 2 or val & (val - 1) or val > 1 << MAX_EXPONENT)):
+            raise ValueError(f'grid values must be 0 or powers of 2 up to {1 << MAX_EXPONENT}, got {val!r}')
+
+    return pack_grid(grid)
+
+
+class MoveService:
+    '''
+    -----------
+    Class to serve the bot's decisions to many concurrent clients.
+    -----------
+    '''
+
+    def __init__(
+        self: 'MoveService',
+        workers: int=None,
+        budget_ms: float=DEFAULT_BUDGET_MS,
+        max_pending: int=1024,
+        seed: int=0
+    ) -> None:
+        '''
+        Constructor to start the pool of worker processes.
+
+            Parameters:
+                self ('MoveService')
+                workers (int)     : Number of worker processes (None for all cores).
+                budget_ms (float) : Default latency budget of a request (in ms).
+                max_pending (int) : Max distinct searches in flight (the requests
+                                    above it get the fallback move at once).
+                seed (int)        : Seed of the searches (the same board gets the
+                                    same answer).
+        '''
+        # The workers are spawned (not forked), so that they never inherit
+        # the sockets of the client connections open at the time.
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        self.budget_ms = budget_ms
+        self.max_pending = max_pending
+        self.seed = seed
+
+        # Searches in flight, keyed by (board, move number).
+        self.in_flight = {}
+
+        # Fast evaluation of the afterstates for the fallback moves.
+        self.heuristics = HeuristicTable()
+
+        # Number of the requests per source of the answer.
+        self.stats = Counter()
+
+        # Tasks serving the open client connections.
+        self.connections = set()
+
+    def fallback_move(self: 'MoveService', board: int) -> str:
+        '''
+        Selects a move greedily by the heuristic value of its afterstate.
+
+            Parameters:
+                self ('MoveService')
+                board (int) : Packed board.
+
+            Returns:
+                (str) : Fallback move (None if the game is over).
+        '''
+        moves = legal_moves(board)
+
+        if not moves:
+            return None
+
+        return max(moves, key=lambda mv: self.heuristics(MOVE_FUNCTIONS[mv](board)))
+
+    async def suggest(self: 'MoveService', board: int, move_num: int=None, budget_ms: float=None) -> dict:
+        '''
+        Suggests the next move for a board within the latency budget.
+
+            Parameters:
+                self ('MoveService')
+                board (int)       : Packed board.
+                move_num (int)    : Move number (estimated from the board if not set).
+                budget_ms (float) : Latency budget (in ms; the default if not set).
+
+            Returns:
+                (dict) : Move and the source of the answer ('search', 'coalesced',
+                         'fallback', 'overloaded' or 'over').
+        '''
+        if move_num is None:
+            move_num = estimate_move_num(board)
+
+        if budget_ms is None:
+            budget_ms = self.budget_ms
+
+        if not legal_moves(board):
+            source = 'over'
+            self.stats[source] += 1
+            return {'move': None, 'source': source}
+
+        key = (board, move_num)
+        future = self.in_flight.get(key)
+        source = 'coalesced'
+
+        if future is None:
+            if len(self.in_flight) >= self.max_pending:
+                source = 'overloaded'
+                self.stats[source] += 1
+                return {'move': self.fallback_move(board), 'source': source}
+
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, decide, (board, move_num, self.seed ^ board))
+            future.add_done_callback(lambda f: self.finish(key, f))
+            self.in_flight[key] = future
+            source = 'search'
+
+        # The search is shielded, so that it keeps running for the other
+        # requests of the same board after this one times out.
+        try:
+            move = await asyncio.wait_for(asyncio.shield(future), budget_ms / 1000)
+        except asyncio.TimeoutError:
+            move = self.fallback_move(board)
+            source = 'fallback'
+
+        self.stats[source] += 1
+        return {'move': move, 'source': source}
+
+    def finish(self: 'MoveService', key: tuple, future: asyncio.Future) -> None:
+        '''
+        Removes a finished search from the searches in flight.
+
+            Parameters:
+                self ('MoveService')
+                key (tuple)             : (board, move number) of the search.
+                future (asyncio.Future) : Finished search.
+        '''
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+
+    async def handle_request(self: 'MoveService', line: bytes) -> dict:
+        '''
+        Handles a single JSON request.
+
+            Parameters:
+                self ('MoveService')
+                line (bytes) : Encoded request.
+
+            Returns:
+                (dict) : Response (with an error message for a malformed request).
+        '''
+        start = perf_counter()
+        request = None
+
+        try:
+            request = json.loads(line)
+            board = parse_board(request)
+            move_num, budget_ms = request.get('move_num'), request.get('budget_ms')
+
+            if move_num is not None and (type(move_num) is not int or move_num < 0):
+                raise ValueError('move_num must be a non-negative integer')
+
+            if budget_ms is not None and (type(budget_ms) not in (int, float) or budget_ms <= 0):
+                raise ValueError('budget_ms must be a positive number')
+
+            response = await self.suggest(board, move_num, budget_ms)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            request_id = request.get('id') if isinstance(request, dict) else None
+            return {'id': request_id, 'error': f'Malformed request: {e}'}
+
+        response['id'] = request.get('id')
+        response['ms'] = round((perf_counter() - start) * 1000, 3)
+        return response
+
+    async def handle_client(self: 'MoveService', reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        Serves a client connection. The requests may be pipelined, so they are
+        handled concurrently and answered as soon as they are ready.
+
+            Parameters:
+                self ('MoveService')
+                reader (asyncio.StreamReader) : Stream of the requests.
+                writer (asyncio.StreamWriter) : Stream of the responses.
+        '''
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line: bytes) -> None:
+            # Every request gets an answer, even if its handling fails.
+            try:
+                response = await self.handle_request(line)
+            except Exception as e:
+                response = {'id': None, 'error': f'Internal error: {e!r}'}
+
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(connection)
+            writer.close()
+
+    async def serve(self: 'MoveService', host: str=DEFAULT_HOST, port: int=DEFAULT_PORT) -> asyncio.Server:
+        '''
+        Starts the workers and listens for the clients.
+
+            Parameters:
+                self ('MoveService')
+                host (str) : Host of the service.
+                port (int) : Port of the service.
+
+            Returns:
+                (asyncio.Server) : Started server.
+        '''
+        # Warm up the pool, so that the first requests do not wait for the
+        # workers to start.
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.pool, decide, (0x11, 0, self.seed))
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def close(self: 'MoveService') -> None:
+        '''
+        Shuts down the worker processes.
+
+            Parameters:
+                self ('MoveService')
+        '''
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def run_client(host: str, port: int, requests: list) -> list:
+    '''
+    Stand-in client: sends its requests one by one over a single connection.
+
+        Parameters:
+            host (str)      : Host of the service.
+            port (int)      : Port of the service.
+            requests (list) : Requests (as dicts).
+
+        Returns:
+            results (list) : Pairs of (response, latency in seconds).
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    results = []
+
+    try:
+        for request in requests:
+            start = perf_counter()
+            writer.write(json.dumps(request).encode() + b'\n')
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            results.append((response, perf_counter() - start))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+    return results
+
+async def load_test(args: argparse.Namespace) -> None:
+    '''
+    Starts the service and runs many concurrent stand-in clients against it.
+    The clients ask about a shared corpus of positions, so some of their
+    requests coalesce.
+
+        Parameters:
+            args (argparse.Namespace) : Parsed command-line arguments.
+    '''
+    service = MoveService(args.workers, args.budget_ms, args.max_pending, args.seed)
+    server = await service.serve(args.host, args.port)
+    corpus = build_corpus(args.positions, args.seed)
+
+    requests = [
+        {'id': i, 'board': board, 'move_num': moves_played}
+        for i, (board, moves_played) in enumerate(
+            corpus[i % len(corpus)] for i in range(args.clients * args.requests)
+        )
+    ]
+    clients = [requests[i::args.clients] for i in range(args.clients)]
+
+    start = perf_counter()
+
+    try:
+        results = await asyncio.gather(*(run_client(args.host, args.port, reqs) for reqs in clients))
+    finally:
+        # The clients have disconnected, so their connections end on their own.
+        server.close()
+        await asyncio.gather(*service.connections, return_exceptions=True)
+        await server.wait_closed()
+        service.close()
+
+    total_sec = perf_counter() - start
+    latencies = [sec for client in results for _, sec in client]
+    stats = summarize(latencies, len(latencies))
+
+    print(f'Clients : {args.clients} (requests : {len(latencies)}, {total_sec:.2f} s)')
+    print(f'Throughput : {len(latencies) / total_sec:.1f} requests/s')
+    print(f'Latency : p50 {stats["p50_us"] / 1000:.1f} ms, '
+          f'p95 {stats["p95_us"] / 1000:.1f} ms, p99 {stats["p99_us"] / 1000:.1f} ms')
+    print(f'Answers : {dict(service.stats)}')
+
+async def run_service(args: argparse.Namespace) -> None:
+    '''
+    Runs the service until interrupted.
+
+        Parameters:
+            args (argparse.Namespace) : Parsed command-line arguments.
+    '''
+    service = MoveService(args.workers, args.budget_ms, args.max_pending, args.seed)
+    server = await service.serve(args.host, args.port)
+    print(f'Serving on {args.host}:{args.port}')
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def parse_args() -> argparse.Namespace:
+    '''
+    Parses the command-line arguments of the service.
+
+        Returns:
+            (argparse.Namespace) : Parsed arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Serve the moves of the 2048 bot.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='host of the service')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port of the service')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='latency budget per request')
+    parser.add_argument('--max-pending', type=int, default=1024, help='max distinct searches in flight')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the searches')
+    parser.add_argument('--clients', type=int, default=0, help='if set, run N stand-in clients and exit')
+    parser.add_argument('--requests', type=int, default=5, help='requests per stand-in client')
+    parser.add_argument('--positions', type=int, default=100, help='positions asked by the clients')
+    return parser.parse_args()
+
+
+if __name__=='__main__':
+    args = parse_args()
+
+    try:
+        asyncio.run(load_test(args) if args.clients else run_service(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,314 @@
+'''
+code/tune.py
+
+2048-intelligent-bot: Parameter sweeps over the search coefficients of the bot.
+
+The configurations (sets of the coefficients in bot.bot.SEARCH_COEFFS) are
+sampled from a grid of values, either all of them (grid), a random subset
+(random), or a random subset pruned by successive halving (halving): each
+round plays more games with the best 1/eta of the configurations left.
+
+All the configurations play the same seeded games (common random numbers),
+so the differences between them are not blurred by the luck of the draws.
+The games of each round run in parallel across the worker processes, and
+all of them, with the aggregates of each configuration, are recorded in
+the DB. The configurations are ranked by the wins per CPU second.
+
+Usage (from the code directory):
+    python tune.py --method halving --configs 27 --min-games 8 --games 72
+    python tune.py --method grid --games 20
+
+Author: Filip J. Cierkosz (2023)
+'''
+
+
+import argparse
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from bot.batch import play_game
+from bot.bot import SEARCH_COEFFS
+from db.db_tools import DATE_FORMAT, DB_PATH, create_db
+from db.tuning import record_round
+from db.writer import ResultWriter
+
+
+# Values of each coefficient in the sweeps (the defaults of Bot in the middle).
+SPACE = {
+    'SEARCH_PER_MOVE_COEFF': [5, 10, 20],
+    'SEARCH_DEPTH_COEFF': [2, 4, 8],
+    'SEARCH_COEFF': [100, 200, 400],
+    'EMPTY_SPOT_COEFF': [0, 10, 30]
+}
+
+# Short names of the coefficients in the configuration labels.
+LABELS = {
+    'SEARCH_PER_MOVE_COEFF': 'spm',
+    'SEARCH_DEPTH_COEFF': 'depth',
+    'SEARCH_COEFF': 'stage',
+    'EMPTY_SPOT_COEFF': 'empty'
+}
+
+
+def config_label(coeffs: dict) -> str:
+    '''
+    Returns the label of a configuration (as stored in the config column).
+
+        Parameters:
+            coeffs (dict) : Coefficients of the configuration.
+
+        Returns:
+            (str) : Label, e.g. 'tune:spm=10,depth=4,stage=200,empty=10'.
+    '''
+    return 'tune:' + ','.join(f'{LABELS[name]}={coeffs[name]}' for name in SEARCH_COEFFS)
+
+def grid_configs(space: dict) -> list:
+    '''
+    Lists all the configurations of the grid.
+
+        Parameters:
+            space (dict) : Values of each coefficient.
+
+        Returns:
+            (list) : Coefficients of each configuration.
+    '''
+    names = [name for name in SEARCH_COEFFS if name in space]
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def random_configs(space: dict, n_configs: int, seed: int) -> list:
+    '''
+    Samples distinct configurations of the grid at random.
+
+        Parameters:
+            space (dict)    : Values of each coefficient.
+            n_configs (int) : Number of the configurations (all if the grid is smaller).
+            seed (int)      : Seed of the sampling.
+
+        Returns:
+            (list) : Coefficients of each configuration.
+    '''
+    configs = grid_configs(space)
+    return random.Random(seed).sample(configs, min(n_configs, len(configs)))
+
+def summarize_config(coeffs: dict, results: list) -> dict:
+    '''
+    Aggregates the games played by a configuration.
+
+        Parameters:
+            coeffs (dict)  : Coefficients of the configuration.
+            results (list) : Results of its games (see bot.batch.play_game).
+
+        Returns:
+            (dict) : Games, wins, win rate, avg time to win, CPU time, wins per
+                     CPU second and avg score.
+    '''
+    wins = sum(res['win'] for res in results)
+    cpu_sec = sum(res['cpu_sec'] for res in results)
+    win_times = [res['t_sec'] for res in results if res['win']]
+
+    return {
+        'config': config_label(coeffs),
+        'coeffs': coeffs,
+        'games': len(results),
+        'wins': wins,
+        'win_rate': wins / len(results),
+        'avg_time_to_win_sec': sum(win_times) / len(win_times) if win_times else None,
+        'cpu_sec': cpu_sec,
+        'wins_per_cpu_sec': wins / cpu_sec if cpu_sec else 0.0,
+        'avg_score': sum(res['score'] for res in results) / len(results)
+    }
+
+def rank(stats: list) -> list:
+    '''
+    Ranks the configurations by the wins per CPU second (ties broken by the
+    win rate and the avg score).
+
+        Parameters:
+            stats (list) : Aggregates of each configuration.
+
+        Returns:
+            (list) : Aggregates, best configuration first.
+    '''
+    return sorted(
+        stats,
+        key=lambda s: (s['wins_per_cpu_sec'], s['win_rate'], s['avg_score']),
+        reverse=True
+    )
+
+
+class Sweep:
+    '''
+    -----------
+    Class to evaluate the configurations on common seeded games in parallel.
+    -----------
+    '''
+
+    def __init__(
+        self: 'Sweep',
+        name: str,
+        workers: int=None,
+        seed: int=0,
+        db_path: str=DB_PATH
+    ) -> None:
+        '''
+        Constructor to initialize the results of the sweep.
+
+            Parameters:
+                self ('Sweep')
+                name (str)    : Name of the sweep (in the DB).
+                workers (int) : Number of worker processes (None for all cores).
+                seed (int)    : Base seed; the i-th game of every configuration
+                                is played with seed + i.
+                db_path (str) : Path of the DB file.
+        '''
+        self.name = name
+        self.workers = workers
+        self.seed = seed
+        self.db_path = db_path
+
+        # Results of the games played so far, per configuration label and game.
+        self.results = {}
+
+    def evaluate(self: 'Sweep', configs: list, n_games: int, round_num: int=0) -> list:
+        '''
+        Plays the first N games with each configuration (the games played in
+        the earlier rounds are reused), and records the round.
+
+            Parameters:
+                self ('Sweep')
+                configs (list)  : Coefficients of each configuration.
+                n_games (int)   : Number of games per configuration.
+                round_num (int) : Round of the sweep.
+
+            Returns:
+                (list) : Aggregates of each configuration (ranked).
+        '''
+        tasks = [
+            (coeffs, i)
+            for coeffs in configs
+            for i in range(n_games)
+            if i not in self.results.setdefault(config_label(coeffs), {})
+        ]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool, ResultWriter(self.db_path) as writer:
+            futures = {
+                pool.submit(play_game, self.seed + i, False, coeffs): (coeffs, i) for coeffs, i in tasks
+            }
+
+            for future in as_completed(futures):
+                coeffs, i = futures[future]
+                result = future.result()
+                label = config_label(coeffs)
+                self.results[label][i] = result
+                writer.write(
+                    win=result['win'],
+                    score=result['score'],
+                    t_sec=result['t_sec'],
+                    date=datetime.now().strftime(DATE_FORMAT),
+                    seed=result['seed'],
+                    config=label
+                )
+
+        stats = rank([
+            summarize_config(coeffs, [self.results[config_label(coeffs)][i] for i in range(n_games)])
+            for coeffs in configs
+        ])
+        record_round(
+            self.name, round_num, stats, datetime.now().strftime(DATE_FORMAT), self.db_path
+        )
+        return stats
+
+    def successive_halving(self: 'Sweep', configs: list, min_games: int, max_games: int, eta: int=3) -> list:
+        '''
+        Evaluates the configurations in rounds: after each round, only the best
+        1/eta of them is kept, and the next round plays eta times more games.
+
+            Parameters:
+                self ('Sweep')
+                configs (list)  : Coefficients of each configuration.
+                min_games (int) : Number of games per configuration in the first round.
+                max_games (int) : Max number of games per configuration.
+                eta (int)       : Reduction factor of each round.
+
+            Returns:
+                stats (list) : Aggregates of the configurations of the last round (ranked).
+        '''
+        n_games = min_games
+        round_num = 0
+
+        while True:
+            stats = self.evaluate(configs, n_games, round_num)
+            print_round(round_num, n_games, stats)
+
+            if len(stats) == 1 or n_games >= max_games:
+                return stats
+
+            configs = [s['coeffs'] for s in stats[:max(len(stats) // eta, 1)]]
+            n_games = min(n_games * eta, max_games)
+            round_num += 1
+
+
+def print_round(round_num: int, n_games: int, stats: list) -> None:
+    '''
+    Prints the ranked configurations of a round.
+
+        Parameters:
+            round_num (int) : Round of the sweep.
+            n_games (int)   : Number of games per configuration.
+            stats (list)    : Aggregates of each configuration (ranked).
+    '''
+    print(f'\nRound {round_num} ({len(stats)} configs x {n_games} games)')
+    print(f'{"config":<48}{"win rate":>10}{"time to win":>13}{"cpu sec":>10}{"wins/cpu sec":>14}')
+
+    for s in stats:
+        time_to_win = f'{s["avg_time_to_win_sec"]:.1f}' if s['avg_time_to_win_sec'] is not None else '-'
+        print(
+            f'{s["config"]:<48}{s["win_rate"]:>10.1%}{time_to_win:>13}'
+            f'{s["cpu_sec"]:>10.1f}{s["wins_per_cpu_sec"]:>14.5f}'
+        )
+
+def parse_args() -> argparse.Namespace:
+    '''
+    Parses the command-line arguments of the tuner.
+
+        Returns:
+            (argparse.Namespace) : Parsed arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Tune the search coefficients of the 2048 bot.')
+    parser.add_argument('--method', choices=['grid', 'random', 'halving'], default='halving', help='sweep method')
+    parser.add_argument('--configs', type=int, default=27, help='configs sampled (random/halving)')
+    parser.add_argument('--games', type=int, default=72, help='games per config (max for halving)')
+    parser.add_argument('--min-games', type=int, default=8, help='games per config in the first round')
+    parser.add_argument('--eta', type=int, default=3, help='reduction factor of successive halving')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='base seed of the games and the sampling')
+    parser.add_argument('--db', default=DB_PATH, help='path of the DB file')
+    parser.add_argument('--name', default=None, help='name of the sweep (a timestamp if not set)')
+    return parser.parse_args()
+
+
+if __name__=='__main__':
+    args = parse_args()
+
+    # The tables are created if missing (the stored results are kept).
+    create_db(args.db)
+    sweep = Sweep(
+        args.name or datetime.now().strftime(f'{args.method}-%Y%m%d-%H%M%S'),
+        workers=args.workers,
+        seed=args.seed,
+        db_path=args.db
+    )
+
+    if args.method == 'grid':
+        configs = grid_configs(SPACE)
+    else:
+        configs = random_configs(SPACE, args.configs, args.seed)
+
+    if args.method == 'halving':
+        stats = sweep.successive_halving(configs, args.min_games, args.games, args.eta)
+    else:
+        stats = sweep.evaluate(configs, args.games)
+        print_round(0, args.games, stats)
+
+    print(f'\nBest config : {stats[0]["config"]} (sweep : {sweep.name})')